@@ -0,0 +1,135 @@
+"""
+基准测试用的离线替身
+- install_fake_http：把共享 HTTP 客户端换成 httpx.MockTransport，按 URL 返回本地 fixture，不访问网络
+- FakeUserClient / FakeBotClient：只实现流水线用到的 Pyrogram 方法，返回形如 pyrogram.types.Message 的对象
+- unthrottle_scheduler：放开全局令牌桶，基准只测量本地代码开销，不测量 Telegram 限流等待
+"""
+
+import itertools
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import httpx
+from pyrogram import raw
+
+from src.utils import http_client
+from src.utils.rate_limiter import telegram_scheduler
+
+# url -> (status, body, content_type)；也可以是 callable(url) -> 同样的三元组
+Route = Tuple[int, Union[str, bytes], str]
+
+
+def install_fake_http(routes: Union[Dict[str, Route], Callable[[str], Optional[Route]]]) -> httpx.AsyncClient:
+    def handler(request: httpx.Request) -> httpx.Response:
+        url = str(request.url)
+        route = routes(url) if callable(routes) else routes.get(url)
+        if route is None:
+            return httpx.Response(404, text="not found")
+        status, body, content_type = route
+        content = body.encode("utf-8") if isinstance(body, str) else body
+        return httpx.Response(status, content=content, headers={"content-type": content_type})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler), follow_redirects=True)
+    http_client._client = client
+    return client
+
+
+def unthrottle_scheduler():
+    unlimited = (1e9, 1e9)
+    telegram_scheduler.client_rates = {"user": unlimited, "bot": unlimited}
+    telegram_scheduler.chat_rate = unlimited
+    telegram_scheduler.method_rates = {k: unlimited for k in telegram_scheduler.method_rates}
+    telegram_scheduler._client_buckets.clear()
+    telegram_scheduler._method_buckets.clear()
+    telegram_scheduler._chat_buckets.clear()
+
+
+def fake_message(chat_id: int, msg_id: int, media_group_id: Optional[str] = None, text: str = "benchmark post"):
+    return SimpleNamespace(
+        id=msg_id,
+        chat=SimpleNamespace(id=chat_id, title="Bench Channel", username=None),
+        media_group_id=media_group_id,
+        text=None if media_group_id else text,
+        caption=text if media_group_id else None,
+        date=None,
+        photo=SimpleNamespace(file_id=f"photo-{msg_id}", file_size=123456) if media_group_id else None,
+        video=None,
+        document=None,
+        audio=None,
+        sticker=None,
+        empty=False,
+    )
+
+
+class FakeStorage:
+    """Pyrogram storage 中 peer 缓存用到的部分"""
+
+    def __init__(self):
+        self.peers: Dict[int, Tuple] = {}
+
+    async def update_peers(self, peers: List[Tuple]):
+        for peer in peers:
+            self.peers[peer[0]] = peer
+
+
+class FakeUserClient:
+    """消息 id 按 album_size 分组：同组的消息共享 media_group_id（album_size=1 时都是单条消息）"""
+
+    name = "bench_user"
+    bot_token = None
+
+    def __init__(self, album_size: int = 1):
+        self.album_size = album_size
+        self.calls = 0
+        self.resolves = 0
+        self._staging_ids = itertools.count(1)
+        self.storage = FakeStorage()
+
+    def _message(self, chat_id: int, msg_id: int):
+        group = None
+        if self.album_size > 1:
+            group = f"{chat_id}:{(msg_id - 1) // self.album_size}"
+        return fake_message(chat_id, msg_id, group)
+
+    async def get_messages(self, chat_id, message_ids):
+        self.calls += 1
+        if isinstance(chat_id, str):
+            chat_id = -1000000000000 - abs(hash(chat_id)) % 10 ** 9
+        if isinstance(message_ids, list):
+            return [self._message(chat_id, i) for i in message_ids]
+        return self._message(chat_id, message_ids)
+
+    async def resolve_peer(self, peer_id):
+        self.resolves += 1
+        if isinstance(peer_id, str):
+            peer_id = -1000000000000 - abs(hash(peer_id.lstrip("@").lower())) % 10 ** 9
+        return raw.types.InputPeerChannel(channel_id=-1000000000000 - peer_id, access_hash=peer_id % 997)
+
+    async def get_chat(self, chat_id):
+        self.calls += 1
+        return SimpleNamespace(id=chat_id, title="staging")
+
+    async def forward_messages(self, chat_id, from_chat_id, message_ids):
+        self.calls += 1
+        return [SimpleNamespace(id=next(self._staging_ids)) for _ in message_ids]
+
+
+class FakeBotClient:
+    name = "bench_bot"
+    bot_token = "bench"
+
+    def __init__(self):
+        self.sent: List[Tuple[int, str]] = []
+        self.copied = 0
+
+    async def send_message(self, chat_id, text, reply_to_message_id=None):
+        self.sent.append((chat_id, text))
+
+    async def copy_media_group(self, chat_id, from_chat_id, message_id):
+        # 不知道组的大小：按调用方候选批次全部视为已复制（返回足够长的列表）
+        self.copied += 1
+        return [SimpleNamespace(id=i) for i in range(10)]
+
+    async def copy_message(self, chat_id, from_chat_id, message_id):
+        self.copied += 1
+        return SimpleNamespace(id=message_id)
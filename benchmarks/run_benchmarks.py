@@ -0,0 +1,432 @@
+"""
+离线基准测试：解析器 / md5_tool / bot 任务流水线的热点路径
+
+用法（在项目根）：
+  python3 -m benchmarks.run_benchmarks                      # 全部用例，结果写入 benchmarks/results/<时间>.json
+  python3 -m benchmarks.run_benchmarks --quick              # 缩小数据规模与重复次数（冒烟检查）
+  python3 -m benchmarks.run_benchmarks --only md5 --only tme  # 只运行指定的用例组（tme / webpage / md5 / pipeline）
+  python3 -m benchmarks.run_benchmarks --compare benchmarks/results/base.json   # 与之前的结果逐项对比
+
+全部离线运行：
+  - HTTP 请求由 httpx.MockTransport 返回 benchmarks/fixtures 下保存的 t.me 页面与生成的长文章
+  - Telegram 调用使用 benchmarks/fakes.py 中的假客户端，令牌桶限流被放开（只测本地开销）
+  - md5 用例在临时目录中生成文件树；sqlite 使用临时数据库，不会写项目根的 xbparsing.db
+"""
+
+import argparse
+import asyncio
+import inspect
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+FIXTURES_DIR = BENCH_DIR / "fixtures"
+RESULTS_DIR = BENCH_DIR / "results"
+
+from benchmarks.fakes import FakeBotClient, FakeUserClient, install_fake_http, unthrottle_scheduler
+from src.parser.url_parser_userbot import _try_scrape_tme_post, parse_telegram_link
+from src.utils.html_parser import fetch_and_parse_webpage
+from src.utils.http_client import close_http_client
+from src.utils.parse_pool import parse_pool
+from src.utils.md5_tool import (
+    MODIFY_CHECKPOINT_FILE,
+    MODIFY_JOURNAL_FILE,
+    compute_md5,
+    modify_md5_all,
+    modify_md5_parallel,
+)
+from src.workers.tasks import WorkerContext, new_parse_job
+from src.workers.worker import MemoryJobQueue, Worker
+
+ARTICLE_URL = "https://news.example.com/article/{size}"
+WORDS = (
+    "the of and to in is that for it as was with be by on not he this are or his from at which but have an they you were "
+    "telegram channel media release archive parser benchmark latency throughput network server client message video photo"
+).split()
+
+
+def make_article(paragraphs: int, seed: int = 42) -> str:
+    """生成结构接近新闻站点的长文章：导航、侧栏、评论、内联脚本与大量正文段落"""
+    rnd = random.Random(seed)
+
+    def sentence(n: int) -> str:
+        return " ".join(rnd.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+    nav = "".join(f'<li><a href="/section/{i}">Section {i}</a></li>' for i in range(40))
+    side = "".join(f'<div class="widget"><h4>{sentence(4)}</h4><p>{sentence(20)}</p></div>' for i in range(15))
+    body = "".join(
+        (f"<h2>{sentence(6)}</h2>" if i % 12 == 0 else "")
+        + f"<p>{' '.join(sentence(rnd.randint(8, 25)) for _ in range(rnd.randint(3, 7)))}</p>"
+        + (f'<figure><img src="https://img.example.com/{i}.jpg"><figcaption>{sentence(8)}</figcaption></figure>' if i % 9 == 0 else "")
+        for i in range(paragraphs)
+    )
+    comments = "".join(f'<div class="comment"><b>user{i}</b><p>{sentence(15)}</p></div>' for i in range(paragraphs // 4))
+    script = "<script>" + ";".join(f"window.cfg{i}={{a:{i},b:'{sentence(3)}'}}" for i in range(200)) + "</script>"
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>" + sentence(8) + " | Example News</title>"
+        '<meta property="og:image" content="https://img.example.com/cover.jpg">'
+        '<meta name="twitter:image" content="https://img.example.com/cover_tw.jpg">'
+        + script + "<style>body{font-family:sans-serif}.comment{margin:4px}</style></head><body>"
+        f'<header><nav><ul>{nav}</ul></nav></header><aside class="sidebar">{side}</aside>'
+        f'<main><article class="post-content"><h1>{sentence(10)}</h1>{body}</article></main>'
+        f'<section id="comments">{comments}</section><footer>{sentence(30)}</footer></body></html>'
+    )
+
+
+def make_tree(root: Path, count: int, size: int) -> Path:
+    root.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        sub = root / f"d{i % 8}"
+        sub.mkdir(exist_ok=True)
+        (sub / f"f{i}.jpg").write_bytes(os.urandom(size))
+    return root
+
+
+# ---------------------------------------------------------------- 计时
+
+def _stats(name: str, group: str, samples: List[float], number: int, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    ordered = sorted(samples)
+    ms = [s * 1000 for s in ordered]
+    result = {
+        "name": name,
+        "group": group,
+        "unit": "ms",
+        "repeat": len(samples),
+        "number": number,
+        "min": round(ms[0], 4),
+        "median": round(statistics.median(ms), 4),
+        "mean": round(statistics.fmean(ms), 4),
+        "p95": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 4),
+        "max": round(ms[-1], 4),
+        "stdev": round(statistics.pstdev(ms), 4),
+    }
+    if extra:
+        result.update(extra)
+    return result
+
+
+async def measure(
+    name: str,
+    group: str,
+    fn: Callable[[], Any],
+    repeat: int,
+    number: int = 1,
+    setup: Optional[Callable[[], Any]] = None,
+    warmup: int = 1,
+    extra: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """fn 可以是普通函数或返回 awaitable 的函数；每个样本为 number 次调用的平均耗时"""
+
+    async def once():
+        r = fn()
+        if inspect.isawaitable(r):
+            await r
+
+    for _ in range(warmup):
+        if setup:
+            setup()
+        await once()
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        for _ in range(number):
+            await once()
+        samples.append((time.perf_counter() - t0) / number)
+    return _stats(name, group, samples, number, extra)
+
+
+# ---------------------------------------------------------------- 用例
+
+Case = Callable[["BenchConfig"], Awaitable[List[Dict[str, Any]]]]
+# 用例组名 -> 用例（按注册顺序运行）
+CASES: Dict[str, Case] = {}
+# 生成的文章 HTML（按规模），run() 中生成
+_ARTICLES: Dict[str, str] = {}
+
+
+def case(group: str):
+    def decorator(func: Case) -> Case:
+        CASES[group] = func
+        return func
+    return decorator
+
+
+class BenchConfig:
+    def __init__(self, quick: bool, tmp: Path):
+        self.quick = quick
+        self.repeat = 5 if quick else 20
+        self.tmp = tmp
+
+
+def _fixture(name: str) -> str:
+    return (FIXTURES_DIR / name).read_text(encoding="utf-8")
+
+
+def _http_routes(article_sizes: Dict[str, str]):
+    pages = {
+        "https://t.me/xbdemo/1000?embed=1": _fixture("tme_embed_album.html"),
+        "https://t.me/s/xbdemo/1000": _fixture("tme_s_channel.html"),
+        "https://t.me/xbdemo/1000": _fixture("tme_post_page.html"),
+    }
+    for size, html in article_sizes.items():
+        pages[ARTICLE_URL.format(size=size)] = html
+
+    def route(url: str):
+        html = pages.get(url)
+        return None if html is None else (200, html, "text/html; charset=utf-8")
+
+    return route
+
+
+@case("tme")
+async def bench_tme_scrape(cfg: BenchConfig) -> List[Dict[str, Any]]:
+    results = []
+    for label, url in (
+        ("embed_album", "https://t.me/xbdemo/1000?embed=1"),
+        ("channel_page", "https://t.me/s/xbdemo/1000"),
+        ("post_page_miss", "https://t.me/xbdemo/1000"),
+    ):
+        results.append(await measure(
+            f"tme_scrape.{label}", "parser",
+            lambda url=url: _try_scrape_tme_post(url),
+            repeat=cfg.repeat, number=5,
+        ))
+    # PAT_PLAIN 完整路径：t.me/<u>/<id> 抓取失败后回退 t.me/s/<u>/<id>
+    results.append(await measure(
+        "parse_telegram_link.plain_web", "parser",
+        lambda: parse_telegram_link("https://t.me/xbdemo/1000", FakeUserClient()),
+        repeat=cfg.repeat, number=5,
+    ))
+    return results
+
+
+@case("webpage")
+async def bench_webpage(cfg: BenchConfig) -> List[Dict[str, Any]]:
+    results = []
+    for size in (["small", "large"] if cfg.quick else ["small", "large", "huge"]):
+        url = ARTICLE_URL.format(size=size)
+        html_bytes = len(_ARTICLES[size].encode("utf-8"))
+        results.append(await measure(
+            f"fetch_and_parse_webpage.{size}", "parser",
+            lambda url=url: fetch_and_parse_webpage(url),
+            repeat=max(3, cfg.repeat // (1 if size == "small" else 4)),
+            extra={"html_bytes": html_bytes},
+        ))
+    # 同时解析多个大页面：进程池可把解析分摊到多个核上
+    url = ARTICLE_URL.format(size="large")
+    results.append(await measure(
+        "fetch_and_parse_webpage.large_x4_concurrent", "parser",
+        lambda: asyncio.gather(*(fetch_and_parse_webpage(url) for _ in range(4))),
+        repeat=max(3, cfg.repeat // 4),
+        extra={"pages": 4, "parse_processes": parse_pool.processes},
+    ))
+    return results
+
+
+def _md5_trees(cfg: BenchConfig) -> Dict[str, Dict[str, int]]:
+    if cfg.quick:
+        return {"small_files": {"count": 200, "size": 16 << 10}, "large_files": {"count": 4, "size": 8 << 20}}
+    return {
+        "small_files": {"count": 2000, "size": 16 << 10},
+        "medium_files": {"count": 100, "size": 1 << 20},
+        "large_files": {"count": 8, "size": 64 << 20},
+    }
+
+
+def _reset_md5_state():
+    """每个样本前清空修改日志与断点：否则后续样本会把已修改的文件当作完成而跳过，只测到跳过路径"""
+    for path in (MODIFY_JOURNAL_FILE, MODIFY_CHECKPOINT_FILE):
+        path.unlink(missing_ok=True)
+
+
+@case("md5")
+async def bench_md5(cfg: BenchConfig) -> List[Dict[str, Any]]:
+    results = []
+    cwd = os.getcwd()
+    for label, spec in _md5_trees(cfg).items():
+        work = cfg.tmp / f"md5_{label}"
+        tree = make_tree(work / "tree", spec["count"], spec["size"])
+        files = sorted(p for p in tree.rglob("*") if p.is_file())
+        total = spec["count"] * spec["size"]
+        extra = {"files": spec["count"], "file_bytes": spec["size"], "total_bytes": total}
+        repeat = max(3, cfg.repeat // 4)
+        # md5_tool 的修改日志 / 缓存 / 断点文件写在当前目录：切到临时目录，避免污染项目根
+        os.chdir(work)
+        try:
+            results.append(await measure(
+                f"compute_md5.{label}", "md5",
+                lambda: [compute_md5(f) for f in files],
+                repeat=repeat, extra=extra,
+            ))
+            results.append(await measure(
+                f"modify_md5_all.dry_run.{label}", "md5",
+                lambda: modify_md5_all([str(tree)], include_subdirs=True, dry_run=True),
+                repeat=repeat, extra=extra,
+            ))
+            results.append(await measure(
+                f"modify_md5_all.journal.{label}", "md5",
+                lambda: modify_md5_all([str(tree)], include_subdirs=True, backup_mode="journal"),
+                repeat=repeat, setup=_reset_md5_state, extra=extra,
+            ))
+            results.append(await measure(
+                f"modify_md5_parallel.journal.{label}", "md5",
+                lambda: modify_md5_parallel([str(tree)], include_subdirs=True, backup_mode="journal", workers=4),
+                repeat=repeat, setup=_reset_md5_state, extra=extra,
+            ))
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(work, ignore_errors=True)
+    return results
+
+
+# 每批链接使用新的消息 id 区间（跨用例共享，避免命中 staging 去重索引）
+_batch_ids = itertools.count(1, 100_000)
+
+
+class PipelineHarness:
+    """
+    模拟 handle_private：每个用户发一条链接 -> parse -> forward -> copy -> 回复
+    worker 在整个用例中常驻，启动 / 停止不计入样本（只测量任务处理本身）
+    """
+
+    def __init__(self, album_size: int, concurrency: int):
+        self.album_size = album_size
+        self.user, self.bot = FakeUserClient(album_size=album_size), FakeBotClient()
+        self.queue = MemoryJobQueue()
+        ctx = WorkerContext(user_client=self.user, bot_client=self.bot, queue=self.queue, staging_chat_id=-100999)
+        self.worker = Worker(self.queue, ctx, concurrency=concurrency)
+        self._expected = 0
+        self._done = asyncio.Event()
+        send = self.bot.send_message
+
+        async def send_and_count(chat_id, text, reply_to_message_id=None):
+            await send(chat_id, text, reply_to_message_id)
+            if len(self.bot.sent) >= self._expected:
+                self._done.set()
+
+        self.bot.send_message = send_and_count
+
+    async def run_batch(self, links: int):
+        self._expected = len(self.bot.sent) + links
+        self._done.clear()
+        base = next(_batch_ids)
+        for i in range(links):
+            # 每个链接来自不同用户，避免单 chat 并发上限引入的固定延迟
+            url = f"https://t.me/c/555/{base + i * self.album_size + 1}"
+            await self.queue.put(new_parse_job(url, chat_id=10_000 + i, reply_to=1))
+        await asyncio.wait_for(self._done.wait(), timeout=120)
+
+
+@case("pipeline")
+async def bench_pipeline(cfg: BenchConfig) -> List[Dict[str, Any]]:
+    links = 50 if cfg.quick else 200
+    results = []
+    for label, album_size in (("single", 1), ("album4", 4)):
+        harness = PipelineHarness(album_size, concurrency=4)
+        harness.worker.start()
+        try:
+            results.append(await measure(
+                f"pipeline.{label}", "pipeline",
+                lambda harness=harness: harness.run_batch(links),
+                repeat=max(3, cfg.repeat // 4),
+                extra={"links": links},
+            ))
+        finally:
+            await harness.worker.stop()
+    return results
+
+
+# ---------------------------------------------------------------- 输出
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR.parent, capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _compare(results: List[Dict[str, Any]], baseline_path: Path):
+    baseline = {r["name"]: r for r in json.loads(baseline_path.read_text(encoding="utf-8")).get("results", [])}
+    print(f"\n对比 {baseline_path}（median，负数表示变快）")
+    for r in results:
+        old = baseline.get(r["name"])
+        if not old or not old.get("median"):
+            print(f"  {r['name']:<48} {r['median']:>10.3f} ms   (新增)")
+            continue
+        delta = (r["median"] - old["median"]) / old["median"] * 100
+        print(f"  {r['name']:<48} {old['median']:>10.3f} -> {r['median']:>10.3f} ms  {delta:+6.1f}%")
+
+
+async def run(cfg: BenchConfig, groups: List[str]) -> List[Dict[str, Any]]:
+    sizes = {"small": 40, "large": 600} if cfg.quick else {"small": 40, "large": 600, "huge": 3000}
+    _ARTICLES.update({k: make_article(v) for k, v in sizes.items()})
+    install_fake_http(_http_routes(_ARTICLES))
+    unthrottle_scheduler()
+    if "webpage" in groups:
+        await parse_pool.warm_up()
+    results: List[Dict[str, Any]] = []
+    try:
+        for group in groups:
+            for r in await CASES[group](cfg):
+                print(f"  {r['name']:<48} median {r['median']:>10.3f} ms  p95 {r['p95']:>10.3f} ms")
+                results.append(r)
+    finally:
+        await close_http_client()
+        parse_pool.shutdown()
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="xbparsing 离线基准测试")
+    ap.add_argument("--quick", action="store_true", help="缩小规模，快速冒烟")
+    ap.add_argument("--only", action="append", choices=list(CASES), help="只运行指定的用例组（可重复）")
+    ap.add_argument("-o", "--output", type=Path, help="结果 JSON 路径（默认 benchmarks/results/<时间>.json）")
+    ap.add_argument("--compare", type=Path, help="与之前的结果 JSON 对比")
+    args = ap.parse_args(argv)
+
+    # 任务流水线的 staging 索引 / 队列表写入临时数据库（在 main 中设置：解析进程池的 spawn 子进程会重新导入本模块）
+    tmp = Path(tempfile.mkdtemp(prefix="xbparsing_bench_"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp / 'bench.db'}"
+    cfg = BenchConfig(quick=args.quick, tmp=tmp)
+    groups = [g for g in CASES if not args.only or g in args.only]
+    try:
+        results = asyncio.run(run(cfg, groups))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "quick": args.quick,
+            "groups": groups,
+        },
+        "results": results,
+    }
+    out = args.output or RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n结果已写入 {out}")
+    if args.compare:
+        _compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+本地指标端点（供 Prometheus 抓取），bot 进程与独立 worker 进程各自启动一个
+- GET /metrics：src/utils/metrics 中的阶段耗时 / 调用次数 / 进行中数量，以及调度器、解析进程池、peer 缓存、
+  链接缓存、账号池的运行状态（抓取时从各自的 stats() 读取）
+- GET /healthz：返回 ok
+只依赖 asyncio，不引入 web 框架；默认只监听 127.0.0.1（METRICS_HOST / METRICS_PORT，端口 <= 0 时不启动）
+
+使用：
+  server = await start_metrics_server("127.0.0.1", 9108, user_pool=pool, link_cache=LINK_CACHE)
+  ...
+  await stop_metrics_server(server)
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.utils.metrics import CollectedMetric, Samples, register_collector, render_metrics, unregister_collector
+from src.utils.parse_pool import parse_pool
+from src.utils.peer_cache import peer_cache
+from src.utils.rate_limiter import telegram_scheduler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METRICS_HOST = "127.0.0.1"
+DEFAULT_METRICS_PORT = 9108
+# 请求头读取超时（秒）与上限
+REQUEST_TIMEOUT = 5.0
+MAX_HEADER_BYTES = 8192
+
+CONTENT_TYPE_METRICS = "text/plain; version=0.0.4; charset=utf-8"
+
+# 每个指标端点额外注册的采集函数（账号池 / 链接缓存），关闭端点时注销
+_server_collectors: Dict[asyncio.AbstractServer, List[Any]] = {}
+
+
+def _counters(prefix: str, help_prefix: str, stats: Dict[str, Any], kinds: Dict[str, str]) -> List[CollectedMetric]:
+    """把 stats() 中的数值项转成指标：kinds 为 {键: counter / gauge}"""
+    out: List[CollectedMetric] = []
+    for key, kind in kinds.items():
+        value = stats.get(key)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f"{prefix}_{key}_total" if kind == "counter" else f"{prefix}_{key}"
+        out.append((name, kind, f"{help_prefix} {key}", [({}, value)]))
+    return out
+
+
+def _scheduler_metrics() -> Iterable[CollectedMetric]:
+    stats = telegram_scheduler.stats()
+    out = _counters("xbparsing_telegram", "Telegram 调度器", stats, {
+        "calls": "counter",
+        "flood_waits": "counter",
+        "queue_depth": "gauge",
+        "max_queue_depth": "gauge",
+    })
+    by_client: Samples = [({"client": k}, v) for k, v in sorted(stats.get("queue_depth_by_client", {}).items())]
+    out.append(("xbparsing_telegram_client_queue_depth", "gauge", "Telegram 调度器按客户端排队的调用数", by_client))
+    blocked: Samples = [({"method": k}, v) for k, v in sorted(stats.get("blocked_methods", {}).items())]
+    out.append(("xbparsing_telegram_method_blocked_seconds", "gauge", "FloodWait 封锁剩余秒数", blocked))
+    return out
+
+
+def _parse_pool_metrics() -> Iterable[CollectedMetric]:
+    return _counters("xbparsing_parse_pool", "HTML 解析执行器", parse_pool.stats(), {
+        "processes": "gauge",
+        "inline_runs": "counter",
+        "pool_runs": "counter",
+        "thread_runs": "counter",
+        "broken": "counter",
+    })
+
+
+def _peer_cache_metrics() -> Iterable[CollectedMetric]:
+    return _counters("xbparsing_peer_cache", "peer 解析缓存", peer_cache.stats(), {
+        "hits": "counter",
+        "misses": "counter",
+        "invalidations": "counter",
+        "size": "gauge",
+    })
+
+
+def _link_cache_collector(link_cache: Any):
+    def collect() -> Iterable[CollectedMetric]:
+        return _counters("xbparsing_link_cache", "链接解析缓存", link_cache.stats(), {
+            "hits": "counter",
+            "negative_hits": "counter",
+            "misses": "counter",
+            "errors": "counter",
+            "evictions": "counter",
+        })
+    return collect
+
+
+def _user_pool_collector(user_pool: Any):
+    def collect() -> Iterable[CollectedMetric]:
+        stats = user_pool.stats()
+        members = sorted(stats.get("members", {}).items())
+        out = _counters("xbparsing_user_pool", "user 账号池", stats, {"accounts": "gauge", "reroutes": "counter"})
+        for key, kind, help_text in (
+            ("in_flight", "gauge", "账号进行中的调用数"),
+            ("served", "counter", "账号累计分配的调用数"),
+            ("healthy", "gauge", "账号健康检查是否通过"),
+            ("staging_ok", "gauge", "账号能否转发到 staging"),
+            ("ejected_for", "gauge", "账号因 FloodWait 暂停分配的剩余秒数"),
+        ):
+            name = f"xbparsing_user_pool_{key}_total" if kind == "counter" else f"xbparsing_user_pool_{key}"
+            out.append((name, kind, help_text, [({"account": k}, float(m.get(key, 0))) for k, m in members]))
+        return out
+    return collect
+
+
+register_collector(_scheduler_metrics)
+register_collector(_parse_pool_metrics)
+register_collector(_peer_cache_metrics)
+
+
+async def _respond(writer: asyncio.StreamWriter, status: str, body: str, content_type: str = "text/plain; charset=utf-8", head: bool = False):
+    data = body.encode("utf-8")
+    header = (
+        f"HTTP/1.1 {status}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(data)}\r\n"
+        "Connection: close\r\n\r\n"
+    ).encode("ascii")
+    writer.write(header if head else header + data)
+    await writer.drain()
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        # 请求头超过 MAX_HEADER_BYTES 时 readuntil 抛出 LimitOverrunError，直接断开
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=REQUEST_TIMEOUT)
+        parts = head.split(b"\r\n", 1)[0].decode("latin-1").split()
+        method, path = (parts[0], parts[1]) if len(parts) >= 2 else ("", "")
+        path = path.split("?", 1)[0]
+        if method not in ("GET", "HEAD"):
+            await _respond(writer, "405 Method Not Allowed", "method not allowed\n")
+        elif path == "/metrics":
+            # 渲染只读内存中的计数，不涉及 IO，直接在事件循环中完成
+            await _respond(writer, "200 OK", render_metrics(), CONTENT_TYPE_METRICS, head=method == "HEAD")
+        elif path == "/healthz":
+            await _respond(writer, "200 OK", "ok\n", head=method == "HEAD")
+        else:
+            await _respond(writer, "404 Not Found", "not found\n")
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    except Exception:
+        logger.debug("处理指标请求出错", exc_info=True)
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+
+async def start_metrics_server(
+    host: str = DEFAULT_METRICS_HOST,
+    port: int = DEFAULT_METRICS_PORT,
+    user_pool: Any = None,
+    link_cache: Any = None,
+) -> Optional[asyncio.AbstractServer]:
+    """
+    启动指标端点；port <= 0 或端口无法绑定时返回 None（只记日志，不影响 bot / worker 运行）
+    user_pool / link_cache 提供时一并输出其 stats()，stop_metrics_server 时注销
+    """
+    if port <= 0:
+        return None
+    try:
+        server = await asyncio.start_server(_handle, host, port, limit=MAX_HEADER_BYTES)
+    except OSError as e:
+        logger.warning("指标端点启动失败 %s:%s: %s", host, port, e)
+        return None
+    collectors = []
+    if user_pool is not None:
+        collectors.append(_user_pool_collector(user_pool))
+    if link_cache is not None:
+        collectors.append(_link_cache_collector(link_cache))
+    for collector in collectors:
+        register_collector(collector)
+    _server_collectors[server] = collectors
+    logger.info("指标端点已启动：http://%s:%s/metrics", host, port)
+    return server
+
+
+async def stop_metrics_server(server: Optional[asyncio.AbstractServer]):
+    if server is None:
+        return
+    for collector in _server_collectors.pop(server, []):
+        unregister_collector(collector)
+    server.close()
+    await server.wait_closed()
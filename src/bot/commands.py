@@ -0,0 +1,174 @@
+"""
+Bot 管理命令（仅 ADMIN_TELEGRAM_IDS 可用）
+
+/md5 <目录> [<目录> ...] [-r] [--dry-run] [--no-backup | --reflink]
+  对服务器上的目录批量修改 MD5（md5_tool.modify_md5_parallel，多线程 + 断点续跑）
+  - 进度每隔 MD5_PROGRESS_INTERVAL 秒更新到同一条状态消息
+  - 完成后把汇总发送给管理员，并发到 MD5_EDIT_CHANNEL_ID（若已配置）
+  - 中断（重启 / 崩溃）后重新发送同一命令即从断点继续
+  - 默认生成 .bak 完整副本；--reflink 尝试写时复制克隆；--no-backup 只靠修改日志（大小 + 哈希）回滚
+
+/md5 dups <目录> [<目录> ...] [-r]
+  只读扫描重复文件（md5_index.scan_library，复用 file_digests 索引），并列出 MD5 已修改过的文件；不修改任何文件
+"""
+
+import asyncio
+import logging
+import shlex
+from typing import Any, Dict, List, Optional, Tuple
+
+from pyrogram import Client
+from pyrogram.types import Message
+
+from src.bot.services.tg_api import call_with_flood_wait
+from src.utils.md5_index import scan_library
+from src.utils.md5_tool import BACKUP_COPY, BACKUP_JOURNAL, BACKUP_REFLINK, modify_md5_parallel
+
+logger = logging.getLogger("xbparsing_bot")
+
+MD5_PROGRESS_INTERVAL = 5.0
+MD5_USAGE = (
+    "用法：/md5 <目录> [<目录> ...] [-r 递归子目录] [--dry-run 仅预览] [--no-backup 不生成 .bak] [--reflink 写时复制备份]\n"
+    "查找重复文件：/md5 dups <目录> [<目录> ...] [-r]"
+)
+# 重复文件汇总中最多列出的组数 / 每组路径数（Telegram 单条消息最多 4096 字符）
+DUPS_MAX_GROUPS = 10
+DUPS_MAX_PATHS = 5
+
+# 同一时间只允许一个批量任务（避免多个任务同时写修改日志）
+_md5_lock = asyncio.Lock()
+
+
+def parse_md5_args(text: str) -> Tuple[List[str], bool, bool, str]:
+    """返回 (folders, include_subdirs, dry_run, backup_mode)"""
+    parts = shlex.split(text or "")[1:]
+    folders = [p for p in parts if not p.startswith("-")]
+    flags = {p for p in parts if p.startswith("-")}
+    if "--no-backup" in flags:
+        backup_mode = BACKUP_JOURNAL
+    elif "--reflink" in flags:
+        backup_mode = BACKUP_REFLINK
+    else:
+        backup_mode = BACKUP_COPY
+    return folders, bool(flags & {"-r", "--recursive"}), "--dry-run" in flags, backup_mode
+
+
+def _format_progress(p: Dict[str, Any]) -> str:
+    mb_done = p.get("bytes_done", 0) / (1 << 20)
+    if p.get("total") is None:
+        # 仍在遍历目录：总数未知，显示已发现的数量
+        mb_found = p.get("bytes_discovered", 0) / (1 << 20)
+        return f"MD5 批量修改进行中（仍在扫描）：{p.get('done', 0)}/{p.get('discovered', 0)}+ 个文件，{mb_done:.1f}/{mb_found:.1f}+ MB"
+    mb_total = p.get("bytes_total", 0) / (1 << 20)
+    return f"MD5 批量修改进行中：{p.get('done', 0)}/{p.get('total', 0)} 个文件，{mb_done:.1f}/{mb_total:.1f} MB"
+
+
+def _format_summary(folders: List[str], modified: int, details: List[Dict], dry_run: bool) -> str:
+    counts: Dict[str, int] = {}
+    for d in details:
+        counts[d.get("status", "unknown")] = counts.get(d.get("status", "unknown"), 0) + 1
+    lines = [f"MD5 批量修改{'预览' if dry_run else ''}完成：{', '.join(folders)}", f"修改文件数：{modified}"]
+    lines.extend(f" - {k}: {v}" for k, v in sorted(counts.items()))
+    errors = [d for d in details if d.get("status") == "error"][:5]
+    if errors:
+        lines.append("部分错误：")
+        lines.extend(f" - {d.get('path')}: {d.get('error')}" for d in errors)
+    return "\n".join(lines)
+
+
+def _format_dups(folders: List[str], report: Dict[str, Any]) -> str:
+    duplicates = report.get("duplicates") or []
+    wasted = sum(d["size"] * (len(d["paths"]) - 1) for d in duplicates) / (1 << 20)
+    lines = [
+        f"重复文件扫描完成：{', '.join(folders)}",
+        f"文件数：{report.get('files', 0)}（{report.get('bytes', 0) / (1 << 20):.1f} MB），"
+        f"本次读取计算哈希：部分 {report.get('hashed_partial', 0)} / 完整 {report.get('hashed_full', 0)}",
+        f"重复组：{len(duplicates)}（去重可释放 {wasted:.1f} MB）",
+    ]
+    for d in duplicates[:DUPS_MAX_GROUPS]:
+        lines.append(f" - {d['md5']}（{d['size']} 字节 × {len(d['paths'])}）")
+        lines.extend(f"    {p}" for p in d["paths"][:DUPS_MAX_PATHS])
+        if len(d["paths"]) > DUPS_MAX_PATHS:
+            lines.append(f"    ... 另有 {len(d['paths']) - DUPS_MAX_PATHS} 个")
+    if len(duplicates) > DUPS_MAX_GROUPS:
+        lines.append(f" ... 另有 {len(duplicates) - DUPS_MAX_GROUPS} 组")
+    lines.append(f"MD5 已修改过的文件：{len(report.get('modified') or [])}")
+    errors = (report.get("errors") or [])[:5]
+    if errors:
+        lines.append("部分错误：")
+        lines.extend(f" - {e.get('path')}: {e.get('error')}" for e in errors)
+    return "\n".join(lines)
+
+
+async def md5_dups_command(message: Message, folders: List[str], include_subdirs: bool, workers: int = 4):
+    """只读：不需要 _md5_lock，可与批量修改同时进行"""
+    if not folders:
+        await message.reply(MD5_USAGE)
+        return
+    await message.reply("重复文件扫描已开始...")
+    try:
+        report = await asyncio.to_thread(scan_library, folders, include_subdirs=include_subdirs, workers=workers)
+    except Exception as e:
+        logger.exception("重复文件扫描失败")
+        await message.reply(f"重复文件扫描失败：{e}")
+        return
+    await message.reply(_format_dups(folders, report))
+
+
+async def md5_edit_command(bot_client: Client, message: Message, md5_channel_id: Optional[int], workers: int = 4):
+    folders, include_subdirs, dry_run, backup_mode = parse_md5_args(message.text)
+    if folders and folders[0] == "dups":
+        await md5_dups_command(message, folders[1:], include_subdirs, workers=workers)
+        return
+    if not folders:
+        await message.reply(MD5_USAGE)
+        return
+    if _md5_lock.locked():
+        await message.reply("已有 MD5 批量任务在运行，请等待其完成。")
+        return
+
+    async with _md5_lock:
+        status = await message.reply("MD5 批量修改已开始，正在扫描文件...")
+        latest: Dict[str, Any] = {}
+        loop = asyncio.get_running_loop()
+
+        def on_progress(p: Dict[str, Any]):
+            # 在线程池线程中被调用：只交给事件循环记录最新进度
+            loop.call_soon_threadsafe(latest.update, p)
+
+        async def report_progress():
+            shown = None
+            while True:
+                await asyncio.sleep(MD5_PROGRESS_INTERVAL)
+                if latest and latest.get("done") != shown:
+                    shown = latest.get("done")
+                    try:
+                        await call_with_flood_wait(bot_client.edit_message_text, status.chat.id, status.id, _format_progress(latest))
+                    except Exception:
+                        logger.debug("更新 MD5 进度消息失败", exc_info=True)
+
+        reporter = asyncio.create_task(report_progress())
+        try:
+            modified, details = await asyncio.to_thread(
+                modify_md5_parallel,
+                folders,
+                include_subdirs=include_subdirs,
+                dry_run=dry_run,
+                backup_mode=backup_mode,
+                workers=workers,
+                progress_cb=on_progress,
+            )
+        except Exception as e:
+            logger.exception("MD5 批量修改失败")
+            await message.reply(f"MD5 批量修改失败：{e}（重新发送同一命令可从断点继续）")
+            return
+        finally:
+            reporter.cancel()
+
+    summary = _format_summary(folders, modified, details, dry_run)
+    await message.reply(summary)
+    if md5_channel_id:
+        try:
+            await call_with_flood_wait(bot_client.send_message, md5_channel_id, summary)
+        except Exception:
+            logger.warning("发送 MD5 汇总到 MD5_EDIT_CHANNEL_ID 失败", exc_info=True)
@@ -9,7 +9,7 @@ Bot 主入口 - 解析链接（最小功能，不含按钮）
   - settings.STAGING_CHANNEL_ID
 其它说明：
   - 机器人会尝试对 Telegram 链接使用 copy_message（要求机器人在源频道中）
-  - 对普通网页使用 requests + readability 提取文章
+  - 对普通网页使用 httpx（共享异步连接池）+ readability 提取文章
 """
 
 import os
@@ -30,6 +30,12 @@ logger = logging.getLogger("xbparsing_bot")
 BOT_TOKEN = settings.BOT_TOKEN
 STAGING_CHAT_ID = settings.STAGING_CHANNEL_ID
 
+# 多链接并发解析：全局并发上限 / 单链接超时 / 单条消息最多处理的链接数
+PARSE_CONCURRENCY = max(1, settings.PARSE_CONCURRENCY)
+PARSE_TIMEOUT = settings.PARSE_TIMEOUT
+MAX_URLS_PER_MESSAGE = max(1, settings.MAX_URLS_PER_MESSAGE)
+PARSE_SEMAPHORE = asyncio.Semaphore(PARSE_CONCURRENCY)
+
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher(bot)
 
@@ -64,56 +70,62 @@ async def cmd_start(message: types.Message):
     await message.answer(text)
 
 
+async def _parse_one(url: str) -> Dict[str, Any]:
+    """在全局并发上限内解析单个链接，超过 PARSE_TIMEOUT 秒视为失败"""
+    async with PARSE_SEMAPHORE:
+        try:
+            # parse_url 封装了对 telegram 链接和 http 链接的解析逻辑
+            parsed = await asyncio.wait_for(parse_url(url, bot=bot, staging_chat_id=STAGING_CHAT_ID), timeout=PARSE_TIMEOUT)
+            return {"url": url, "ok": True, "parsed": parsed}
+        except asyncio.TimeoutError:
+            logger.warning("解析链接超时：%s", url)
+            return {"url": url, "ok": False, "error": f"解析超时（超过 {PARSE_TIMEOUT:g} 秒）"}
+        except Exception as e:
+            logger.exception("解析链接出错：%s", url)
+            return {"url": url, "ok": False, "error": str(e)}
+
+
+def format_result(r: Dict[str, Any]) -> str:
+    if not r["ok"]:
+        return f"链接: {r['url']}\n错误: {r['error']}\n"
+    p = r["parsed"]
+    # common fields: kind, title, excerpt, text (maybe), attachments (list)
+    kind = p.get("kind", "unknown")
+    title = p.get("title") or p.get("parsed_title") or ""
+    excerpt = p.get("excerpt") or p.get("parsed_body") or ""
+    attachments = p.get("attachments", [])
+    lines = [f"链接: {r['url']}", f"类型: {kind}", f"标题: {title}"]
+    if excerpt:
+        # keep excerpt length reasonable
+        excerpt_short = (excerpt[:1000] + "...") if len(excerpt) > 1000 else excerpt
+        lines.append(f"摘要: {excerpt_short}")
+    if attachments:
+        lines.append("附件:")
+        for a in attachments:
+            # a: dict with type, name, file_id/mime/size
+            tname = a.get("type", "file")
+            fname = a.get("filename") or a.get("name") or ""
+            fsize = a.get("file_size") or a.get("size") or ""
+            lines.append(f" - {tname} {fname} {fsize}")
+    return "\n".join(lines) + "\n"
+
+
 @dp.message_handler(content_types=types.ContentTypes.TEXT)
 async def handle_text(message: types.Message):
     text = message.text.strip()
-    urls = extract_urls(text)
+    urls = extract_urls(text)[:MAX_URLS_PER_MESSAGE]
     if not urls:
         await message.reply("没有检测到 URL，请发送包含链接的消息。")
         return
 
-    await message.reply("开始解析链接，请稍等（每个链接最多 15 秒）...")
+    await message.reply(f"开始解析 {len(urls)} 个链接，请稍等（每个链接最多 {PARSE_TIMEOUT:g} 秒）...")
 
-    results = []
-    for url in urls:
-        try:
-            # parse_url 封装了对 telegram 链接和 http 链接的解析逻辑
-            parsed = await parse_url(url, bot=bot, staging_chat_id=STAGING_CHAT_ID)
-            results.append({"url": url, "ok": True, "parsed": parsed})
-        except Exception as e:
-            logger.exception("解析链接出错：%s", url)
-            results.append({"url": url, "ok": False, "error": str(e)})
-
-    # 组合回复（尽量简洁）
-    reply_chunks = []
-    for r in results:
-        if not r["ok"]:
-            reply_chunks.append(f"链接: {r['url']}\n错误: {r['error']}\n")
-            continue
-        p = r["parsed"]
-        # common fields: kind, title, excerpt, text (maybe), attachments (list)
-        kind = p.get("kind", "unknown")
-        title = p.get("title") or p.get("parsed_title") or ""
-        excerpt = p.get("excerpt") or p.get("parsed_body") or ""
-        attachments = p.get("attachments", [])
-        lines = [f"链接: {r['url']}", f"类型: {kind}", f"标题: {title}"]
-        if excerpt:
-            # keep excerpt length reasonable
-            excerpt_short = (excerpt[:1000] + "...") if len(excerpt) > 1000 else excerpt
-            lines.append(f"摘要: {excerpt_short}")
-        if attachments:
-            lines.append("附件:")
-            for a in attachments:
-                # a: dict with type, name, file_id/mime/size
-                tname = a.get("type", "file")
-                fname = a.get("filename") or a.get("name") or ""
-                fsize = a.get("file_size") or a.get("size") or ""
-                lines.append(f" - {tname} {fname} {fsize}")
-        reply_chunks.append("\n".join(lines) + "\n")
-
-    final_text = "\n---\n".join(reply_chunks)
-    # send as preformatted for readability
-    await message.reply(final_text, parse_mode=ParseMode.MARKDOWN)
+    # 并发解析，哪个先完成先回复哪个
+    tasks = [asyncio.ensure_future(_parse_one(url)) for url in urls]
+    for fut in asyncio.as_completed(tasks):
+        r = await fut
+        # send as preformatted for readability
+        await message.reply(format_result(r), parse_mode=ParseMode.MARKDOWN)
 
 
 if __name__ == "__main__":
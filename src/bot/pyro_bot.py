@@ -8,23 +8,33 @@
 
 import os
 import re
+import time
 import asyncio
 import logging
-from typing import Optional, List, Any
+from contextlib import contextmanager
+from typing import Optional, List, Tuple
 
 from pyrogram import Client, filters
 from pyrogram.types import Message
 
 from src.core.config import settings
-from src.parser.url_parser_userbot import parse_telegram_link
+from src.api.main import start_metrics_server, stop_metrics_server
+from src.bot.commands import md5_edit_command
+from src.bot.services.user_pool import UserClientPool
+from src.parser.link_cache import ChannelRouteCache, create_link_cache
+from src.utils.http_client import close_http_client
+from src.utils.parse_pool import parse_pool
+from src.utils.peer_cache import peer_cache
+from src.workers.tasks import WorkerContext, new_parse_job
+from src.workers.worker import MemoryJobQueue, Worker, create_job_queue
 
 # Logging: show key steps (INFO) while external libs are quieter
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("xbparsing_bot")
 logging.getLogger("pyrogram").setLevel(logging.WARNING)
 logging.getLogger("pyrogram.session").setLevel(logging.WARNING)
-logging.getLogger("urllib3").setLevel(logging.WARNING)
-logging.getLogger("requests").setLevel(logging.WARNING)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logging.getLogger("httpcore").setLevel(logging.WARNING)
 
 API_ID = settings.API_ID
 API_HASH = settings.API_HASH
@@ -37,6 +47,10 @@ BOT_SESSION_FILE = os.environ.get("BOT_SESSION_FILE") or getattr(settings, "BOT_
 # 仍保留旧的 session_string 回退（来自 core/config.env 的 USER_SESSION）
 USER_SESSION_STRING = getattr(settings, "USER_SESSION", None)
 
+# 额外的 user 账号（账号池）：每项为 session 文件路径或 session string
+USER_POOL_SESSIONS = list(getattr(settings, "USER_POOL_SESSIONS", []) or [])
+USER_POOL_HEALTH_INTERVAL = getattr(settings, "USER_POOL_HEALTH_INTERVAL", 300.0)
+
 # STAGING config
 STAGING_CHANNEL_ID = getattr(settings, "STAGING_CHANNEL_ID", None)
 if STAGING_CHANNEL_ID:
@@ -45,7 +59,50 @@ if STAGING_CHANNEL_ID:
     except Exception:
         logger.warning("STAGING_CHANNEL_ID 配置不是整数，请检查 core/config.env 的值。")
 
-# URL 提取（仅取首个链接）
+# 管理员与 MD5 批量修改配置
+ADMIN_IDS = list(getattr(settings, "ADMIN_TELEGRAM_IDS", []) or [])
+MD5_EDIT_CHANNEL_ID = getattr(settings, "MD5_EDIT_CHANNEL_ID", None)
+MD5_WORKERS = getattr(settings, "MD5_WORKERS", 4)
+
+# 默认发布频道（可选）
+PUBLISH_CHANNEL_ID = getattr(settings, "PUBLISH_CHANNEL_ID", None)
+
+# t.me 链接解析结果缓存（memory / redis）
+LINK_CACHE = create_link_cache(
+    backend=getattr(settings, "LINK_CACHE_BACKEND", "memory"),
+    redis_url=getattr(settings, "REDIS_URL", None),
+    ttl=getattr(settings, "LINK_CACHE_TTL", 600.0),
+    negative_ttl=getattr(settings, "LINK_CACHE_NEGATIVE_TTL", 60.0),
+    max_size=getattr(settings, "LINK_CACHE_MAX_SIZE", 2048),
+)
+
+# 公开频道链接：网页抓取与 user API 的对冲延迟 / 每个频道可用路径的记忆
+TME_HEDGE_DELAY = getattr(settings, "TME_HEDGE_DELAY", 1.5)
+CHANNEL_ROUTES = ChannelRouteCache(ttl=getattr(settings, "TME_ROUTE_TTL", 21600.0))
+
+# HTML 解析进程池：子进程数 / 内联解析的页面大小上限
+parse_pool.configure(
+    processes=getattr(settings, "PARSE_PROCESSES", 2),
+    inline_max_chars=getattr(settings, "PARSE_INLINE_MAX_CHARS", 65536),
+)
+
+# peer 解析缓存：用户名条目有效期（启动时预解析 staging / MD5 / 发布频道）
+peer_cache.configure(username_ttl=getattr(settings, "PEER_USERNAME_TTL", 86400.0))
+
+# 指标端点（/metrics）：监听地址 / 端口（<=0 不启动）
+METRICS_HOST = getattr(settings, "METRICS_HOST", "127.0.0.1")
+METRICS_PORT = getattr(settings, "METRICS_PORT", 9108)
+
+# 多链接解析：单链接解析超时 / 单条消息最多处理的链接数
+PARSE_TIMEOUT = getattr(settings, "PARSE_TIMEOUT", 15.0)
+MAX_URLS_PER_MESSAGE = max(1, getattr(settings, "MAX_URLS_PER_MESSAGE", 10))
+
+# 后台任务：队列后端 / 本进程内 worker 并发数（sqlite、redis 后端可设为 0，仅由独立 worker 进程消费）/ 单用户并发上限
+JOB_QUEUE_BACKEND = getattr(settings, "JOB_QUEUE_BACKEND", "memory")
+WORKER_CONCURRENCY = getattr(settings, "WORKER_CONCURRENCY", 4)
+WORKER_PER_CHAT_LIMIT = getattr(settings, "WORKER_PER_CHAT_LIMIT", 2)
+
+# URL 提取
 URL_RE = re.compile(r"(https?://[^\s<>\"'()]+|t\.me/[^\s<>\"'()]+|telegram\.me/[^\s<>\"'()]+)", re.IGNORECASE)
 
 
@@ -54,6 +111,11 @@ def extract_first_url(text: str) -> Optional[str]:
     return m.group(0) if m else None
 
 
+def extract_urls(text: str) -> List[str]:
+    """提取全部链接（去重并保持顺序）"""
+    return list(dict.fromkeys(URL_RE.findall(text or "")))
+
+
 def session_file_available(path: Optional[str]) -> bool:
     if not path:
         return False
@@ -63,11 +125,37 @@ def session_file_available(path: Optional[str]) -> bool:
         return False
 
 
-async def start_clients():
+def configured_channels() -> List[int]:
+    return [c for c in (STAGING_CHANNEL_ID, MD5_EDIT_CHANNEL_ID, PUBLISH_CHANNEL_ID) if c is not None]
+
+
+class StartupTimer:
+    """记录启动各阶段耗时，启动完成后输出一行汇总"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - t0))
+
+    def summary(self) -> str:
+        parts = " / ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases)
+        return f"启动完成，用时 {time.perf_counter() - self.started:.2f}s（{parts}）"
+
+
+async def start_clients(timer: Optional[StartupTimer] = None, check_staging: bool = True):
     """
-    启动并返回 (user_client, bot_client).
+    启动并返回 (user_client, bot_client)，两个客户端并发启动.
     会优先使用 USER_SESSION_FILE / BOT_SESSION_FILE（完整路径）；若不可用则退回到 session_string 或本地 session 名称。
+    check_staging=False 时不做 staging 检测，由调用方稍后（例如在后台）调用 check_staging_access。
     """
+    timer = timer or StartupTimer()
     # user client selection
     user_client = None
     if USER_SESSION_FILE and session_file_available(USER_SESSION_FILE):
@@ -90,188 +178,159 @@ async def start_clients():
         # default bot session name (bot_token will be used to create bot session)
         bot_client = Client("bot_session", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN)
 
-    # start both clients
-    await user_client.start()
-    logger.info("user_client started")
-    await bot_client.start()
-    logger.info("bot_client started")
+    # start both clients concurrently
+    with timer.phase("clients"):
+        await asyncio.gather(user_client.start(), bot_client.start())
+    logger.info("user_client / bot_client started")
 
-    # staging availability check (if configured)
-    if STAGING_CHANNEL_ID is not None:
-        logger.info("检测 STAGING_CHANNEL_ID: %s，可访问性校验中...", STAGING_CHANNEL_ID)
-        user_ok = True
-        bot_ok = True
-        try:
-            await user_client.get_chat(STAGING_CHANNEL_ID)
-            logger.info("user_client 能访问 STAGING_CHANNEL_ID")
-        except Exception as e:
-            user_ok = False
-            logger.warning("user_client 无法访问 STAGING_CHANNEL_ID: %s", e)
-        try:
-            await bot_client.get_chat(STAGING_CHANNEL_ID)
-            logger.info("bot_client 能访问 STAGING_CHANNEL_ID")
-        except Exception as e:
-            bot_ok = False
-            logger.warning("bot_client 无法访问 STAGING_CHANNEL_ID: %s", e)
-        if not user_ok or not bot_ok:
-            logger.warning(
-                "STAGING_CHANNEL_ID 访问检测未通过。请确保：\n"
-                " 1) STAGING_CHANNEL_ID 已正确配置为整数 chat_id（以 -100 开头）。\n"
-                " 2) USER_SESSION 对应的账号已加入该频道并有发送权限（用于 forward）。\n"
-                " 3) Bot 已加入该频道并能读取消息（用于 copy_message）。"
-            )
+    if check_staging:
+        with timer.phase("staging_check"):
+            await check_staging_access(user_client, bot_client)
 
     return user_client, bot_client
 
 
-# (下面的函数维持之前实现：collect_album_messages / forward / copy / handler 等)
-# 为简洁起见，直接复用之前可靠的实现（此处略去重复注释）
-async def collect_album_messages(user_client: Client, msg_obj: Message) -> List[Message]:
-    media_group_id = getattr(msg_obj, "media_group_id", None)
-    if not media_group_id:
-        return [msg_obj]
-    chat_id = getattr(getattr(msg_obj, "chat", None), "id", None)
-    if chat_id is None:
-        return [msg_obj]
-    logger.info("消息属于 media_group=%s，尝试收集该组内消息", media_group_id)
-    group_msgs = []
-    try:
-        mid = int(getattr(msg_obj, "message_id", getattr(msg_obj, "id", 0)) or 0)
-        try:
-            older = await user_client.get_history(chat_id, limit=500, offset_id=mid + 1)
-        except Exception:
-            older = []
-        try:
-            newer = await user_client.get_history(chat_id, limit=500)
-        except Exception:
-            newer = []
-        candidates = list(older) + list(newer)
-    except Exception:
-        try:
-            candidates = await user_client.get_history(chat_id, limit=1000)
-        except Exception:
-            candidates = []
-    for m in candidates:
-        if getattr(m, "media_group_id", None) == media_group_id:
-            group_msgs.append(m)
-    if all((getattr(m, "message_id", getattr(m, "id", None)) != getattr(msg_obj, "message_id", getattr(msg_obj, "id", None))) for m in group_msgs):
-        group_msgs.append(msg_obj)
+async def _check_chat_access(client: Client, label: str, chat_id: int) -> bool:
     try:
-        group_msgs.sort(key=lambda x: getattr(x, "message_id", getattr(x, "id", 0)))
-    except Exception:
-        pass
-    logger.info("收集到 %d 条同组消息用于转发", len(group_msgs))
-    return group_msgs or [msg_obj]
+        await client.get_chat(chat_id)
+        logger.info("%s 能访问 STAGING_CHANNEL_ID", label)
+        return True
+    except Exception as e:
+        logger.warning("%s 无法访问 STAGING_CHANNEL_ID: %s", label, e)
+        return False
 
 
-async def forward_group_to_staging(user_client: Client, staging_chat_id: int, from_chat_id: Any, msg_ids: List[int]) -> List[Message]:
-    logger.info("准备将 %d 条消息从 %s 转发到 staging=%s", len(msg_ids), from_chat_id, staging_chat_id)
-    try:
-        await user_client.get_chat(staging_chat_id)
-    except Exception as e:
-        logger.exception("转发前无法 resolve staging chat，user_client.get_chat 失败")
-        raise RuntimeError(f"user account 无法访问或未加入 staging channel (id={staging_chat_id}): {e}")
-    try:
-        res = await user_client.forward_messages(chat_id=staging_chat_id, from_chat_id=from_chat_id, message_ids=msg_ids)
-        forwarded = res if isinstance(res, list) else [res]
-        logger.info("转发到 staging 成功，得到 %d 条转发消息", len(forwarded))
-        return forwarded
-    except Exception as e:
-        logger.exception("转发到 staging 失败")
-        raise RuntimeError(f"转发到 staging 失败: {e}")
+async def check_staging_access(user_client: Client, bot_client: Client):
+    """
+    预解析配置的频道，并行检测 user / bot 对 STAGING_CHANNEL_ID 的访问（只记日志，不影响启动）
+    """
+    started = time.perf_counter()
 
+    async def check_user() -> bool:
+        # 预解析配置的频道（已持久化的 peer 直接写入 storage，不发起请求），之后转发 / 发布不再逐次 get_chat
+        configured = configured_channels()
+        if configured:
+            resolved = await peer_cache.warm(user_client, configured)
+            logger.info("预解析配置频道 %d/%d 个", resolved, len(configured))
+        if STAGING_CHANNEL_ID is None:
+            return True
+        return await _check_chat_access(user_client, "user_client", STAGING_CHANNEL_ID)
 
-async def copy_forwarded_to_user(bot_client: Client, staging_chat_id: int, forwarded_msgs: List[Message], target_chat_id: int) -> int:
-    logger.info("开始把 staging 中的转发消息复制到用户 %s", target_chat_id)
-    copied_count = 0
-    for fm in forwarded_msgs:
-        try:
-            mid = getattr(fm, "message_id", getattr(fm, "id", None))
-            if mid is None:
-                continue
-            await bot_client.copy_message(chat_id=target_chat_id, from_chat_id=staging_chat_id, message_id=mid)
-            copied_count += 1
-        except Exception:
-            logger.exception("copy_message 失败 for staging msg %s", fm)
-    logger.info("复制完成，共复制 %d 条消息给用户 %s", copied_count, target_chat_id)
-    return copied_count
+    async def check_bot() -> bool:
+        if STAGING_CHANNEL_ID is None:
+            return True
+        return await _check_chat_access(bot_client, "bot_client", STAGING_CHANNEL_ID)
+
+    if STAGING_CHANNEL_ID is not None:
+        logger.info("检测 STAGING_CHANNEL_ID: %s，可访问性校验中...", STAGING_CHANNEL_ID)
+    user_ok, bot_ok = await asyncio.gather(check_user(), check_bot())
+    if not user_ok or not bot_ok:
+        logger.warning(
+            "STAGING_CHANNEL_ID 访问检测未通过。请确保：\n"
+            " 1) STAGING_CHANNEL_ID 已正确配置为整数 chat_id（以 -100 开头）。\n"
+            " 2) USER_SESSION 对应的账号已加入该频道并有发送权限（用于 forward）。\n"
+            " 3) Bot 已加入该频道并能读取消息（用于 copy_message）。"
+        )
+    logger.info("启动检测完成，用时 %.2fs", time.perf_counter() - started)
+
+
+async def start_user_pool(user_client: Client) -> Optional[UserClientPool]:
+    """
+    并发启动 USER_POOL_SESSIONS 中的额外 user 账号，与 user_client 组成账号池；没有可用的额外账号时返回 None
+    单个额外账号启动失败只记日志并跳过；健康检查在后台进行
+    """
+    if not USER_POOL_SESSIONS:
+        return None
+    clients = []
+    for index, session in enumerate(USER_POOL_SESSIONS, start=1):
+        if session_file_available(session):
+            clients.append(Client(session, api_id=API_ID, api_hash=API_HASH))
+        else:
+            clients.append(Client(f"userbot_pool_{index}", api_id=API_ID, api_hash=API_HASH, session_string=session))
+    results = await asyncio.gather(*(c.start() for c in clients), return_exceptions=True)
+    extras = []
+    for index, (client, result) in enumerate(zip(clients, results), start=1):
+        if isinstance(result, BaseException):
+            logger.warning("额外 user 账号 #%d 启动失败，跳过: %s", index, result)
+        else:
+            extras.append(client)
+    if not extras:
+        return None
+    await asyncio.gather(*(peer_cache.warm(c, configured_channels()) for c in extras))
+    pool = UserClientPool([user_client, *extras], staging_chat_id=STAGING_CHANNEL_ID, owned=extras)
+    pool.start_health_checks(USER_POOL_HEALTH_INTERVAL, immediate=True)
+    logger.info("user 账号池已启动：%d 个账号", len(pool))
+    return pool
 
 
 async def main():
-    user_client, bot_client = await start_clients()
+    timer = StartupTimer()
+    user_client, bot_client = await start_clients(timer, check_staging=False)
+    # staging 检测与频道预解析在后台进行，不推迟开始接收消息
+    staging_check = asyncio.create_task(check_staging_access(user_client, bot_client))
+    with timer.phase("user_pool"):
+        user_pool = await start_user_pool(user_client)
+    # 后台拉起解析子进程，不阻塞启动
+    warm_up = asyncio.create_task(parse_pool.warm_up())
+    with timer.phase("metrics"):
+        metrics_server = await start_metrics_server(METRICS_HOST, METRICS_PORT, user_pool=user_pool, link_cache=LINK_CACHE)
+
+    # 链接处理以任务形式入队，由后台 worker 执行；handler 只负责入队并立即返回
+    with timer.phase("job_queue"):
+        job_queue = create_job_queue(JOB_QUEUE_BACKEND, getattr(settings, "REDIS_URL", None))
+    ctx = WorkerContext(
+        user_client=user_client,
+        bot_client=bot_client,
+        queue=job_queue,
+        staging_chat_id=STAGING_CHANNEL_ID,
+        link_cache=LINK_CACHE,
+        parse_timeout=PARSE_TIMEOUT,
+        channel_routes=CHANNEL_ROUTES,
+        hedge_delay=TME_HEDGE_DELAY,
+        user_pool=user_pool,
+    )
+    worker = None
+    if WORKER_CONCURRENCY > 0 or isinstance(job_queue, MemoryJobQueue):
+        worker = Worker(job_queue, ctx, concurrency=max(1, WORKER_CONCURRENCY), per_chat_limit=WORKER_PER_CHAT_LIMIT)
+        worker.start()
+    else:
+        logger.info("WORKER_CONCURRENCY=0：本进程只负责入队，任务由独立 worker 进程（python3 -m src.workers.worker）执行")
+
+    # 管理员命令需在通用文本 handler 之前注册（同一 group 内只会命中第一个匹配的 handler）
+    @bot_client.on_message(filters.private & filters.command("md5") & filters.user(ADMIN_IDS))
+    async def handle_md5(client: Client, message: Message):
+        await md5_edit_command(bot_client, message, MD5_EDIT_CHANNEL_ID, workers=MD5_WORKERS)
 
     @bot_client.on_message(filters.private & filters.text)
     async def handle_private(client: Client, message: Message):
         text = (message.text or "").strip()
-        url = extract_first_url(text)
-        if not url:
+        urls = extract_urls(text)[:MAX_URLS_PER_MESSAGE]
+        if not urls:
             await message.reply("请发送要解析的链接（支持 t.me 帖子链接或网页链接）。")
             return
-        await message.reply("收到链接，开始解析与转发流程，请稍等...")
-        try:
-            parsed = await parse_telegram_link(url, user_client)
-        except Exception as e:
-            logger.exception("解析失败")
-            await message.reply(f"解析失败：{e}")
-            return
-        if parsed.get("kind") == "telegram_api" and parsed.get("message_obj"):
-            msg_obj = parsed["message_obj"]
-            source_chat_id = parsed.get("source_chat_id") or getattr(getattr(msg_obj, "chat", None), "id", None)
-            source_msg_id = parsed.get("source_message_id") or getattr(msg_obj, "message_id", getattr(msg_obj, "id", None))
-            if not source_chat_id or not source_msg_id:
-                logger.warning("未能确认原始消息的 chat_id 或 message_id，退回文本展示")
-                await message.reply(parsed.get("parsed_body") or "无法获取原帖标识")
-                return
-            if getattr(msg_obj, "media_group_id", None):
-                group_msgs = await collect_album_messages(user_client, msg_obj)
-            else:
-                group_msgs = [msg_obj]
-            msg_ids = [int(getattr(m, "message_id", getattr(m, "id", None))) for m in group_msgs]
-            if STAGING_CHANNEL_ID is None:
-                await message.reply("STAGING_CHANNEL_ID 未配置，无法执行转发操作。请在 core/config.env 设置 STAGING_CHANNEL_ID（例如 -1001234567890）。")
-                return
-            try:
-                forwarded = await forward_group_to_staging(user_client, STAGING_CHANNEL_ID, source_chat_id, msg_ids)
-            except Exception as e:
-                await message.reply(
-                    "转发到私密频道失败。\n可能原因与处理方式：\n"
-                    "- user account 未加入或无发送权限，请把用于 USER_SESSION 的账号加入 STAGING_CHANNEL 并允许发送消息。\n"
-                    "- staging id 配置错误，请确认 core/config.env 中 STAGING_CHANNEL_ID 为正确 chat_id（私有以 -100 开头）。\n"
-                    f"详细错误: {e}"
-                )
-                return
-            try:
-                cnt = await copy_forwarded_to_user(bot_client, STAGING_CHANNEL_ID, forwarded, message.chat.id)
-                if cnt > 0:
-                    await message.reply("解析并转发完成，原帖媒体与描述已返回（未在服务器保存媒体）。")
-                else:
-                    await message.reply("转发成功，但未能复制任何消息回您（请检查 bot 是否加入 STAGING_CHANNEL 并有读取权限）。")
-            except Exception as e:
-                await message.reply(f"从私密频道复制回用户失败：{e}")
-            return
-        lines = []
-        if parsed.get("parsed_title"):
-            lines.append(f"标题: {parsed.get('parsed_title')}")
-        if parsed.get("parsed_body"):
-            body = parsed.get("parsed_body")
-            if len(body) > 2000:
-                body = body[:2000] + "..."
-            lines.append("正文:\n" + body)
-        attachments = parsed.get("attachments") or []
-        if attachments:
-            lines.append("附件:")
-            for a in attachments:
-                atype = a.get("type")
-                url_a = a.get("url") or ""
-                fname = a.get("file_name") or a.get("text") or ""
-                size = a.get("file_size") or ""
-                lines.append(f" - {atype} (url: {url_a}, name:{fname}, size:{size})")
-        await message.reply("\n".join(lines) or "未解析到可用内容")
+        reply_to = getattr(message, "id", getattr(message, "message_id", None))
+        for url in urls:
+            await job_queue.put(new_parse_job(url, message.chat.id, reply_to=reply_to, show_url=len(urls) > 1))
+        if len(urls) == 1:
+            await message.reply("收到链接，开始解析与转发流程，请稍等...")
+        else:
+            await message.reply(f"收到 {len(urls)} 个链接，开始并发解析与转发，每个链接完成后单独回复，请稍等...")
 
+    logger.info(timer.summary())
     logger.info("机器人已启动，等待私聊消息进行解析。")
     try:
         await asyncio.Event().wait()
     finally:
+        if worker is not None:
+            await worker.stop()
+        await job_queue.close()
+        await close_http_client()
+        await stop_metrics_server(metrics_server)
+        warm_up.cancel()
+        staging_check.cancel()
+        parse_pool.shutdown()
+        if user_pool is not None:
+            await user_pool.stop()
         await bot_client.stop()
         await user_client.stop()
 
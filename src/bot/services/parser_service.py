@@ -0,0 +1,224 @@
+"""
+链接处理流程中与 Telegram 交互的步骤（bot 进程内联调用，也供 src/workers 的任务复用）
+- collect_album_messages / collect_album_by_id：按 id 窗口收集同一 media_group 的消息
+- forward_group_to_staging / forward_group_to_staging_dedup：user 账号把源消息转发到 staging 频道（带去重索引）
+- copy_forwarded_to_user：bot 把 staging 中的消息复制给用户
+- format_parsed_text：非转发类解析结果的文本展示
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from pyrogram import Client
+from pyrogram.errors import FloodWait
+from pyrogram.types import Message
+
+from src.bot.services.tg_api import call_with_flood_wait, copy_messages_batched
+from src.models.content import get_staging_forward, save_staging_forward
+from src.utils.lru_cache import LRUTTLCache
+from src.utils.metrics import timed, track
+from src.utils.peer_cache import STALE_PEER_ERRORS, PeerAccessError, peer_cache
+
+logger = logging.getLogger("xbparsing_bot")
+
+# 相册收集：锚点消息前后各取 ALBUM_WINDOW 条，必要时最多再扩展 ALBUM_MAX_WIDEN 次；结果缓存 1 小时
+ALBUM_WINDOW = 9
+ALBUM_MAX_SIZE = 10
+ALBUM_MAX_WIDEN = 2
+ALBUM_CACHE = LRUTTLCache(maxsize=512, ttl=3600.0)
+
+STAGING_FORWARD_FAILED_TEXT = (
+    "转发到私密频道失败。\n可能原因与处理方式：\n"
+    "- user account 未加入或无发送权限，请把用于 USER_SESSION 的账号加入 STAGING_CHANNEL 并允许发送消息。\n"
+    "- staging id 配置错误，请确认 core/config.env 中 STAGING_CHANNEL_ID 为正确 chat_id（私有以 -100 开头）。\n"
+)
+
+
+async def collect_album_messages(user_client: Client, msg_obj: Message) -> List[Message]:
+    """
+    收集与 msg_obj 同一 media_group 的消息。
+    相册最多 10 条且 id 连续，因此只按 id 窗口 [mid-9, mid+9] 取约 20 条消息；
+    仅当同组消息落在窗口边界上（可能被截断）时才向该方向扩展窗口。
+    结果按 (chat_id, media_group_id) 缓存。
+    """
+    media_group_id = getattr(msg_obj, "media_group_id", None)
+    chat_id = getattr(getattr(msg_obj, "chat", None), "id", None)
+    mid = int(getattr(msg_obj, "message_id", getattr(msg_obj, "id", 0)) or 0)
+    if not media_group_id or chat_id is None or mid <= 0:
+        return [msg_obj]
+    return await _collect_album(user_client, chat_id, mid, media_group_id, msg_obj)
+
+
+async def collect_album_by_id(user_client: Client, chat_id: int, msg_id: int, media_group_id: str) -> List[Message]:
+    """
+    同 collect_album_messages，但只需要锚点消息的 id（链接缓存命中的结果没有 Message 对象）
+    命中相册缓存时不发起请求；同组消息都已不存在时返回空列表
+    """
+    return await _collect_album(user_client, chat_id, int(msg_id), media_group_id, None)
+
+
+async def _collect_album(user_client: Client, chat_id: int, mid: int, media_group_id: str, anchor: Optional[Message]) -> List[Message]:
+    with track("collect_album") as t:
+        group_msgs, cache_hit = await _collect_album_messages(user_client, chat_id, mid, media_group_id, anchor)
+        if cache_hit:
+            t.outcome = "cache_hit"
+        return group_msgs
+
+
+async def _collect_album_messages(
+    user_client: Client, chat_id: int, mid: int, media_group_id: str, anchor: Optional[Message]
+) -> Tuple[List[Message], bool]:
+    cache_key = (chat_id, media_group_id)
+    cached = ALBUM_CACHE.get(cache_key)
+    if cached:
+        logger.info("media_group=%s 命中相册缓存（%d 条）", media_group_id, len(cached))
+        return cached, True
+    logger.info("消息属于 media_group=%s，按 id 窗口收集该组内消息", media_group_id)
+    if anchor is None:
+        # 没有取过锚点消息：先确保该账号的 storage 中有这个 chat 的 peer
+        try:
+            await peer_cache.resolve(user_client, chat_id)
+        except STALE_PEER_ERRORS as e:
+            await peer_cache.invalidate(user_client, chat_id)
+            raise PeerAccessError(f"无法访问相册所在的 chat {chat_id}: {e}")
+
+    group = {mid: anchor} if anchor is not None else {}
+    lo, hi = max(1, mid - ALBUM_WINDOW), mid + ALBUM_WINDOW
+    pending = [(lo, hi)]
+    widen_left = widen_right = ALBUM_MAX_WIDEN
+    complete = True
+    while pending:
+        start, stop = pending.pop()
+        try:
+            fetched = await call_with_flood_wait(user_client.get_messages, chat_id, list(range(start, stop + 1)))
+        except FloodWait:
+            # 不返回残缺的相册：交给账号池换账号重新收集
+            raise
+        except Exception:
+            logger.warning("按 id 窗口获取相册消息失败 chat=%s ids=%s..%s", chat_id, start, stop, exc_info=True)
+            complete = False
+            break
+        for m in fetched if isinstance(fetched, list) else [fetched]:
+            if m is None or getattr(m, "empty", False):
+                continue
+            if getattr(m, "media_group_id", None) == media_group_id:
+                group[int(getattr(m, "message_id", getattr(m, "id", 0)))] = m
+        # 同组消息触及窗口边界（且尚未凑满 10 条）时，向该方向再扩一个窗口
+        if not group or len(group) >= ALBUM_MAX_SIZE:
+            break
+        if min(group) <= lo and lo > 1 and widen_left > 0:
+            widen_left -= 1
+            new_lo = max(1, lo - ALBUM_WINDOW - 1)
+            pending.append((new_lo, lo - 1))
+            lo = new_lo
+        if max(group) >= hi and widen_right > 0:
+            widen_right -= 1
+            new_hi = hi + ALBUM_WINDOW + 1
+            pending.append((hi + 1, new_hi))
+            hi = new_hi
+
+    group_msgs = [group[k] for k in sorted(group)]
+    if complete and group_msgs:
+        ALBUM_CACHE.set(cache_key, group_msgs)
+    logger.info("收集到 %d 条同组消息用于转发", len(group_msgs))
+    return group_msgs, False
+
+
+@timed("forward_to_staging")
+async def forward_group_to_staging(user_client: Client, staging_chat_id: int, from_chat_id: Any, msg_ids: List[int]) -> List[Message]:
+    logger.info("准备将 %d 条消息从 %s 转发到 staging=%s", len(msg_ids), from_chat_id, staging_chat_id)
+    # staging peer 通常已在启动时解析并缓存，这里不再发起 get_chat
+    try:
+        staging_peer = await peer_cache.resolve(user_client, staging_chat_id)
+    except STALE_PEER_ERRORS as e:
+        # 该账号无法访问 staging：换用其它账号（账号池）
+        await peer_cache.invalidate(user_client, staging_chat_id)
+        logger.warning("转发前无法 resolve staging chat: %s", e)
+        raise PeerAccessError(f"user account 无法访问或未加入 staging channel (id={staging_chat_id}): {e}")
+    except FloodWait:
+        raise
+    except Exception as e:
+        logger.exception("转发前无法 resolve staging chat")
+        raise RuntimeError(f"user account 无法访问或未加入 staging channel (id={staging_chat_id}): {e}")
+    try:
+        # 链接缓存命中时该账号可能还没取过源消息：经 peer 缓存把源 chat 写入 storage（通常不发起请求）
+        source_peer = await peer_cache.resolve(user_client, from_chat_id)
+        res = await call_with_flood_wait(user_client.forward_messages, chat_id=staging_peer, from_chat_id=source_peer, message_ids=msg_ids)
+        forwarded = res if isinstance(res, list) else [res]
+        logger.info("转发到 staging 成功，得到 %d 条转发消息", len(forwarded))
+        return forwarded
+    except STALE_PEER_ERRORS as e:
+        # 无法区分是源 chat 还是 staging 无权访问，不清除 staging peer 缓存
+        # （staging 真正失效时由账号池健康检查清除）
+        logger.warning("转发到 staging 失败（无权访问源 chat 或 staging）: %s", e)
+        raise PeerAccessError(f"user account 无法访问源 chat {from_chat_id} 或 staging channel (id={staging_chat_id}): {e}")
+    except FloodWait:
+        # 由账号池换账号或由后台任务按等待秒数延后重试
+        raise
+    except Exception as e:
+        logger.exception("转发到 staging 失败")
+        raise RuntimeError(f"转发到 staging 失败: {e}")
+
+
+async def forward_group_to_staging_dedup(user_client: Client, staging_chat_id: int, from_chat_id: Any, msg_ids: List[int]) -> Tuple[List[Any], bool]:
+    """
+    先查 staging 转发索引：同一组源消息已转发过时直接返回 staging 中的消息 id（reused=True），
+    否则调用 forward_group_to_staging 并写入索引。
+    返回 (forwarded, reused)；forwarded 为 Message 列表或 staging 消息 id 列表
+    """
+    try:
+        cached = await asyncio.to_thread(get_staging_forward, from_chat_id, msg_ids, staging_chat_id)
+    except Exception:
+        logger.warning("读取 staging 转发索引失败", exc_info=True)
+        cached = None
+    if cached:
+        logger.info("命中 staging 转发索引：%s %s -> staging %s", from_chat_id, msg_ids, cached)
+        return cached, True
+    forwarded = await forward_group_to_staging(user_client, staging_chat_id, from_chat_id, msg_ids)
+    staging_ids = [mid for mid in (getattr(m, "message_id", getattr(m, "id", None)) for m in forwarded) if mid is not None]
+    try:
+        await asyncio.to_thread(save_staging_forward, from_chat_id, msg_ids, staging_chat_id, staging_ids)
+    except Exception:
+        logger.warning("写入 staging 转发索引失败", exc_info=True)
+    return forwarded, False
+
+
+async def copy_forwarded_to_user(bot_client: Client, staging_chat_id: int, forwarded_msgs: List[Any], target_chat_id: int) -> Tuple[int, List[Dict]]:
+    """
+    把 staging 中的消息复制给用户（相册整组 copy_media_group，失败时逐条 copy_message）
+    返回 (copied_count, details)，details 为每条 staging 消息的结果
+    """
+    logger.info("开始把 staging 中的转发消息复制到用户 %s", target_chat_id)
+    with track("copy_to_user") as t:
+        details = await copy_messages_batched(bot_client, staging_chat_id, forwarded_msgs, target_chat_id)
+        copied_count = sum(1 for d in details if d.get("status") == "copied")
+        if copied_count < len(details):
+            t.outcome = "partial" if copied_count else "none_copied"
+    failed = [d["message_id"] for d in details if d.get("status") != "copied"]
+    if failed:
+        logger.warning("以下 staging 消息复制失败: %s", failed)
+    logger.info("复制完成，共复制 %d 条消息给用户 %s", copied_count, target_chat_id)
+    return copied_count, details
+
+
+def format_parsed_text(parsed: Dict[str, Any], url: Optional[str] = None) -> str:
+    """把 telegram_web / webpage 等解析结果整理为回复文本；url 非空时在首行标注链接"""
+    lines = [f"链接: {url}"] if url else []
+    if parsed.get("parsed_title"):
+        lines.append(f"标题: {parsed.get('parsed_title')}")
+    if parsed.get("parsed_body"):
+        body = parsed.get("parsed_body")
+        if len(body) > 2000:
+            body = body[:2000] + "..."
+        lines.append("正文:\n" + body)
+    attachments = parsed.get("attachments") or []
+    if attachments:
+        lines.append("附件:")
+        for a in attachments:
+            atype = a.get("type")
+            url_a = a.get("url") or ""
+            fname = a.get("file_name") or a.get("text") or ""
+            size = a.get("file_size") or ""
+            lines.append(f" - {atype} (url: {url_a}, name:{fname}, size:{size})")
+    return "\n".join(lines) or "未解析到可用内容"
@@ -0,0 +1,79 @@
+"""
+Telegram API 调用辅助
+- call_with_flood_wait：所有 Telegram API 调用的统一入口，经全局令牌桶调度器限流，
+  FloodWait 由调度器封锁对应方法并重新排队（见 src/utils/rate_limiter.py）
+- copy_messages_batched：把 staging 中的消息复制给用户；相册用 copy_media_group 一次复制整组，
+  单条消息或整组复制失败时逐条 copy_message 兜底，并返回每条消息的结果
+"""
+
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pyrogram import Client
+
+from src.utils.rate_limiter import telegram_scheduler
+
+logger = logging.getLogger(__name__)
+
+
+async def call_with_flood_wait(func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+    return await telegram_scheduler.call(func, *args, **kwargs)
+
+
+def _item_id(item: Any) -> Optional[int]:
+    if isinstance(item, int):
+        return item
+    mid = getattr(item, "message_id", getattr(item, "id", None))
+    return int(mid) if mid is not None else None
+
+
+def _plan_batches(items: List[Any]) -> List[Tuple[List[int], bool]]:
+    """
+    把待复制的消息切分为批次：[(message_ids, is_album_candidate), ...]
+    - Message 对象：相邻且 media_group_id 相同的消息为一组
+    - 纯 id（来自 staging 转发索引，不知道分组）：相邻的 id 作为一个候选组，由 copy_media_group 验证
+    """
+    batches: List[Tuple[List[int], bool]] = []
+    current: List[int] = []
+    current_key: Any = None
+    for item in items:
+        mid = _item_id(item)
+        if mid is None:
+            continue
+        key = "ids" if isinstance(item, int) else getattr(item, "media_group_id", None)
+        if current and key is not None and key == current_key:
+            current.append(mid)
+            continue
+        if current:
+            batches.append((current, len(current) > 1))
+        current, current_key = [mid], key
+    if current:
+        batches.append((current, len(current) > 1))
+    return batches
+
+
+async def copy_messages_batched(bot_client: Client, from_chat_id: Any, items: List[Any], target_chat_id: Any) -> List[Dict[str, Any]]:
+    """
+    返回每条源消息的结果：{"message_id", "status": "copied"/"failed", "method", "error"(可选)}
+    """
+    results: List[Dict[str, Any]] = []
+    for ids, is_album in _plan_batches(items):
+        remaining = ids
+        if is_album:
+            try:
+                copied = await call_with_flood_wait(
+                    bot_client.copy_media_group, chat_id=target_chat_id, from_chat_id=from_chat_id, message_id=ids[0]
+                )
+                covered = min(len(copied or []), len(ids))
+                results.extend({"message_id": mid, "status": "copied", "method": "copy_media_group"} for mid in ids[:covered])
+                remaining = ids[covered:]
+            except Exception as e:
+                logger.info("copy_media_group 失败，改为逐条复制 ids=%s: %s", ids, e)
+        for mid in remaining:
+            try:
+                await call_with_flood_wait(bot_client.copy_message, chat_id=target_chat_id, from_chat_id=from_chat_id, message_id=mid)
+                results.append({"message_id": mid, "status": "copied", "method": "copy_message"})
+            except Exception as e:
+                logger.warning("copy_message 失败 for staging msg %s: %s", mid, e)
+                results.append({"message_id": mid, "status": "failed", "method": "copy_message", "error": str(e)})
+    return results
@@ -0,0 +1,255 @@
+"""
+user 账号池：多个 Pyrogram user 会话分担 get_messages / forward_messages，各账号的 FloodWait 预算互不影响
+- 路由：优先选已知是目标 chat 成员的账号；其余按当前占用（进行中的调用数）最少者优先
+- 账号无权访问目标 chat（PeerAccessError）时记下并换下一个账号重试，成功的账号记为该 chat 的成员
+- 账号触发 FloodWait（telegram_scheduler 回调）后暂停分配，直到等待结束；还有其它账号可换时，
+  超过 REROUTE_FLOOD_WAIT 秒的 FloodWait 不在该账号上等待，当前请求直接换下一个账号
+- 健康检查（与 check_user_staging.py 相同的步骤）：get_me 确认会话可用，get_chat_member 确认在 staging 频道中；
+  未通过的账号排在最后（转发任务只在没有其它账号时才会用到 staging 检查未通过的账号）
+- 只有一个账号时行为与单账号相同：所有调用都落在该账号上
+
+使用：
+  pool = UserClientPool([user_client, extra_client], staging_chat_id=STAGING_CHANNEL_ID)
+  pool.start_health_checks(interval, immediate=True)
+  msg = await pool.run(lambda c: fetch(c), chat=chat_id)
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import nullcontext
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, TypeVar
+
+from pyrogram.enums import ChatMemberStatus
+from pyrogram.errors import FloodWait
+
+from src.utils.lru_cache import LRUTTLCache
+from src.utils.peer_cache import STALE_PEER_ERRORS, PeerAccessError, peer_cache
+from src.utils.rate_limiter import flood_wait_cap, telegram_scheduler
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 健康检查间隔（秒）
+DEFAULT_HEALTH_INTERVAL = 300.0
+# 记住“账号是否为某 chat 成员”的时长与条目数
+MEMBERSHIP_TTL = 6 * 3600.0
+MEMBERSHIP_MAX_SIZE = 20000
+# 还有其它账号可换时，单个账号上最多等待的 FloodWait 秒数
+REROUTE_FLOOD_WAIT = 5.0
+# 可以在 staging 中转发消息的成员状态
+_STAGING_OK_STATUSES = frozenset({ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.MEMBER})
+
+
+class PoolMember:
+    __slots__ = ("client", "key", "owned", "in_flight", "served", "ejected_until", "healthy", "staging_ok", "error")
+
+    def __init__(self, client: Any, owned: bool):
+        self.client = client
+        # 与 telegram_scheduler 的客户端 key 一致，用于匹配 FloodWait 回调
+        self.key = f"user:{getattr(client, 'name', None) or id(client)}"
+        # owned：由账号池负责 stop（主账号由调用方管理）
+        self.owned = owned
+        self.in_flight = 0
+        self.served = 0
+        self.ejected_until = 0.0
+        self.healthy = True
+        self.staging_ok = True
+        self.error: Optional[str] = None
+
+    def ejected(self, now: float) -> bool:
+        return self.ejected_until > now
+
+
+class UserClientPool:
+    def __init__(self, clients: Iterable[Any], staging_chat_id: Optional[int] = None, owned: Iterable[Any] = ()):
+        owned_ids = {id(c) for c in owned}
+        self.members: List[PoolMember] = [PoolMember(c, id(c) in owned_ids) for c in clients]
+        if not self.members:
+            raise ValueError("账号池至少需要一个 user client")
+        self.staging_chat_id = staging_chat_id
+        # chat -> {账号 key: 是否可访问}
+        self._membership = LRUTTLCache(maxsize=MEMBERSHIP_MAX_SIZE, ttl=MEMBERSHIP_TTL)
+        self._health_task: Optional[asyncio.Task] = None
+        self.reroutes = 0
+        telegram_scheduler.add_flood_listener(self._on_flood_wait)
+
+    @property
+    def primary(self) -> Any:
+        return self.members[0].client
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def _member(self, client: Any) -> Optional[PoolMember]:
+        for m in self.members:
+            if m.client is client:
+                return m
+        return None
+
+    def _on_flood_wait(self, client_key: str, method: str, seconds: int):
+        for m in self.members:
+            if m.key == client_key:
+                m.ejected_until = max(m.ejected_until, time.monotonic() + seconds)
+                if len(self.members) > 1:
+                    logger.warning("账号 %s 触发 FloodWait %ss（%s），等待期间不再分配新请求", client_key, seconds, method)
+
+    def record_access(self, client: Any, chat: Any, ok: bool):
+        """记下账号能否访问 chat（chat 为数字 id 或用户名，None 时忽略）"""
+        m = self._member(client)
+        if chat is None or m is None:
+            return
+        key = chat.lower().lstrip("@") if isinstance(chat, str) else chat
+        known = self._membership.get(key) or {}
+        known[m.key] = ok
+        self._membership.set(key, known)
+
+    def _pick(self, chat: Any, need_staging: bool, exclude: Set[str]) -> Optional[PoolMember]:
+        key = chat.lower().lstrip("@") if isinstance(chat, str) else chat
+        known: Dict[str, bool] = (self._membership.get(key) or {}) if key is not None else {}
+        now = time.monotonic()
+
+        def rank(m: PoolMember):
+            access = known.get(m.key)
+            return (
+                not m.healthy,
+                # 都在 FloodWait 中时选最早恢复的
+                m.ejected_until if m.ejected(now) else 0.0,
+                need_staging and not m.staging_ok,
+                access is False,
+                access is not True,
+                m.in_flight,
+                m.served,
+            )
+
+        candidates = [m for m in self.members if m.key not in exclude]
+        return min(candidates, key=rank) if candidates else None
+
+    async def run(self, func: Callable[[Any], Awaitable[T]], chat: Any = None, need_staging: bool = False) -> T:
+        """
+        在选出的账号上执行 func(client)
+        chat: 目标 chat（数字 id 或用户名），用于按成员关系路由；need_staging: 需要向 staging 转发
+        func 抛出 PeerAccessError 时换下一个账号，所有账号都无权访问时抛出最后一个错误；
+        还有未试过的账号时，较长的 FloodWait 同样换下一个账号（最后一个账号上按调度器的规则等待）
+        """
+        tried: Set[str] = set()
+        last_error: Optional[PeerAccessError] = None
+        while True:
+            m = self._pick(chat, need_staging, tried)
+            if m is None:
+                raise last_error
+            tried.add(m.key)
+            can_reroute = len(tried) < len(self.members)
+            m.in_flight += 1
+            m.served += 1
+            try:
+                with flood_wait_cap(REROUTE_FLOOD_WAIT) if can_reroute else nullcontext():
+                    result = await func(m.client)
+            except PeerAccessError as e:
+                self.record_access(m.client, chat, False)
+                last_error = e
+                if can_reroute:
+                    self.reroutes += 1
+                    logger.info("账号 %s 无法访问 %s，换用其它账号: %s", m.key, chat, e)
+                continue
+            except FloodWait as e:
+                if not can_reroute:
+                    raise
+                self.reroutes += 1
+                logger.info("账号 %s 需要等待 FloodWait %ss，换用其它账号", m.key, getattr(e, "value", None))
+                continue
+            finally:
+                m.in_flight -= 1
+            self.record_access(m.client, chat, True)
+            return result
+
+    async def check_member(self, m: PoolMember):
+        """与 check_user_staging.py 相同的检查：get_me -> staging get_chat_member"""
+        try:
+            me = await telegram_scheduler.call(m.client.get_me)
+        except Exception as e:
+            m.healthy = False
+            m.error = f"get_me 失败: {e}"
+            logger.warning("user 账号 %s 不可用: %s", m.key, m.error)
+            return
+        m.healthy = True
+        m.error = None
+        if self.staging_chat_id is None:
+            return
+        try:
+            staging = await peer_cache.resolve(m.client, self.staging_chat_id)
+            member = await telegram_scheduler.call(m.client.get_chat_member, staging, me.id)
+            status = getattr(member, "status", None)
+            m.staging_ok = status in _STAGING_OK_STATUSES
+            if not m.staging_ok:
+                m.error = f"在 staging 频道中的状态为 {status}"
+        except STALE_PEER_ERRORS as e:
+            # 缓存的 staging peer 已失效：清除，下次检查 / 转发时重新解析
+            await peer_cache.invalidate(m.client, self.staging_chat_id)
+            m.staging_ok = False
+            m.error = f"无法访问 staging 频道: {e}"
+        except Exception as e:
+            m.staging_ok = False
+            m.error = f"无法访问 staging 频道: {e}"
+        if m.staging_ok:
+            logger.info("user 账号 %s (id=%s) 健康检查通过", m.key, getattr(me, "id", None))
+        else:
+            logger.warning("user 账号 %s 不能转发到 staging：%s", m.key, m.error)
+
+    async def check_health(self):
+        await asyncio.gather(*(self.check_member(m) for m in self.members))
+
+    def start_health_checks(self, interval: float = DEFAULT_HEALTH_INTERVAL, immediate: bool = False):
+        """
+        后台健康检查：immediate=True 时先检查一次；之后每 interval 秒检查一次（interval <= 0 时不再定期检查）
+        检查完成前各账号按健康处理
+        """
+        if self._health_task is not None or (interval <= 0 and not immediate):
+            return
+
+        async def loop():
+            first = immediate
+            while True:
+                if not first:
+                    if interval <= 0:
+                        return
+                    await asyncio.sleep(interval)
+                first = False
+                try:
+                    await self.check_health()
+                except Exception:
+                    logger.warning("账号池健康检查出错", exc_info=True)
+
+        self._health_task = asyncio.create_task(loop())
+
+    async def stop(self):
+        """停止健康检查并关闭账号池自己启动的 client"""
+        telegram_scheduler.remove_flood_listener(self._on_flood_wait)
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        for m in self.members:
+            if m.owned:
+                try:
+                    await m.client.stop()
+                except Exception:
+                    logger.debug("关闭 user 账号 %s 出错", m.key, exc_info=True)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "accounts": len(self.members),
+            "reroutes": self.reroutes,
+            "members": {
+                m.key: {
+                    "in_flight": m.in_flight,
+                    "served": m.served,
+                    "healthy": m.healthy,
+                    "staging_ok": m.staging_ok,
+                    "ejected_for": round(max(0.0, m.ejected_until - now), 1),
+                }
+                for m in self.members
+            },
+        }
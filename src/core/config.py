@@ -11,12 +11,12 @@ XBparsing_bot 配置加载器（兼容 pydantic v2 / pydantic-settings）
 
 import os
 import json
-from typing import List, Optional
+from typing import Annotated, List, Optional
 from dotenv import load_dotenv
 
 # pydantic v2: BaseSettings is provided by pydantic-settings package
 from pydantic import Field, field_validator
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, NoDecode
 
 ROOT_DIR = os.getcwd()
 CORE_ENV_PATH = os.path.join(ROOT_DIR, "core", "config.env")
@@ -63,6 +63,48 @@ class Settings(BaseSettings):
     # 9. 其它
     DEBUG: bool = Field(False, description="是否开启调试模式")
 
+    # 10. Redis（docker-compose 中的 redis 服务，例如 redis://redis:6379/0）
+    REDIS_URL: Optional[str] = Field(None, description="Redis 连接 URL，用于多副本共享缓存")
+
+    # 11. t.me 链接解析缓存
+    LINK_CACHE_BACKEND: str = Field("memory", description="链接解析缓存后端：memory / redis / none")
+    LINK_CACHE_TTL: float = Field(600.0, description="解析结果缓存秒数（<=0 关闭缓存）")
+    LINK_CACHE_NEGATIVE_TTL: float = Field(60.0, description="“消息不存在”负缓存秒数")
+    LINK_CACHE_MAX_SIZE: int = Field(2048, description="进程内缓存最大条目数（LRU 淘汰）")
+
+    # 12. 多链接并发解析
+    PARSE_CONCURRENCY: int = Field(4, description="同时解析的链接数上限（全局）")
+    PARSE_TIMEOUT: float = Field(15.0, description="单个链接解析超时秒数")
+    MAX_URLS_PER_MESSAGE: int = Field(10, description="单条消息最多处理的链接数")
+
+    # 13. 后台任务队列（src/workers）
+    JOB_QUEUE_BACKEND: str = Field("memory", description="任务队列后端：memory / sqlite / redis")
+    WORKER_CONCURRENCY: int = Field(4, description="每个进程内并发执行的任务数（bot 进程设为 0 则只入队）")
+    WORKER_PER_CHAT_LIMIT: int = Field(2, description="同一用户同时执行的任务数上限")
+
+    # 14. MD5 批量修改（/md5 管理命令）
+    MD5_WORKERS: int = Field(4, description="MD5 批量修改的并行线程数")
+
+    # 15. 公开频道链接的对冲请求
+    TME_HEDGE_DELAY: float = Field(1.5, description="网页抓取开始后多少秒仍无结果就并发调用 user API")
+    TME_ROUTE_TTL: float = Field(21600.0, description="记住频道可用路径（网页 / user API）的秒数")
+
+    # 16. HTML 解析进程池（src/utils/parse_pool）
+    PARSE_PROCESSES: int = Field(2, description="解析大页面的子进程数（0 表示不用进程池，改在线程中解析）")
+    PARSE_INLINE_MAX_CHARS: int = Field(65536, description="不超过该字符数的页面直接在事件循环线程解析")
+
+    # 17. Telegram peer 解析缓存（src/utils/peer_cache）
+    PEER_USERNAME_TTL: float = Field(86400.0, description="用户名 -> peer 缓存的有效秒数（按 id 的条目不过期）")
+
+    # 18. user 账号池（USER_SESSION 之外的额外账号，分担私密频道的获取与转发）
+    # NoDecode：环境变量原样交给下面的 validator，否则 pydantic-settings 先按 JSON 解码，逗号分隔的值会直接报错
+    USER_POOL_SESSIONS: Annotated[List[str], NoDecode] = Field(default_factory=list, description='额外 user 账号（JSON 列表或逗号分隔，例如 ["/data/u2.session", "<session string>"]）：每项为 session 文件路径或 session string')
+    USER_POOL_HEALTH_INTERVAL: float = Field(300.0, description="账号池健康检查间隔秒数（<=0 只在启动时检查）")
+
+    # 19. 指标端点（src/api/main.py，Prometheus 文本格式）
+    METRICS_HOST: str = Field("127.0.0.1", description="/metrics 监听地址（容器内供外部抓取时设为 0.0.0.0）")
+    METRICS_PORT: int = Field(9108, description="/metrics 监听端口（<=0 不启动；独立 worker 进程需另设端口）")
+
     class Config:
         # 让 pydantic-settings 通过环境变量加载
         env_file = None
@@ -84,6 +126,22 @@ class Settings(BaseSettings):
             pass
         return [int(item.strip()) for item in s.split(",") if item.strip()]
 
+    # 解析 USER_POOL_SESSIONS（支持 JSON 列表或逗号分隔字符串）
+    @field_validator("USER_POOL_SESSIONS", mode="before")
+    def _parse_pool_sessions(cls, v):
+        if v is None:
+            return []
+        if isinstance(v, list):
+            return [str(x).strip() for x in v if str(x).strip()]
+        s = str(v).strip()
+        try:
+            parsed = json.loads(s)
+            if isinstance(parsed, list):
+                return [str(x).strip() for x in parsed if str(x).strip()]
+        except Exception:
+            pass
+        return [item.strip() for item in s.split(",") if item.strip()]
+
     # 允许 STAGING/MD5/PUBLISH channel ids 接受字符串并转换为 int
     @field_validator("STAGING_CHANNEL_ID", "MD5_EDIT_CHANNEL_ID", "PUBLISH_CHANNEL_ID", mode="before")
     def _parse_channel_ids(cls, v):
@@ -0,0 +1,76 @@
+"""
+SQLite 连接管理（标准库 sqlite3，默认使用项目根的 xbparsing.db）
+- 数据库位置取自环境变量 DATABASE_URL（与 settings.DATABASE_URL 同源，config 会先加载 .env），默认 sqlite:///./xbparsing.db
+- 进程内共享一个连接（check_same_thread=False + 锁），可在 asyncio.to_thread 中调用
+- 各 model 模块通过 register_schema 注册建表语句，首次取连接时统一执行（CREATE TABLE IF NOT EXISTS）
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+DEFAULT_DATABASE_URL = "sqlite:///./xbparsing.db"
+
+_schemas: List[str] = []
+_applied = 0
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.RLock()
+
+
+def sqlite_path_from_url(url: str) -> str:
+    """sqlite:///./xbparsing.db -> ./xbparsing.db ；sqlite:////abs/path.db -> /abs/path.db"""
+    if not url.startswith("sqlite:///"):
+        raise RuntimeError(f"当前仅支持 sqlite 数据库，DATABASE_URL={url!r}")
+    return url[len("sqlite:///"):] or ":memory:"
+
+
+def register_schema(sql: str):
+    """注册建表语句（幂等，需使用 IF NOT EXISTS）"""
+    with _lock:
+        if sql not in _schemas:
+            _schemas.append(sql)
+
+
+def _apply_schemas(conn: sqlite3.Connection):
+    global _applied
+    if _applied < len(_schemas):
+        for sql in _schemas[_applied:]:
+            conn.executescript(sql)
+        conn.commit()
+        _applied = len(_schemas)
+
+
+def get_connection() -> sqlite3.Connection:
+    global _conn
+    with _lock:
+        if _conn is None:
+            path = sqlite_path_from_url(os.environ.get("DATABASE_URL") or DEFAULT_DATABASE_URL)
+            _conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            _conn.execute("PRAGMA journal_mode=WAL")
+            _conn.execute("PRAGMA synchronous=NORMAL")
+        _apply_schemas(_conn)
+        return _conn
+
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """持锁执行并在成功时提交、异常时回滚"""
+    with _lock:
+        conn = get_connection()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def close_connection():
+    global _conn, _applied
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+        _conn = None
+        _applied = 0
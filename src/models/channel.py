@@ -0,0 +1,57 @@
+"""
+频道相关表
+resolved_peers：各 Telegram 账号已解析的 peer（chat id / access_hash / 类型 / 用户名）
+  access_hash 按账号区分；重启后由 src/utils/peer_cache 载入，避免重复 ResolveUsername / GetChannels
+"""
+
+import time
+from typing import List, Optional, Tuple
+
+from src.core.db import register_schema, transaction
+
+RESOLVED_PEERS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS resolved_peers (
+    account TEXT NOT NULL,
+    peer_id INTEGER NOT NULL,
+    access_hash INTEGER NOT NULL,
+    peer_type TEXT NOT NULL,
+    username TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (account, peer_id)
+);
+CREATE INDEX IF NOT EXISTS idx_resolved_peers_username ON resolved_peers (account, username);
+"""
+
+register_schema(RESOLVED_PEERS_SCHEMA)
+
+# (peer_id, access_hash, peer_type, username, updated_at)
+PeerRow = Tuple[int, int, str, Optional[str], float]
+
+
+def load_resolved_peers(account: str) -> List[PeerRow]:
+    with transaction() as conn:
+        rows = conn.execute(
+            "SELECT peer_id, access_hash, peer_type, username, updated_at FROM resolved_peers WHERE account = ?",
+            (account,),
+        ).fetchall()
+    return [(int(r[0]), int(r[1]), r[2], r[3], float(r[4])) for r in rows]
+
+
+def save_resolved_peer(account: str, peer_id: int, access_hash: int, peer_type: str, username: Optional[str] = None):
+    """写入（覆盖）一个 peer；同一账号下用户名只属于最新解析到的 peer"""
+    username = username.lower() if username else None
+    with transaction() as conn:
+        if username:
+            conn.execute(
+                "UPDATE resolved_peers SET username = NULL WHERE account = ? AND username = ? AND peer_id != ?",
+                (account, username, int(peer_id)),
+            )
+        conn.execute(
+            "REPLACE INTO resolved_peers (account, peer_id, access_hash, peer_type, username, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (account, int(peer_id), int(access_hash), peer_type, username, time.time()),
+        )
+
+
+def delete_resolved_peer(account: str, peer_id: int):
+    with transaction() as conn:
+        conn.execute("DELETE FROM resolved_peers WHERE account = ? AND peer_id = ?", (account, int(peer_id)))
@@ -0,0 +1,59 @@
+"""
+内容相关表
+staging_forwards：源消息 (source_chat_id, source_msg_ids) -> 已转发到 staging 频道的消息 id
+  重复请求同一帖子时直接复用 staging 中的消息，跳过 user 账号的 forward_messages
+"""
+
+import time
+from typing import Iterable, List, Optional
+
+from src.core.db import register_schema, transaction
+
+STAGING_FORWARDS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS staging_forwards (
+    source_chat_id INTEGER NOT NULL,
+    source_msg_ids TEXT NOT NULL,
+    staging_chat_id INTEGER NOT NULL,
+    staging_msg_ids TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (source_chat_id, source_msg_ids, staging_chat_id)
+);
+"""
+
+register_schema(STAGING_FORWARDS_SCHEMA)
+
+
+def _ids_key(msg_ids: Iterable[int]) -> str:
+    return ",".join(str(i) for i in sorted(int(x) for x in msg_ids))
+
+
+def get_staging_forward(source_chat_id: int, source_msg_ids: Iterable[int], staging_chat_id: int) -> Optional[List[int]]:
+    """返回 staging 中对应的消息 id 列表（按原顺序），不存在返回 None"""
+    with transaction() as conn:
+        row = conn.execute(
+            "SELECT staging_msg_ids FROM staging_forwards WHERE source_chat_id = ? AND source_msg_ids = ? AND staging_chat_id = ?",
+            (int(source_chat_id), _ids_key(source_msg_ids), int(staging_chat_id)),
+        ).fetchone()
+    if not row or not row[0]:
+        return None
+    return [int(x) for x in row[0].split(",")]
+
+
+def save_staging_forward(source_chat_id: int, source_msg_ids: Iterable[int], staging_chat_id: int, staging_msg_ids: Iterable[int]):
+    staging_ids = [int(x) for x in staging_msg_ids]
+    if not staging_ids:
+        return
+    with transaction() as conn:
+        conn.execute(
+            "REPLACE INTO staging_forwards (source_chat_id, source_msg_ids, staging_chat_id, staging_msg_ids, created_at) VALUES (?, ?, ?, ?, ?)",
+            (int(source_chat_id), _ids_key(source_msg_ids), int(staging_chat_id), ",".join(str(i) for i in staging_ids), time.time()),
+        )
+
+
+def delete_staging_forward(source_chat_id: int, source_msg_ids: Iterable[int], staging_chat_id: int):
+    """staging 中的消息已失效（被删除 / 无法复制）时移除索引"""
+    with transaction() as conn:
+        conn.execute(
+            "DELETE FROM staging_forwards WHERE source_chat_id = ? AND source_msg_ids = ? AND staging_chat_id = ?",
+            (int(source_chat_id), _ids_key(source_msg_ids), int(staging_chat_id)),
+        )
@@ -0,0 +1,212 @@
+"""
+t.me 链接解析结果缓存
+- key：规范化后的链接路径（去掉 query / fragment，t.me/s/<ch>/<id> 与 t.me/<ch>/<id> 视为同一条，用户名不区分大小写）
+- value：parse_telegram_link 返回的 dict（去掉 message_obj；转发只需 source_chat_id / source_message_id / media_group_id）
+- 负缓存：记录 "消息不存在" 类错误，短时间内重复请求直接返回同样的错误
+- 后端可插拔：
+    MemoryCacheBackend —— 进程内 LRU + TTL（默认）
+    RedisCacheBackend  —— 使用 docker-compose 中的 redis，多个 bot 副本共享（LRU 淘汰由 redis maxmemory-policy 负责）
+- ChannelRouteCache：记住每个公开用户名的可用路径（网页抓取 / user API），后续链接直接走对应路径
+"""
+
+import json
+import logging
+import re
+from typing import Any, Dict, Optional
+
+from src.utils.lru_cache import LRUTTLCache
+
+logger = logging.getLogger(__name__)
+
+# 与 url_parser_userbot.TELEGRAM_TME_RE 一致
+_TME_PATH_RE = re.compile(r"(?:https?://)?(?:(?:www\.)?t\.me|(?:www\.)?telegram\.me)/(?P<path>.+)", re.IGNORECASE)
+
+DEFAULT_TTL = 600.0
+DEFAULT_NEGATIVE_TTL = 60.0
+DEFAULT_MAX_SIZE = 2048
+DEFAULT_ROUTE_TTL = 6 * 3600.0
+DEFAULT_ROUTE_MAX_SIZE = 10000
+
+# ChannelRouteCache 的路径取值
+ROUTE_WEB = "web"
+ROUTE_API = "api"
+
+
+def normalize_link_key(url: str) -> Optional[str]:
+    """把 t.me 链接规范化为缓存 key；非 t.me 链接返回 None（不缓存）"""
+    m = _TME_PATH_RE.match((url or "").strip())
+    if not m:
+        return None
+    path = m.group("path").split("?")[0].split("#")[0].strip("/")
+    parts = [p for p in path.split("/") if p]
+    if parts and parts[0].lower() == "s":
+        parts = parts[1:]
+    if len(parts) < 2:
+        return None
+    if parts[0].lower() != "c":
+        # 公开频道用户名不区分大小写
+        parts[0] = parts[0].lower()
+    return "tme:" + "/".join(parts)
+
+
+class MemoryCacheBackend:
+    """进程内后端（LRUTTLCache）；与 redis 后端一样保存 JSON 文本，调用方修改取出的结果不会影响缓存条目"""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        self._cache = LRUTTLCache(maxsize=max_size)
+
+    @property
+    def evictions(self) -> int:
+        return self._cache.evictions
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = self._cache.get(key)
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: float):
+        self._cache.set(key, json.dumps(value, ensure_ascii=False, default=str), ttl=ttl)
+
+    async def delete(self, key: str):
+        self._cache.delete(key)
+
+
+class RedisCacheBackend:
+    """redis 后端（pip install redis>=4.2，使用 redis.asyncio）"""
+
+    def __init__(self, url: str, prefix: str = "xbparsing:link:"):
+        import redis.asyncio as aioredis
+
+        self._redis = aioredis.from_url(url)
+        self._prefix = prefix
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = await self._redis.get(self._prefix + key)
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except Exception:
+            return None
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: float):
+        await self._redis.set(self._prefix + key, json.dumps(value, ensure_ascii=False, default=str), ex=max(1, int(ttl)))
+
+    async def delete(self, key: str):
+        await self._redis.delete(self._prefix + key)
+
+
+class LinkCache:
+    """
+    对 backend 的一层包装：正/负缓存条目 + 命中统计
+    条目格式：{"ok": True, "value": {...}} 或 {"ok": False, "error": "..."}
+    后端异常只记录日志，不影响解析流程
+    """
+
+    def __init__(self, backend, ttl: float = DEFAULT_TTL, negative_ttl: float = DEFAULT_NEGATIVE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            entry = await self.backend.get(key)
+        except Exception:
+            self.errors += 1
+            logger.warning("读取链接缓存失败 key=%s", key, exc_info=True)
+            entry = None
+        if entry is None:
+            self.misses += 1
+        elif entry.get("ok"):
+            self.hits += 1
+        else:
+            self.negative_hits += 1
+        return entry
+
+    async def set_result(self, key: str, parsed: Dict[str, Any]):
+        value = {k: v for k, v in parsed.items() if k != "message_obj"}
+        await self._set(key, {"ok": True, "value": value}, self.ttl)
+
+    async def set_negative(self, key: str, error: str):
+        await self._set(key, {"ok": False, "error": error}, self.negative_ttl)
+
+    async def delete(self, key: str):
+        try:
+            await self.backend.delete(key)
+        except Exception:
+            self.errors += 1
+            logger.warning("删除链接缓存失败 key=%s", key, exc_info=True)
+
+    async def _set(self, key: str, entry: Dict[str, Any], ttl: float):
+        try:
+            await self.backend.set(key, entry, ttl)
+        except Exception:
+            self.errors += 1
+            logger.warning("写入链接缓存失败 key=%s", key, exc_info=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "evictions": getattr(self.backend, "evictions", 0),
+        }
+
+
+def create_link_cache(
+    backend: str = "memory",
+    redis_url: Optional[str] = None,
+    ttl: float = DEFAULT_TTL,
+    negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+    max_size: int = DEFAULT_MAX_SIZE,
+) -> Optional[LinkCache]:
+    """
+    按配置创建缓存：backend 为 "memory" / "redis" / "none"
+    redis 不可用（未安装或未配置 URL）时回退到进程内缓存
+    """
+    backend = (backend or "memory").lower()
+    if backend == "none" or ttl <= 0:
+        return None
+    if backend == "redis":
+        if redis_url:
+            try:
+                return LinkCache(RedisCacheBackend(redis_url), ttl=ttl, negative_ttl=negative_ttl)
+            except Exception:
+                logger.warning("初始化 redis 链接缓存失败，回退到进程内缓存", exc_info=True)
+        else:
+            logger.warning("LINK_CACHE_BACKEND=redis 但未配置 REDIS_URL，回退到进程内缓存")
+    return LinkCache(MemoryCacheBackend(max_size=max_size), ttl=ttl, negative_ttl=negative_ttl)
+
+
+class ChannelRouteCache:
+    """
+    频道用户名 -> 可用路径（ROUTE_WEB：t.me 网页可抓取的公开频道；ROUTE_API：只能通过 user API 获取）
+    进程内 LRU + TTL；频道可能在公开 / 私密之间切换，条目过期后重新探测
+    """
+
+    def __init__(self, ttl: float = DEFAULT_ROUTE_TTL, max_size: int = DEFAULT_ROUTE_MAX_SIZE):
+        self._cache = LRUTTLCache(maxsize=max_size, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username: str) -> Optional[str]:
+        route = self._cache.get(username.lower())
+        if route is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return route
+
+    def remember(self, username: str, route: str):
+        self._cache.set(username.lower(), route)
+
+    def forget(self, username: str):
+        self._cache.delete(username.lower())
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._cache), "evictions": self._cache.evictions}
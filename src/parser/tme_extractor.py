@@ -0,0 +1,129 @@
+"""
+t.me 消息页（tgme_widget_message 组件）解析
+- extract_tme_post(html) 返回与 _try_scrape_tme_post 相同结构的 dict，或 None（没有可用内容）
+- 用 lxml iterparse 增量解析：找到第一个 <div class="tgme_widget_message"> 并解析完它的子树后立即停止，
+  t.me/s/ 频道页后面的其余消息不再解析
+- 消息子树内只遍历一次，按标签收集正文 / 时间 / 图片 / 文件 / 视频
+纯函数、无 IO，可在线程或进程池中调用
+"""
+
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+
+from lxml import etree
+
+from src.utils.html_parser import iter_text
+
+TME_ORIGIN = "https://t.me"
+
+MESSAGE_CLASS = "tgme_widget_message"
+TEXT_CLASS = "tgme_widget_message_text"
+OWNER_CLASS = "tgme_widget_message_owner_name"
+DATE_CLASS = "tgme_widget_message_date"
+VIDEO_PLAY_CLASS = "tgme_widget_message_video_play"
+
+# 频道名：整页第一个 owner_name（通常就在消息子树内，已被 iterparse 解析到）
+_OWNER_XPATH = etree.XPath(f"//a[contains(concat(' ', normalize-space(@class), ' '), ' {OWNER_CLASS} ')]")
+
+
+def _has_class(el, name: str) -> bool:
+    cls = el.get("class")
+    return bool(cls) and name in cls.split()
+
+
+def _stripped_text(el, sep: str) -> str:
+    """等价于 BeautifulSoup 的 get_text(sep, strip=True)"""
+    return sep.join(s for s in (t.strip() for t in iter_text(el)) if s)
+
+
+def _absolute(href: str) -> str:
+    return TME_ORIGIN + href if href.startswith("/") else href
+
+
+def _find_message(html: str):
+    """返回第一个 tgme_widget_message 容器；找不到时退回第一个 tgme_widget_message_text（都没有返回 None）"""
+    message = text_fallback = None
+    for event, el in etree.iterparse(BytesIO(html.encode("utf-8", "replace")), events=("start", "end"), tag="div", html=True, encoding="utf-8"):
+        if event == "start":
+            if message is None and _has_class(el, MESSAGE_CLASS):
+                message = el
+            elif text_fallback is None and _has_class(el, TEXT_CLASS):
+                text_fallback = el
+        elif el is message:
+            # 消息子树已完整，停止解析页面其余部分
+            return message
+    return message if message is not None else text_fallback
+
+
+def extract_tme_post(html: str) -> Optional[Dict[str, Any]]:
+    try:
+        msg = _find_message(html)
+    except etree.LxmlError:
+        return None
+    if msg is None:
+        return None
+
+    text_div = None
+    time_el = date_a = None
+    images: List[Dict[str, Any]] = []
+    files: List[Dict[str, Any]] = []
+    videos: List[Dict[str, Any]] = []
+    video_plays: List[Dict[str, Any]] = []
+
+    # 子树单次遍历（不含 msg 自身，与 BeautifulSoup 的 find 语义一致）
+    for el in msg.iterdescendants("div", "time", "a", "img", "video"):
+        tag = el.tag
+        if tag == "div":
+            if text_div is None and _has_class(el, TEXT_CLASS):
+                text_div = el
+        elif tag == "img":
+            src = el.get("src")
+            if src:
+                images.append({"type": "image", "url": src, "alt": el.get("alt")})
+        elif tag == "a":
+            href = el.get("href") or ""
+            rel = (el.get("rel") or "").split()
+            if "/file/" in href or el.get("download") or "download" in rel:
+                files.append({"type": "file", "url": _absolute(href), "text": _stripped_text(el, "")})
+            if _has_class(el, VIDEO_PLAY_CLASS):
+                src = el.get("href") or el.get("data-src") or ""
+                if src:
+                    video_plays.append({"type": "video", "url": _absolute(src)})
+            if date_a is None and _has_class(el, DATE_CLASS):
+                date_a = el
+        elif tag == "video":
+            src = el.get("src")
+            if src:
+                videos.append({"type": "video", "url": src})
+        elif tag == "time" and time_el is None:
+            time_el = el
+
+    parsed_body = _stripped_text(text_div, "\n") if text_div is not None else ""
+    attachments = images + files + videos + video_plays
+    if not parsed_body and not attachments:
+        return None
+
+    owner_name = None
+    owners = _OWNER_XPATH(msg.getroottree())
+    if owners:
+        owner_name = _stripped_text(owners[0], "")
+
+    date_str = None
+    if time_el is not None and time_el.get("datetime") is not None:
+        date_str = time_el.get("datetime")
+    elif date_a is not None:
+        date_str = _stripped_text(date_a, "")
+
+    parsed_title = ""
+    if parsed_body:
+        lines = [ln.strip() for ln in parsed_body.splitlines() if ln.strip()]
+        parsed_title = lines[0] if lines else ""
+
+    return {
+        "kind": "telegram_web",
+        "channel": owner_name,
+        "date": date_str,
+        "parsed_title": parsed_title,
+        "parsed_body": parsed_body,
+        "attachments": attachments,
+    }
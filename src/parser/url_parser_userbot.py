@@ -2,11 +2,13 @@
 解析器（支持公开 t.me 页面抓取 + 私密频道通过 userbot API 获取）
 - 优先对 t.me 链接进行网页抓取（public channel 快速返回）
 - 若网页抓取失败或为内部 c/<id>/<msg> 链接，则使用已登录的 user_client (Pyrogram Client) 通过 API 获取消息（适用于私密频道）
-- 对非 t.me 链接使用网页解析器 fetch_and_parse_webpage
+- <username>/<id> 与 s/<username>/<id> 链接使用对冲请求：网页变体同时抓取，hedge_delay 秒后仍无结果时并发调用 user API，
+  先得到可用结果者胜出，其余请求取消；可用路径按频道记入 ChannelRouteCache，之后直接走对应路径
+- 对非 t.me 链接使用网页解析器 fetch_and_parse_webpage；链接指向文件（非网页）时不下载正文，返回 kind == "attachment"
 
 返回的数据结构示例：
 {
-  "kind": "telegram_web" | "telegram_api" | "webpage",
+  "kind": "telegram_web" | "telegram_api" | "webpage" | "attachment",
   "channel": "...",
   "date": "...",
   "parsed_body": "...",
@@ -14,22 +16,32 @@
   "attachments": [ { "type": "image"/"file"/"video"/"document", "url": "...", "file_id": ..., "file_name": "...", "file_size": ... }, ... ],
   "source_chat_id": chat_id (if available),
   "source_message_id": msg_id (if available),
-  "message_obj": <pyrogram.types.Message>  # 当 kind == "telegram_api" 时包含原始 Message 对象
+  "media_group_id": "..." | None,  # kind == "telegram_api" 时
+  "message_obj": <pyrogram.types.Message>  # kind == "telegram_api" 时的原始 Message 对象（链接缓存命中的结果没有）
 }
 """
 
+import asyncio
 import re
-import requests
 import logging
-from typing import Any, Dict, Optional, List
-from bs4 import BeautifulSoup
+from typing import Any, Dict, List, Optional, Tuple
 from pyrogram import Client
-from pyrogram.errors import RPCError
+from pyrogram.errors import FloodWait, RPCError
 
+from src.parser.link_cache import ROUTE_API, ROUTE_WEB, ChannelRouteCache, LinkCache, normalize_link_key
 from src.utils.html_parser import fetch_and_parse_webpage
+from src.utils.http_client import fetch_text
+from src.utils.metrics import timed, track
+from src.utils.parse_pool import parse_pool
+from src.utils.peer_cache import STALE_PEER_ERRORS, PeerAccessError, peer_cache
+from src.utils.rate_limiter import telegram_scheduler
 
 logger = logging.getLogger(__name__)
 
+
+class MessageNotFoundError(RuntimeError):
+    """消息不存在或无法访问（会被链接缓存记为负缓存条目）"""
+
 # t.me / telegram.me 链接匹配
 TELEGRAM_TME_RE = re.compile(
     r"(?:https?://)?(?:(?:www\.)?t\.me|(?:www\.)?telegram\.me)/(?P<path>.+)", re.IGNORECASE
@@ -41,104 +53,48 @@ PAT_PLAIN = re.compile(r"^(?P<username>[^/]+)/(?P<msg_id>\d+)$")
 
 HEADERS = {"User-Agent": "Mozilla/5.0 (XBparsing_bot/1.0)"}
 REQUEST_TIMEOUT = 12.0
+# t.me 页面正文下载上限（字节）；正常的帖子页只有几十 KB
+MAX_TME_PAGE_BYTES = 2 * 1024 * 1024
+# t.me 页面解析很快（只解析第一条消息），不超过该字符数的页面不送进程池
+TME_INLINE_MAX_CHARS = 256 * 1024
+# 网页抓取开始后多少秒仍无结果，就并发发起 user API 请求
+DEFAULT_HEDGE_DELAY = 1.5
 
 
-def _try_scrape_tme_post(url: str) -> Optional[Dict[str, Any]]:
+async def _try_scrape_tme_post(url: str) -> Optional[Dict[str, Any]]:
     """
-    抓取 t.me 页面并解析出消息正文与媒体（仅对公开 channel 有效）
+    抓取 t.me 页面并解析出消息正文与媒体（仅对公开 channel 有效；解析见 src/parser/tme_extractor.py）
+    使用共享的异步 HTTP 客户端，不阻塞事件循环；超大页面交给解析进程池
     返回解析结构或 None（表示抓取失败或没有可用内容）
     """
+    with track("tme_scrape") as t:
+        result = await _scrape_tme_post(url)
+        if result is None:
+            t.outcome = "miss"
+        return result
+
+
+async def _scrape_tme_post(url: str) -> Optional[Dict[str, Any]]:
     try:
-        resp = requests.get(url, headers=HEADERS, timeout=REQUEST_TIMEOUT)
+        body = await fetch_text(url, headers=HEADERS, timeout=REQUEST_TIMEOUT, max_bytes=MAX_TME_PAGE_BYTES)
     except Exception as e:
         logger.debug("请求 t.me 页面失败: %s ; error=%s", url, e)
         return None
 
-    if resp.status_code != 200:
-        logger.debug("t.me 页面返回非 200: %s -> %s", url, resp.status_code)
+    if body.status_code != 200:
+        logger.debug("t.me 页面返回非 200: %s -> %s", url, body.status_code)
         return None
-
-    soup = BeautifulSoup(resp.text, "lxml")
-
-    # 查找消息容器
-    msg_div = soup.find("div", class_="tgme_widget_message")
-    if not msg_div:
-        # 有时结构有所不同，尝试直接找 text 容器
-        msg_div = soup.find("div", class_="tgme_widget_message_text")
-        if not msg_div:
-            return None
-
-    # 正文
-    text_div = msg_div.find("div", class_="tgme_widget_message_text")
-    parsed_body = text_div.get_text("\n", strip=True) if text_div else ""
-
-    # 频道/作者
-    owner_name = None
-    owner_el = soup.find("a", class_="tgme_widget_message_owner_name")
-    if owner_el:
-        owner_name = owner_el.get_text(strip=True)
-
-    # 时间（ISO 或可读）
-    date_str = None
-    date_el = msg_div.find("time")
-    if date_el and date_el.has_attr("datetime"):
-        date_str = date_el["datetime"]
-    else:
-        date_a = msg_div.find("a", class_="tgme_widget_message_date")
-        if date_a:
-            date_str = date_a.get_text(strip=True)
-
-    attachments: List[Dict[str, Any]] = []
-
-    # 图片：查找 img 标签
-    for img in msg_div.find_all("img"):
-        src = img.get("src")
-        if src:
-            attachments.append({"type": "image", "url": src, "alt": img.get("alt")})
-
-    # 文件/下载链接：a 标签中含 /file/ 或 download 属性或 class 表示
-    for a in msg_div.find_all("a"):
-        href = a.get("href") or ""
-        rel = a.get("rel") or []
-        if "/file/" in href or a.get("download") or "download" in rel:
-            full = href
-            if full.startswith("/"):
-                full = "https://t.me" + full
-            attachments.append({"type": "file", "url": full, "text": a.get_text(strip=True)})
-
-    # 视频：<video> 标签或播放链接 a.tgme_widget_message_video_play
-    for video_tag in msg_div.find_all("video"):
-        src = video_tag.get("src")
-        if src:
-            attachments.append({"type": "video", "url": src})
-    for vplay in msg_div.select("a.tgme_widget_message_video_play"):
-        data_src = vplay.get("href") or vplay.get("data-src") or ""
-        if data_src:
-            urlv = data_src
-            if urlv.startswith("/"):
-                urlv = "https://t.me" + urlv
-            attachments.append({"type": "video", "url": urlv})
-
-    # 若正文与附件均为空，则认为解析失败
-    if not parsed_body and not attachments:
+    if not body.is_text:
+        logger.debug("t.me 页面不是 HTML: %s -> %s", url, body.content_type)
         return None
 
-    # 推断标题：正文首行
-    parsed_title = ""
-    if parsed_body:
-        lines = [ln.strip() for ln in parsed_body.splitlines() if ln.strip()]
-        parsed_title = lines[0] if lines else ""
-
-    return {
-        "kind": "telegram_web",
-        "channel": owner_name,
-        "date": date_str,
-        "parsed_title": parsed_title,
-        "parsed_body": parsed_body,
-        "attachments": attachments,
-    }
+    # lxml 在第一次抓取 t.me 页面时才导入
+    from src.parser.tme_extractor import extract_tme_post
+
+    return await parse_pool.run(extract_tme_post, body.text, inline_max_chars=TME_INLINE_MAX_CHARS)
 
 
+@timed("userapi_fetch")
 async def _fetch_via_userapi(client: Client, chat_identifier: Any, msg_id: int) -> Dict[str, Any]:
     """
     通过登录的 user client (Pyrogram Client) 获取消息详情，并把原始 Message 对象放到返回字典中。
@@ -146,14 +102,22 @@ async def _fetch_via_userapi(client: Client, chat_identifier: Any, msg_id: int)
     返回解析字典或抛出 RuntimeError
     """
     try:
-        msg = await client.get_messages(chat_identifier, msg_id)
+        # "@username" 经 peer 缓存换成数字 chat id，命中时不再发起 ResolveUsername
+        chat = await peer_cache.resolve(client, chat_identifier)
+        msg = await telegram_scheduler.call(client.get_messages, chat, msg_id)
+    except STALE_PEER_ERRORS as e:
+        await peer_cache.invalidate(client, chat_identifier)
+        raise PeerAccessError(f"通过 user API 获取消息失败: {e}")
+    except FloodWait:
+        # 调度器没有吸收的 FloodWait 原样抛出，由账号池换账号或由后台任务延后重试
+        raise
     except RPCError as e:
         raise RuntimeError(f"通过 user API 获取消息失败: {e}")
     except Exception as e:
         raise RuntimeError(f"通过 user API 获取消息失败: {e}")
 
-    if not msg:
-        raise RuntimeError("消息不存在或无法访问（可能未加入该频道或消息被删除）")
+    if not msg or getattr(msg, "empty", False):
+        raise MessageNotFoundError("消息不存在或无法访问（可能未加入该频道或消息被删除）")
 
     # 兼容 message id / chat id 等属性
     message_id = getattr(msg, "message_id", None) or getattr(msg, "id", None)
@@ -166,6 +130,7 @@ async def _fetch_via_userapi(client: Client, chat_identifier: Any, msg_id: int)
         "kind": "telegram_api",
         "source_chat_id": chat_id,
         "source_message_id": message_id,
+        "media_group_id": getattr(msg, "media_group_id", None),
         "attachments": [],
         # 原始 Message 对象（供上层下载并原样发送）
         "message_obj": msg,
@@ -255,16 +220,99 @@ async def _fetch_via_userapi(client: Client, chat_identifier: Any, msg_id: int)
     return parsed
 
 
-async def parse_telegram_link(url: str, user_client: Client) -> Dict[str, Any]:
+def link_chat_hint(url: str) -> Optional[Any]:
+    """t.me 链接指向的 chat：c/<id>/<msg> -> -100<id>；<username>/<msg>、s/<username>/<msg> -> 'username'；其它返回 None"""
+    m = TELEGRAM_TME_RE.match((url or "").strip())
+    if not m:
+        return None
+    path = m.group("path").split("?")[0].split("#")[0].strip("/")
+    m_c = PAT_C_TME_C.match(path)
+    if m_c:
+        return int(f"-100{m_c.group('chat_internal_id')}")
+    parts = [p for p in path.split("/") if p]
+    if parts and parts[0] == "s":
+        parts = parts[1:]
+    if len(parts) >= 2 and parts[1].isdigit():
+        return parts[0].lower()
+    return None
+
+
+async def parse_telegram_link(
+    url: str,
+    user_client: Client,
+    cache: Optional[LinkCache] = None,
+    routes: Optional[ChannelRouteCache] = None,
+    hedge_delay: float = DEFAULT_HEDGE_DELAY,
+) -> Dict[str, Any]:
     """
     入口：对 t.me 链接先尝试网页抓取，再用 user_client API 进行 fallback（或用于私密）
     对非 t.me 链接使用网页解析器
+    cache: 可选的 LinkCache；命中时跳过网页抓取 / 用户名解析与 get_messages，
+           telegram_api 结果不含 message_obj，转发只需 source_chat_id / source_message_id / media_group_id
+    routes: 可选的 ChannelRouteCache；记住公开用户名链接应走网页还是 user API
+    hedge_delay: 网页抓取开始后多少秒并发发起 user API 请求（见 _probe_public_post）
     """
+    with track("parse_telegram_link", branch=_link_branch(url)) as t:
+        key = normalize_link_key(url) if cache is not None else None
+        if key is None:
+            return await _parse_telegram_link_uncached(url, user_client, routes, hedge_delay)
+
+        entry = await cache.get(key)
+        if entry is not None:
+            if not entry.get("ok"):
+                t.outcome = "cached_not_found"
+                raise MessageNotFoundError(entry.get("error") or "消息不存在或无法访问")
+            parsed = _restore_cached(entry.get("value") or {})
+            if parsed is not None:
+                t.outcome = "cache_hit"
+                return parsed
+            await cache.delete(key)
+
+        try:
+            parsed = await _parse_telegram_link_uncached(url, user_client, routes, hedge_delay)
+        except MessageNotFoundError as e:
+            await cache.set_negative(key, str(e))
+            raise
+        await cache.set_result(key, parsed)
+        return parsed
+
+
+def _link_branch(url: str) -> str:
+    """指标用的链接分支：c（内部链接）/ s（t.me/s/...）/ plain（用户名链接）/ webpage（非 t.me）/ invalid"""
+    m = TELEGRAM_TME_RE.match(url or "")
+    if not m:
+        return "webpage"
+    path = m.group("path").strip("/").split("?")[0].split("#")[0]
+    if PAT_C_TME_C.match(path):
+        return "c"
+    parts = path.split("/")
+    if parts[0] == "s" and len(parts) >= 3:
+        return "s"
+    if PAT_PLAIN.match(path):
+        return "plain"
+    return "invalid"
+
+
+def _restore_cached(value: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    还原缓存条目（不发起请求）；telegram_api 条目缺少 source_chat_id / source_message_id 时返回 None，需要重新解析
+    """
+    parsed = dict(value)
+    if parsed.get("kind") == "telegram_api" and not (parsed.get("source_chat_id") and parsed.get("source_message_id")):
+        return None
+    return parsed
+
+
+async def _parse_telegram_link_uncached(
+    url: str,
+    user_client: Client,
+    routes: Optional[ChannelRouteCache] = None,
+    hedge_delay: float = DEFAULT_HEDGE_DELAY,
+) -> Dict[str, Any]:
     m = TELEGRAM_TME_RE.match(url)
     if not m:
         # 非 telegram 链接，使用网页解析
-        doc = fetch_and_parse_webpage(url)
-        return {"kind": "webpage", "title": doc.get("title"), "excerpt": doc.get("excerpt"), "text": doc.get("text")}
+        return await _parse_webpage(url)
 
     path = m.group("path").strip("/")
     path = path.split("?")[0].split("#")[0]
@@ -285,31 +333,122 @@ async def parse_telegram_link(url: str, user_client: Client) -> Dict[str, Any]:
             msg_id = int(parts[2])
         except Exception:
             raise RuntimeError("无法解析 t.me/s/... 链接中的消息 ID")
-        tme_url = f"https://t.me/s/{channel}/{msg_id}"
-        scraped = _try_scrape_tme_post(tme_url)
-        if scraped:
-            return scraped
-        # fallback to user API
-        return await _fetch_via_userapi(user_client, f"@{channel}", msg_id)
+        return await _probe_public_post(user_client, channel, msg_id, [f"https://t.me/s/{channel}/{msg_id}"], routes, hedge_delay)
 
     m_p = PAT_PLAIN.match(path)
     if m_p:
         username = m_p.group("username")
         msg_id = int(m_p.group("msg_id"))
-        # 尝试两种 t.me 页面形式
-        for turl in (f"https://t.me/{username}/{msg_id}", f"https://t.me/s/{username}/{msg_id}"):
-            scraped = _try_scrape_tme_post(turl)
-            if scraped:
-                return scraped
-        # fallback to user API
-        return await _fetch_via_userapi(user_client, f"@{username}", msg_id)
+        # 两种 t.me 页面形式（按此顺序作为优先级）
+        web_urls = [f"https://t.me/{username}/{msg_id}", f"https://t.me/s/{username}/{msg_id}"]
+        return await _probe_public_post(user_client, username, msg_id, web_urls, routes, hedge_delay)
 
     raise RuntimeError("无法识别的 Telegram 链接格式")
 
 
+async def _probe_public_post(
+    user_client: Client,
+    username: str,
+    msg_id: int,
+    web_urls: List[str],
+    routes: Optional[ChannelRouteCache],
+    hedge_delay: float,
+) -> Dict[str, Any]:
+    """
+    公开用户名链接：按 routes 中记住的路径直接获取；未知时对冲请求（_hedged_fetch）
+    记住的路径失效（网页抓不到 / user API 出错）时清除该条目，改走另一条路径
+    """
+    route = routes.get(username) if routes is not None else None
+    if route == ROUTE_API:
+        try:
+            return await _fetch_via_userapi(user_client, f"@{username}", msg_id)
+        except (MessageNotFoundError, FloodWait):
+            raise
+        except Exception as e:
+            logger.debug("频道 %s 记住的 user API 路径失败，重新探测: %s", username, e)
+            routes.forget(username)
+            route = None
+    elif route == ROUTE_WEB:
+        # 公开频道：不按时间对冲，网页变体全部失败后才调用 user API
+        try:
+            parsed, learned = await _hedged_fetch(user_client, username, msg_id, web_urls, None)
+        except Exception:
+            # 网页与 user API 都失败：记住的网页路径同样不可信，下次重新探测
+            routes.forget(username)
+            raise
+        if learned != ROUTE_WEB:
+            logger.debug("频道 %s 记住的网页路径抓取失败，已改用 user API", username)
+            routes.forget(username)
+        if learned == ROUTE_API:
+            routes.remember(username, ROUTE_API)
+        return parsed
+
+    parsed, learned = await _hedged_fetch(user_client, username, msg_id, web_urls, hedge_delay)
+    if routes is not None and learned is not None:
+        routes.remember(username, learned)
+    return parsed
+
+
+async def _hedged_fetch(
+    user_client: Client,
+    username: str,
+    msg_id: int,
+    web_urls: List[str],
+    hedge_delay: Optional[float],
+) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    同时抓取所有网页变体；hedge_delay 秒后（或网页变体提前全部失败时）并发调用 user API；
+    hedge_delay 为 None 时只在网页变体全部失败后调用
+    返回 (第一个可用结果, 可确定的路径)：网页成功为 ROUTE_WEB；所有网页变体都失败后 user API 成功为 ROUTE_API；
+    user API 在网页请求结束前抢先返回时不确定频道是否公开，路径为 None
+    全部失败时抛出 user API 的异常；返回或异常退出时取消尚未完成的请求
+    """
+    loop = asyncio.get_running_loop()
+    hedge_at = None if hedge_delay is None else loop.time() + max(0.0, hedge_delay)
+    web_tasks = [asyncio.create_task(_try_scrape_tme_post(u)) for u in web_urls]
+    api_task: Optional[asyncio.Task] = None
+    pending = set(web_tasks)
+    try:
+        while True:
+            if api_task is None and (all(t.done() for t in web_tasks) or (hedge_at is not None and loop.time() >= hedge_at)):
+                api_task = asyncio.create_task(_fetch_via_userapi(user_client, f"@{username}", msg_id))
+                pending.add(api_task)
+            if not pending:
+                # 网页变体都没有结果，user API 也失败：抛出 user API 的异常
+                return api_task.result(), None
+            timeout = None if api_task is not None or hedge_at is None else max(0.0, hedge_at - loop.time())
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            # 网页变体按 web_urls 的顺序优先
+            for t in web_tasks:
+                if t in done and not t.cancelled() and t.exception() is None and t.result():
+                    return t.result(), ROUTE_WEB
+            if api_task is not None and api_task in done and api_task.exception() is None:
+                web_failed = all(t.done() and t.exception() is None and not t.result() for t in web_tasks)
+                return api_task.result(), (ROUTE_API if web_failed else None)
+    finally:
+        for t in pending:
+            t.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
 async def _parse_webpage(url: str) -> Dict[str, Any]:
     """
-    使用 fetch_and_parse_webpage 解析普通网页（包装为异步接口）
+    使用 fetch_and_parse_webpage 解析普通网页；链接指向文件时返回 kind == "attachment"
     """
-    doc = fetch_and_parse_webpage(url)
+    doc = await fetch_and_parse_webpage(url)
+    if doc.get("binary"):
+        # 文件链接：只返回响应头中的元信息，正文未下载
+        return {
+            "kind": "attachment",
+            "title": doc.get("file_name"),
+            "parsed_title": doc.get("file_name"),
+            "attachments": [{
+                "type": "file",
+                "url": doc.get("url") or url,
+                "file_name": doc.get("file_name"),
+                "file_size": doc.get("content_length"),
+                "mime_type": doc.get("content_type"),
+            }],
+        }
     return {"kind": "webpage", "title": doc.get("title"), "excerpt": doc.get("excerpt"), "text": doc.get("text")}
\ No newline at end of file
@@ -0,0 +1,282 @@
+"""
+文件工具
+
+FileClassifier —— 批量修改 MD5 前的文件类型判断（替代逐个 magic.from_file）
+- 先按扩展名过滤，扩展名不在允许列表中的文件不打开
+- 只读取文件头 MAGIC_HEADER_BYTES 字节交给 magic.from_buffer 判断 mime
+- 判断结果与已知 MD5 缓存在旁路文件（JSONL，默认 CLASSIFY_CACHE_FILE）中，
+  以 path 为键、(inode, size, mtime_ns) 为有效性校验：文件未变化时重复扫描既不嗅探也不重新计算 MD5
+
+walk_files —— 基于 os.scandir 的流式目录遍历（替代 rglob 全量列表）
+iter_in_background —— 在后台线程中运行迭代器并经有界队列交给调用方，遍历与处理重叠进行
+"""
+
+import fnmatch
+import json
+import os
+import queue
+import re
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Pattern, TypeVar
+
+# 尝试使用 libmagic 做 mime 检测（更可靠），若不可用则回退到扩展名判断
+try:
+    import magic  # pip install python-magic
+    _HAS_MAGIC = True
+except Exception:
+    _HAS_MAGIC = False
+
+# 类型判断缓存文件（JSONL，每行一个文件的最新判断结果）
+CLASSIFY_CACHE_FILE = Path(".md5_classify_cache.jsonl")
+# 交给 libmagic 的文件头字节数（图片 / 视频容器 / 压缩包的签名都在开头）
+MAGIC_HEADER_BYTES = 8192
+
+_EDITABLE_ARCHIVE_MIMES = ("application/zip", "application/x-rar-compressed", "application/x-7z-compressed")
+
+
+def is_editable_mime(mime: Optional[str]) -> bool:
+    # 图片/视频/zip 的常见 mime 前缀判断
+    if not mime:
+        return False
+    if mime.startswith("image/") or mime.startswith("video/"):
+        return True
+    return mime in _EDITABLE_ARCHIVE_MIMES
+
+
+def sniff_mime(path: Path, header_bytes: int = MAGIC_HEADER_BYTES) -> Optional[str]:
+    """只读取文件头判断 mime；无 libmagic 时返回 None"""
+    if not _HAS_MAGIC:
+        return None
+    with open(path, "rb") as fh:
+        header = fh.read(header_bytes)
+    return magic.from_buffer(header, mime=True)
+
+
+def _stat_key(st: os.stat_result) -> Dict[str, int]:
+    return {"ino": st.st_ino, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+class FileClassifier:
+    """
+    线程安全（供 md5_tool 的线程池共享）。path=None 时只在内存中缓存。
+    用法：
+      with FileClassifier() as clf:
+          if clf.is_editable(f, allowed_exts):
+              md5 = clf.cached_md5(f)
+    """
+
+    def __init__(self, path: Optional[Path] = CLASSIFY_CACHE_FILE):
+        self.path = Path(path) if path else None
+        self._entries: Dict[str, Dict] = {}
+        self._lines = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+        self._fh = self.path.open("a", encoding="utf-8") if self.path else None
+
+    def _load(self):
+        if not self.path or not self.path.exists():
+            return
+        with self.path.open("rb") as fh:
+            data = fh.read()
+        for line in data.splitlines():
+            try:
+                rec = json.loads(line)
+                self._entries[rec.pop("path")] = rec
+                self._lines += 1
+            except Exception:
+                # 中断时最后一行可能写了一半，忽略
+                continue
+        if data and not data.endswith(b"\n"):
+            with self.path.open("ab") as fh:
+                fh.write(b"\n")
+
+    def _lookup(self, path: Path, st: os.stat_result) -> Optional[Dict]:
+        entry = self._entries.get(str(path))
+        if entry is None or any(entry.get(k) != v for k, v in _stat_key(st).items()):
+            return None
+        return entry
+
+    def _store(self, path: Path, st: os.stat_result, **fields):
+        key = str(path)
+        with self._lock:
+            entry = self._lookup(path, st)
+            entry = dict(entry) if entry else _stat_key(st)
+            entry.update(fields)
+            self._entries[key] = entry
+            if self._fh:
+                rec = {"path": key}
+                rec.update(entry)
+                self._fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                self._lines += 1
+
+    def is_editable(self, path: Path, allowed_exts: set, st: Optional[os.stat_result] = None) -> bool:
+        ext = path.suffix.lower().lstrip(".")
+        if ext not in allowed_exts:
+            return False
+        if not _HAS_MAGIC:
+            # 无 libmagic，使用扩展名判断（fallback）
+            return True
+        st = st or path.stat()
+        entry = self._lookup(path, st)
+        if entry is not None and "editable" in entry:
+            self.hits += 1
+            return entry["editable"]
+        self.misses += 1
+        try:
+            mime = sniff_mime(path)
+        except Exception:
+            # 若 magic 检测失败，回退到扩展名判断（不缓存，下次重试）
+            return True
+        editable = is_editable_mime(mime)
+        self._store(path, st, mime=mime, editable=editable)
+        return editable
+
+    def cached_md5(self, path: Path, st: Optional[os.stat_result] = None) -> Optional[str]:
+        entry = self._lookup(path, st or path.stat())
+        return entry.get("md5") if entry else None
+
+    def remember(self, path: Path, st: Optional[os.stat_result] = None, **fields):
+        """记录文件当前状态下的已知信息（md5 / editable 等），例如修改后的新 MD5"""
+        self._store(path, st or path.stat(), **fields)
+
+    def compact(self):
+        """每个 path 只保留一行，原子替换缓存文件"""
+        if not self.path:
+            return
+        with self._lock:
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with tmp.open("w", encoding="utf-8") as out:
+                for p, entry in self._entries.items():
+                    rec = {"path": p}
+                    rec.update(entry)
+                    out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self._fh.close()
+            os.replace(tmp, self.path)
+            self._fh = self.path.open("a", encoding="utf-8")
+            self._lines = len(self._entries)
+
+    def close(self):
+        if not self._fh or self._fh.closed:
+            return
+        if self._lines > 2 * len(self._entries):
+            self.compact()
+        self._fh.close()
+
+    def __enter__(self) -> "FileClassifier":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+T = TypeVar("T")
+
+# 后台遍历与消费者之间的队列长度（内存占用与目录树大小无关）
+WALK_QUEUE_SIZE = 1024
+
+
+def _compile_globs(patterns: Optional[Iterable[str]]) -> List[Pattern]:
+    return [re.compile(fnmatch.translate(p)) for p in (patterns or [])]
+
+
+def _glob_match(regexes: List[Pattern], rel: str, name: str) -> bool:
+    # 模式既可以匹配文件名（"*.mp4"），也可以匹配相对根目录的路径（"cache/*"）
+    return any(r.match(name) or r.match(rel) for r in regexes)
+
+
+def walk_files(
+    roots: Iterable[str],
+    max_depth: Optional[int] = None,
+    include: Optional[Iterable[str]] = None,
+    exclude: Optional[Iterable[str]] = None,
+    on_error: Optional[Callable[[str, OSError], None]] = None,
+) -> Iterator[os.DirEntry]:
+    """
+    流式遍历 roots 下的文件，逐个 yield os.DirEntry（entry.stat() 结果由 DirEntry 缓存）
+    - max_depth: 0 只处理根目录下的文件，None 不限制深度
+    - include: 文件 glob 列表，提供时只返回匹配的文件
+    - exclude: 文件 / 目录 glob 列表，匹配的目录整棵跳过
+    - on_error(path, exc): 根目录不存在、目录无法读取时回调；未提供时静默跳过
+    不跟随目录符号链接（与 Path.rglob 一致，避免循环）；文件符号链接按目标判断是否为文件
+    """
+    inc = _compile_globs(include)
+    exc = _compile_globs(exclude)
+    for root in roots:
+        root = os.fspath(root)
+        # (目录, 相对根目录的前缀, 深度)
+        stack = [(root, "", 0)]
+        while stack:
+            d, prefix, depth = stack.pop()
+            try:
+                it = os.scandir(d)
+            except OSError as e:
+                if on_error:
+                    on_error(d, e)
+                continue
+            subdirs = []
+            with it:
+                for entry in it:
+                    rel = prefix + entry.name
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if (max_depth is None or depth < max_depth) and not _glob_match(exc, rel, entry.name):
+                                subdirs.append((entry.path, rel + "/", depth + 1))
+                            continue
+                        if not entry.is_file():
+                            continue
+                    except OSError:
+                        continue
+                    if exc and _glob_match(exc, rel, entry.name):
+                        continue
+                    if inc and not _glob_match(inc, rel, entry.name):
+                        continue
+                    yield entry
+            # 逆序入栈，使子目录按 scandir 顺序深度优先处理
+            stack.extend(reversed(subdirs))
+
+
+_DONE = object()
+
+
+def iter_in_background(iterable: Iterable[T], maxsize: int = WALK_QUEUE_SIZE) -> Iterator[T]:
+    """
+    在守护线程中迭代 iterable，结果经有界队列逐个交给调用方；生产者异常在消费端重新抛出。
+    调用方提前结束迭代（break / 生成器被关闭）时生产者线程随之停止。
+    """
+    q: "queue.Queue" = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            for item in iterable:
+                if not _put((True, item)):
+                    return
+        except BaseException as e:
+            _put((False, e))
+            return
+        _put((True, _DONE))
+
+    t = threading.Thread(target=_produce, name="walk_files", daemon=True)
+    t.start()
+    try:
+        while True:
+            ok, item = q.get()
+            if not ok:
+                raise item
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        stop.set()
@@ -1,39 +1,140 @@
 """
-网页抓取与解析：使用 requests + readability-lxml + BeautifulSoup
-函数 fetch_and_parse_webpage(url) 返回 dict:
-  - title, excerpt (readability summary text), text (plain text), og_image
+网页抓取与解析：使用共享 httpx 异步客户端 + readability-lxml + lxml
+函数 fetch_and_parse_webpage(url) （协程）返回 dict:
+  - title, excerpt (readability summary text), text (plain text), og_image, truncated（正文超过下载上限被截断）
+  - 链接不是网页（图片 / 视频 / 压缩包等，按响应头判断）时不下载正文，返回
+    binary=True 以及 url, file_name, content_type, content_length
+整页只用 lxml 解析一次：og:image / twitter:image 查找、正文纯文本、标题与 readability 摘要共用同一棵树。
+解析通过 src/utils/parse_pool 执行：大页面在进程池中解析，不阻塞事件循环。
+lxml.html / readability 在第一次解析网页时才导入（缩短 bot 启动时间）。
 注意：网络请求受目标站点反爬与防护影响，适当设置超时与 UA。
 """
 
-import requests
-from readability import Document
-from bs4 import BeautifulSoup
-from typing import Dict, Any
+from typing import Any, Dict, Iterator, Optional
+
+from src.utils.http_client import fetch_text
+from src.utils.parse_pool import parse_pool
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (XBparsing_bot/1.0; +https://example.com) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117 Safari/537.36"
 }
 REQUEST_TIMEOUT = 12.0
+# 网页正文下载上限（字节），超出部分不下载、不解析
+MAX_PAGE_BYTES = 5 * 1024 * 1024
+# 返回的整页纯文本最大字符数（达到后停止提取）
+MAX_TEXT_CHARS = 20000
+
+_utf8_parser = None
+# 与 BeautifulSoup.get_text 一致：不输出这些标签内的文本（注释文本同样跳过）
+_NON_TEXT_TAGS = frozenset({"script", "style", "template"})
+_PRESERVE_WS_TAGS = frozenset({"pre", "textarea"})
+_ASCII_SPACES = " \t\n\r\f"
+
+
+async def fetch_and_parse_webpage(url: str) -> Dict[str, Any]:
+    body = await fetch_text(url, headers=HEADERS, timeout=REQUEST_TIMEOUT, max_bytes=MAX_PAGE_BYTES)
+    body.response.raise_for_status()
+    if not body.is_text:
+        return {
+            "binary": True,
+            "url": body.url,
+            "title": body.file_name,
+            "file_name": body.file_name,
+            "content_type": body.content_type,
+            "content_length": body.content_length,
+        }
+    parsed = await parse_pool.run(parse_webpage_html, body.text)
+    parsed["truncated"] = body.truncated
+    return parsed
+
+
+def _parse_html(data: bytes):
+    global _utf8_parser
+    import lxml.html
+
+    if _utf8_parser is None:
+        _utf8_parser = lxml.html.HTMLParser(encoding="utf-8")
+    return lxml.html.document_fromstring(data, parser=_utf8_parser)
+
+
+def parse_webpage_html(content: str) -> Dict[str, Any]:
+    from readability import Document
+    from readability.htmls import shorten_title
+
+    # 与 readability 的 build_doc 相同的解析方式（先编码为 utf-8，替换非法字符）
+    tree = _parse_html(content.encode("utf-8", "replace"))
+    # readability 会就地删除隐藏元素：元数据与整页文本要在它之前取
+    og_image = _find_image_meta(tree)
+    full_text = _extract_text(tree, MAX_TEXT_CHARS)
+    title = shorten_title(tree)
+    summary_html = Document(tree).summary()
+    excerpt = "\n".join(iter_text(_parse_html(summary_html.encode("utf-8")))).strip()
+    return {"title": title, "excerpt": excerpt, "text": full_text, "og_image": og_image}
+
+
+def _find_image_meta(tree) -> Optional[str]:
+    """一次遍历 <meta>：取第一个 og:image 的 content，为空时取第一个 twitter:image 的 content"""
+    og_seen = twitter_seen = False
+    twitter = None
+    for meta in tree.iter("meta"):
+        if not og_seen and meta.get("property") == "og:image":
+            og_seen = True
+            content = meta.get("content")
+            if content:
+                return content
+        elif not twitter_seen and meta.get("name") == "twitter:image":
+            twitter_seen = True
+            twitter = meta.get("content")
+    return twitter
+
+
+def _collapse(text: str, preserve: bool) -> str:
+    """与 BeautifulSoup 一致：纯 ASCII 空白的片段折叠为一个换行或空格（pre / textarea 内保留原样）"""
+    if preserve or text.strip(_ASCII_SPACES):
+        return text
+    return "\n" if "\n" in text else " "
+
+
+def iter_text(root) -> Iterator[str]:
+    """按文档顺序产出文本片段（元素的 text 与 tail），等价于 BeautifulSoup.get_text 的各个字符串"""
+    # 栈中 pre / textarea 的个数
+    preserve = 1 if root.tag in _PRESERVE_WS_TAGS else 0
+    if root.text and root.tag not in _NON_TEXT_TAGS:
+        yield _collapse(root.text, preserve > 0)
+    stack = [(root, iter(root))]
+    while stack:
+        el, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            if el.tag in _PRESERVE_WS_TAGS:
+                preserve -= 1
+            if stack and el.tail:
+                yield _collapse(el.tail, preserve > 0)
+            continue
+        tag = child.tag
+        if isinstance(tag, str) and tag not in _NON_TEXT_TAGS:
+            if tag in _PRESERVE_WS_TAGS:
+                preserve += 1
+            if child.text:
+                yield _collapse(child.text, preserve > 0)
+            stack.append((child, iter(child)))
+        elif child.tail:
+            # 注释 / 处理指令 / 跳过的标签：只保留其后的文本
+            yield _collapse(child.tail, preserve > 0)
 
 
-def fetch_and_parse_webpage(url: str) -> Dict[str, Any]:
-    resp = requests.get(url, headers=HEADERS, timeout=REQUEST_TIMEOUT)
-    resp.raise_for_status()
-    content = resp.text
-    doc = Document(content)
-    title = doc.short_title()
-    summary_html = doc.summary()
-    # parse summary text
-    soup = BeautifulSoup(summary_html, "lxml")
-    excerpt = soup.get_text(separator="\n").strip()
-    # full text fallback: clean up original content
-    soup_full = BeautifulSoup(content, "lxml")
-    full_text = soup_full.get_text(separator="\n")
-    # try to get og:image
-    og_image = None
-    og = soup_full.find("meta", property="og:image")
-    if og and og.get("content"):
-        og_image = og.get("content")
-    elif soup_full.find("meta", attrs={"name": "twitter:image"}):
-        og_image = soup_full.find("meta", attrs={"name": "twitter:image"}).get("content", None)
-    return {"title": title, "excerpt": excerpt, "text": full_text.strip()[:20000], "og_image": og_image}
\ No newline at end of file
+def _extract_text(root, limit: int) -> str:
+    """以换行连接文本片段并去掉首尾空白，最多 limit 个字符；累计够 limit 个字符后不再遍历"""
+    parts = []
+    size = 0
+    for text in iter_text(root):
+        if not parts:
+            text = text.lstrip()
+            if not text:
+                continue
+        parts.append(text)
+        size += len(text) + 1
+        if size > limit:
+            return "\n".join(parts)[:limit]
+    return "\n".join(parts).rstrip()[:limit]
@@ -0,0 +1,236 @@
+"""
+共享异步 HTTP 客户端（基于 httpx.AsyncClient）
+- 进程内只创建一个 AsyncClient，复用 keep-alive 连接池，避免每次请求重新握手
+- 安装了 h2 时启用 HTTP/2（同一 host 多路复用），否则自动回退 HTTP/1.1
+- 每个 host 的并发请求数由 asyncio.Semaphore 限制，避免单个慢站点占满连接池；
+  host 没有进行中 / 等待中的请求时即删除其信号量（用户链接的 host 不可枚举，不能一直保留）
+- t.me 抓取（_try_scrape_tme_post）与网页解析（fetch_and_parse_webpage）共用此客户端
+- fetch_text 流式读取正文：响应头不是网页（按 Content-Type / Content-Disposition，缺失时嗅探首块）时
+  不下载正文；网页正文最多读取 max_bytes 字节，编码按响应头 charset -> BOM / <meta charset> 嗅探 -> utf-8 确定
+
+使用：
+  resp = await http_get(url, headers=HEADERS)
+  body = await fetch_text(url, headers=HEADERS)   # body.text 为 None 表示不是网页（未下载正文）
+  进程退出前调用 await close_http_client() 释放连接
+"""
+
+import asyncio
+import codecs
+import logging
+import re
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT = 12.0
+# 连接池：总连接数 / 空闲 keep-alive 连接数 / 空闲连接保留秒数
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_EXPIRY = 30.0
+# 单个 host 同时进行的请求数上限
+PER_HOST_LIMIT = 8
+# fetch_text 读取正文的默认字节上限（超出部分不再下载，结果标记 truncated）
+MAX_BODY_BYTES = 5 * 1024 * 1024
+# 按网页处理（读取正文）的 Content-Type
+TEXT_CONTENT_TYPES = frozenset({"text/html", "application/xhtml+xml", "text/plain", "text/xml", "application/xml"})
+# 编码嗅探只看正文开头这么多字节
+SNIFF_BYTES = 4096
+
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9_.:-]+)""", re.IGNORECASE)
+_XML_ENCODING_RE = re.compile(rb"""^<\?xml[^>]+encoding\s*=\s*["']([A-Za-z0-9_.:-]+)""")
+_DISPOSITION_NAME_RE = re.compile(r"""filename\*?\s*=\s*(?:[\w-]+'[\w-]*')?["']?([^"';]+)""", re.IGNORECASE)
+_BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+
+_client: Optional[httpx.AsyncClient] = None
+_host_slots: Dict[str, "_HostSlot"] = {}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (pip install httpx[http2])
+        return True
+    except Exception:
+        return False
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """返回进程共享的 AsyncClient（首次调用或已关闭时创建）"""
+    global _client
+    if _client is None or _client.is_closed:
+        http2 = _http2_available()
+        _client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(REQUEST_TIMEOUT),
+            follow_redirects=True,
+        )
+        logger.debug("创建共享 HTTP 客户端 (http2=%s)", http2)
+    return _client
+
+
+class _HostSlot:
+    __slots__ = ("semaphore", "users")
+
+    def __init__(self):
+        self.semaphore = asyncio.Semaphore(PER_HOST_LIMIT)
+        # 持有或正在等待该信号量的请求数
+        self.users = 0
+
+
+@asynccontextmanager
+async def _host_limit(url: str) -> AsyncIterator[None]:
+    """占用 url 所属 host 的一个并发名额；最后一个使用者退出时删除该 host 的信号量"""
+    host = (urlsplit(url).hostname or "").lower()
+    slot = _host_slots.get(host)
+    if slot is None:
+        slot = _host_slots[host] = _HostSlot()
+    slot.users += 1
+    try:
+        async with slot.semaphore:
+            yield
+    finally:
+        slot.users -= 1
+        # 仍有等待者时保留，否则新请求会拿到另一个信号量而突破上限
+        if slot.users == 0 and _host_slots.get(host) is slot:
+            del _host_slots[host]
+
+
+async def http_get(url: str, headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None) -> httpx.Response:
+    """
+    通过共享客户端发起 GET 请求（受 per-host 并发上限约束）
+    网络错误 / 超时会原样抛出 httpx 异常，由调用方决定如何处理
+    """
+    async with _host_limit(url):
+        return await get_http_client().get(url, headers=headers, timeout=timeout or REQUEST_TIMEOUT)
+
+
+@dataclass
+class FetchedBody:
+    """fetch_text 的结果；text 为 None 表示响应不是网页或状态码不是 2xx，正文未下载"""
+    url: str
+    status_code: int
+    content_type: Optional[str]
+    content_length: Optional[int]
+    file_name: Optional[str]
+    # 已关闭的响应对象（未读取正文），可用于 raise_for_status() / 读取响应头
+    response: httpx.Response
+    text: Optional[str] = None
+    encoding: Optional[str] = None
+    truncated: bool = False
+
+    @property
+    def is_text(self) -> bool:
+        return self.text is not None
+
+
+def _parse_content_type(value: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """'text/html; charset=GBK' -> ('text/html', 'GBK')"""
+    if not value:
+        return None, None
+    mime, _, params = value.partition(";")
+    charset = None
+    for param in params.split(";"):
+        key, _, val = param.partition("=")
+        if key.strip().lower() == "charset" and val.strip():
+            charset = val.strip().strip("\"'")
+    return mime.strip().lower() or None, charset
+
+
+def _valid_encoding(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def _sniff_encoding(head: bytes) -> Optional[str]:
+    """按正文开头的 BOM、<?xml encoding>、<meta charset> / http-equiv 推断编码"""
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    m = _XML_ENCODING_RE.match(head) or _META_CHARSET_RE.search(head)
+    return _valid_encoding(m.group(1).decode("ascii")) if m else None
+
+
+def _looks_like_markup(head: bytes) -> bool:
+    for bom, _ in _BOMS:
+        if head.startswith(bom):
+            return True
+    return head.lstrip()[:1] == b"<"
+
+
+def _file_name(resp: httpx.Response) -> Optional[str]:
+    m = _DISPOSITION_NAME_RE.search(resp.headers.get("content-disposition", ""))
+    if m:
+        return unquote(m.group(1).strip()) or None
+    name = unquote(resp.url.path.rsplit("/", 1)[-1])
+    return name or None
+
+
+async def fetch_text(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+    max_bytes: int = MAX_BODY_BYTES,
+) -> FetchedBody:
+    """
+    流式 GET，只在响应是网页时读取正文（最多 max_bytes 字节）
+    - 非 2xx、Content-Type 不在 TEXT_CONTENT_TYPES、Content-Disposition: attachment：收到响应头后即关闭连接
+    - 没有 Content-Type 时读取首块：不像 HTML/XML（不以 '<' 开头）则按二进制处理
+    网络错误 / 超时会原样抛出 httpx 异常
+    """
+    async with _host_limit(url):
+        async with get_http_client().stream("GET", url, headers=headers, timeout=timeout or REQUEST_TIMEOUT) as resp:
+            content_type, charset = _parse_content_type(resp.headers.get("content-type"))
+            try:
+                content_length: Optional[int] = int(resp.headers.get("content-length", ""))
+            except ValueError:
+                content_length = None
+            result = FetchedBody(
+                url=str(resp.url),
+                status_code=resp.status_code,
+                content_type=content_type,
+                content_length=content_length,
+                file_name=_file_name(resp),
+                response=resp,
+            )
+            attachment = resp.headers.get("content-disposition", "").lower().startswith("attachment")
+            if not resp.is_success or attachment or (content_type is not None and content_type not in TEXT_CONTENT_TYPES):
+                return result
+
+            raw = bytearray()
+            async for chunk in resp.aiter_bytes():
+                if not chunk:
+                    continue
+                if not raw and content_type is None and not _looks_like_markup(chunk):
+                    logger.debug("响应没有 Content-Type 且内容不像网页，按二进制处理: %s", url)
+                    return result
+                if len(raw) + len(chunk) > max_bytes:
+                    raw += chunk[: max_bytes - len(raw)]
+                    result.truncated = True
+                    logger.debug("正文超过 %d 字节，已截断: %s", max_bytes, url)
+                    break
+                raw += chunk
+            result.encoding = _valid_encoding(charset) or _sniff_encoding(bytes(raw[:SNIFF_BYTES])) or "utf-8"
+            result.text = raw.decode(result.encoding, errors="replace")
+            return result
+
+
+async def close_http_client():
+    """关闭共享客户端并清理 per-host 限流状态"""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+    _host_slots.clear()
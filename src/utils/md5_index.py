@@ -0,0 +1,240 @@
+"""
+媒体库 MD5 索引与重复文件检测（表 file_digests，与其它表共用 src/core/db.py 的 SQLite 数据库）
+- 以 path 为键，(size, mtime_ns) 未变化时复用已计算的哈希，重复扫描不再读取文件
+- 分三级逐步缩小需要读取的范围：
+    1. 大小相同的文件才可能重复（只需 stat）
+    2. 部分哈希：文件首尾各 PARTIAL_HASH_BYTES 字节的 MD5
+    3. 部分哈希也相同的文件才计算完整 MD5
+- 同一次扫描中对照修改日志（只读加载，见 md5_tool.read_journal），标出 MD5 已被修改过、且当前完整 MD5 仍等于修改后 MD5 的文件
+
+用法：
+  report = scan_library(["/data/media"], include_subdirs=True)
+  report["duplicates"]  # [{"md5", "size", "paths": [...]}, ...]
+  report["modified"]    # MD5 已修改过的文件路径
+"""
+
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.core.db import register_schema, transaction
+from src.utils.file_utils import iter_in_background, walk_files
+from src.utils.md5_tool import compute_md5, read_journal
+
+FILE_DIGESTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_digests (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    partial_md5 TEXT,
+    md5 TEXT,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_file_digests_size ON file_digests (size);
+CREATE INDEX IF NOT EXISTS idx_file_digests_md5 ON file_digests (md5);
+"""
+
+register_schema(FILE_DIGESTS_SCHEMA)
+
+# 部分哈希读取文件头、尾各多少字节；不超过两倍的小文件直接计算完整 MD5
+PARTIAL_HASH_BYTES = 1 << 20
+# 每个事务写入的行数
+WRITE_BATCH = 500
+
+# (size, mtime_ns) 未变化时保留已有哈希，否则清空
+_UPSERT_SQL = """
+INSERT INTO file_digests (path, size, mtime_ns, seen_at) VALUES (?, ?, ?, ?)
+ON CONFLICT(path) DO UPDATE SET
+    partial_md5 = CASE WHEN size = excluded.size AND mtime_ns = excluded.mtime_ns THEN partial_md5 END,
+    md5 = CASE WHEN size = excluded.size AND mtime_ns = excluded.mtime_ns THEN md5 END,
+    size = excluded.size,
+    mtime_ns = excluded.mtime_ns,
+    seen_at = excluded.seen_at
+"""
+
+
+def partial_md5(path: Path, size: int) -> str:
+    """文件首尾各 PARTIAL_HASH_BYTES 字节的 MD5（小文件即完整 MD5）"""
+    if size <= 2 * PARTIAL_HASH_BYTES:
+        return compute_md5(path)
+    h = hashlib.md5()
+    with path.open("rb") as fh:
+        h.update(fh.read(PARTIAL_HASH_BYTES))
+        fh.seek(size - PARTIAL_HASH_BYTES)
+        h.update(fh.read(PARTIAL_HASH_BYTES))
+    return h.hexdigest()
+
+
+def lookup_md5(path: Path, st: Optional[os.stat_result] = None) -> Optional[str]:
+    """返回索引中的完整 MD5；文件不在索引中或 (size, mtime_ns) 已变化时返回 None"""
+    st = st or path.stat()
+    with transaction() as conn:
+        row = conn.execute("SELECT size, mtime_ns, md5 FROM file_digests WHERE path = ?", (str(path),)).fetchone()
+    if not row or row[0] != st.st_size or row[1] != st.st_mtime_ns:
+        return None
+    return row[2]
+
+
+def _write_rows(sql: str, rows: List[Tuple]):
+    for i in range(0, len(rows), WRITE_BATCH):
+        with transaction() as conn:
+            conn.executemany(sql, rows[i:i + WRITE_BATCH])
+
+
+def _hash_stage(pool: ThreadPoolExecutor, select_sql: str, scan_id: float, full: bool) -> int:
+    """对 select_sql 选出的 (path, size) 计算部分 / 完整哈希并写回，返回计算的文件数"""
+    with transaction() as conn:
+        todo = conn.execute(select_sql, (scan_id, scan_id)).fetchall()
+    if not todo:
+        return 0
+
+    def _hash(item: Tuple[str, int]) -> Tuple[str, int, Optional[str]]:
+        path, size = item
+        try:
+            return path, size, (compute_md5(Path(path)) if full else partial_md5(Path(path), size))
+        except OSError:
+            # 扫描后被删除 / 无法读取：不参与后续比较
+            return path, size, None
+
+    results = [r for r in pool.map(_hash, todo) if r[2] is not None]
+    if full:
+        _write_rows("UPDATE file_digests SET md5 = ? WHERE path = ?", [(d, p) for p, _, d in results])
+    else:
+        # 小文件的部分哈希就是完整 MD5，一并写入
+        _write_rows(
+            "UPDATE file_digests SET partial_md5 = ?, md5 = CASE WHEN ? THEN ? ELSE md5 END WHERE path = ?",
+            [(d, size <= 2 * PARTIAL_HASH_BYTES, d, p) for p, size, d in results],
+        )
+    return len(results)
+
+
+def _verify_modified(pool: ThreadPoolExecutor, candidates: Dict[str, str]) -> Tuple[List[str], int]:
+    """
+    candidates: path -> 修改日志中的 new_md5（大小已与修改后一致）
+    返回 (当前完整 MD5 仍等于 new_md5 的路径, 读取文件计算的次数)；索引中 (size, mtime_ns) 未变化的哈希直接复用，其余读取文件计算并写回索引
+    """
+    known: Dict[str, Optional[str]] = {}
+    with transaction() as conn:
+        for path in candidates:
+            row = conn.execute("SELECT md5 FROM file_digests WHERE path = ?", (path,)).fetchone()
+            known[path] = row[0] if row else None
+
+    def _hash(path: str) -> Tuple[str, Optional[str]]:
+        try:
+            return path, compute_md5(Path(path))
+        except OSError:
+            return path, None
+
+    hashed = [r for r in pool.map(_hash, [p for p, md5 in known.items() if md5 is None]) if r[1] is not None]
+    # 不在索引中的文件（小于 min_size）UPDATE 不影响任何行
+    _write_rows("UPDATE file_digests SET md5 = ? WHERE path = ?", [(d, p) for p, d in hashed])
+    known.update(hashed)
+    return [p for p, new_md5 in candidates.items() if known.get(p) == new_md5], len(hashed)
+
+
+_PARTIAL_CANDIDATES_SQL = """
+SELECT path, size FROM file_digests
+WHERE seen_at = ? AND partial_md5 IS NULL AND size IN (
+    SELECT size FROM file_digests WHERE seen_at = ? GROUP BY size HAVING COUNT(*) > 1
+)
+"""
+
+_FULL_CANDIDATES_SQL = """
+SELECT d.path, d.size FROM file_digests d
+JOIN (
+    SELECT size, partial_md5 FROM file_digests
+    WHERE seen_at = ? AND partial_md5 IS NOT NULL
+    GROUP BY size, partial_md5 HAVING COUNT(*) > 1
+) g ON d.size = g.size AND d.partial_md5 = g.partial_md5
+WHERE d.seen_at = ? AND d.md5 IS NULL
+"""
+
+_DUPLICATES_SQL = """
+SELECT md5, size, path FROM file_digests
+WHERE seen_at = ? AND md5 IN (
+    SELECT md5 FROM file_digests WHERE seen_at = ? AND md5 IS NOT NULL GROUP BY md5 HAVING COUNT(*) > 1
+)
+ORDER BY md5, path
+"""
+
+
+def scan_library(
+    folder_paths: List[str],
+    include_subdirs: bool = True,
+    max_depth: Optional[int] = None,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+    min_size: int = 1,
+    workers: int = 4,
+    journal_path: Optional[Path] = None,
+) -> Dict:
+    """
+    扫描 folder_paths，更新索引并一次性返回：
+      - duplicates: [{"md5", "size", "paths": [...]}, ...]（只比较本次扫描到的文件）
+      - modified: MD5 已被 md5_tool 修改过、且当前完整 MD5 仍等于修改后 MD5 的文件
+      - files / bytes: 本次扫描的文件数与总字节数
+      - hashed_partial / hashed_full: 本次实际读取文件计算哈希的次数（复用索引的不计）
+    - min_size: 小于该大小的文件不参与重复检测（默认跳过空文件）
+    - workers: 计算哈希的线程数
+    """
+    scan_id = time.time()
+    report: Dict = {"files": 0, "bytes": 0, "modified": [], "errors": []}
+
+    def on_error(path: str, e: OSError):
+        report["errors"].append({"path": path, "error": repr(e)})
+
+    entries = walk_files(
+        folder_paths,
+        max_depth=max_depth if include_subdirs else 0,
+        include=include,
+        exclude=exclude,
+        on_error=on_error,
+    )
+    # 只读：不能打开 ModifyJournal（会创建 / 压缩日志文件，与同时运行的 /md5 修改冲突）
+    journal = read_journal(journal_path)
+    modified_candidates: Dict[str, str] = {}
+    rows: List[Tuple] = []
+    for entry in iter_in_background(entries):
+        try:
+            st = entry.stat()
+        except OSError as e:
+            on_error(entry.path, e)
+            continue
+        path = str(Path(entry.path))
+        report["files"] += 1
+        report["bytes"] += st.st_size
+        modified = journal.get(path)
+        if modified and modified.get("new_md5") and modified.get("new_size") == st.st_size:
+            modified_candidates[path] = modified["new_md5"]
+        if st.st_size < min_size:
+            continue
+        rows.append((path, st.st_size, st.st_mtime_ns, scan_id))
+        if len(rows) >= WRITE_BATCH:
+            _write_rows(_UPSERT_SQL, rows)
+            rows = []
+    _write_rows(_UPSERT_SQL, rows)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        report["hashed_partial"] = _hash_stage(pool, _PARTIAL_CANDIDATES_SQL, scan_id, full=False)
+        report["hashed_full"] = _hash_stage(pool, _FULL_CANDIDATES_SQL, scan_id, full=True)
+        # 大小相同不代表未被替换：用完整 MD5 确认（复用上面两级已算出或索引中已有的哈希）
+        report["modified"], hashed = _verify_modified(pool, modified_candidates)
+        report["hashed_full"] += hashed
+
+    with transaction() as conn:
+        dup_rows = conn.execute(_DUPLICATES_SQL, (scan_id, scan_id)).fetchall()
+    duplicates: List[Dict] = []
+    for md5, size, path in dup_rows:
+        if not duplicates or duplicates[-1]["md5"] != md5:
+            duplicates.append({"md5": md5, "size": size, "paths": []})
+        duplicates[-1]["paths"].append(path)
+    report["duplicates"] = duplicates
+    return report
+
+
+def find_duplicates(folder_paths: List[str], include_subdirs: bool = True, **kwargs) -> List[List[str]]:
+    """只返回重复文件分组（每组为路径列表），参数同 scan_library"""
+    return [d["paths"] for d in scan_library(folder_paths, include_subdirs=include_subdirs, **kwargs)["duplicates"]]
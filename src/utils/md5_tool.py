@@ -3,15 +3,15 @@ import json
 import traceback
 import hashlib
 import shutil
+import sys
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
 
-# 尝试使用 libmagic 做 mime 检测（更可靠），若不可用则回退到扩展名判断
-try:
-    import magic  # pip install python-magic
-    _HAS_MAGIC = True
-except Exception:
-    _HAS_MAGIC = False
+from src.utils.file_utils import CLASSIFY_CACHE_FILE, FileClassifier, iter_in_background, walk_files
+from src.utils.metrics import Counter, timed
 
 # 默认允许修改 MD5 的扩展（小写，不含点）
 DEFAULT_EDITABLE_EXT = {
@@ -20,54 +20,375 @@ DEFAULT_EDITABLE_EXT = {
     "zip", "rar", "7z"                      # 压缩（注意：zip 可能会被破坏，使用前确认）
 }
 
-# 修改记录文件（可替换为 DB）
+# 旧版修改记录文件（整文件 JSON），首次打开修改日志时自动导入
 MODIFY_LOG_FILE = Path(".md5_modify_log.json")
+# 修改日志（追加式 JSONL），见 ModifyJournal
+MODIFY_JOURNAL_FILE = Path(".md5_modify_journal.jsonl")
+# 每追加多少条记录 fsync 一次
+JOURNAL_FSYNC_BATCH = 64
+# 失效记录数超过该值且多于有效记录时，关闭日志前自动压缩
+JOURNAL_COMPACT_MIN_DEAD = 1000
+# 并行批量修改的断点文件（JSONL，每行一个已处理的文件）
+MODIFY_CHECKPOINT_FILE = Path(".md5_modify_checkpoint.jsonl")
+# 计算 MD5 时每次读取的块大小
+HASH_CHUNK_SIZE = 1 << 20
+# 并行批量修改时同时处理中的文件总字节上限
+DEFAULT_MAX_INFLIGHT_BYTES = 1 << 30
 
+# 修改前的备份方式：
+#   copy    —— 同目录生成 .bak 完整副本（占用与原文件相同的磁盘空间和 IO）
+#   reflink —— 尝试写时复制克隆 .bak（btrfs / xfs 等支持 FICLONE 的文件系统，几乎不占空间），不支持时退回 journal
+#   journal —— 不生成任何副本：修改日志记录原始大小、原始 MD5 与追加字节的 MD5，回滚时校验后截断即可还原
+BACKUP_COPY = "copy"
+BACKUP_REFLINK = "reflink"
+BACKUP_JOURNAL = "journal"
+BACKUP_MODES = (BACKUP_COPY, BACKUP_REFLINK, BACKUP_JOURNAL)
+# linux/fs.h: _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
 
-def _is_editable_by_mime(path: Path, allowed_exts: Optional[set] = None) -> bool:
-    ext = path.suffix.lower().lstrip(".")
-    if allowed_exts and ext not in allowed_exts:
-        return False
-    if _HAS_MAGIC:
+# 批量修改中各文件的处理结果（modified / skipped_type / dry_run / error / backup_failed 等）
+MD5_FILES = Counter("xbparsing_md5_files_total", "MD5 批量修改处理的文件数（按结果）", ("status",))
+
+
+class ModifyJournal:
+    """
+    追加式修改日志（JSONL，替代整文件重写的 .md5_modify_log.json）
+    每行一条记录：
+      {"op": "modify", "path": ..., "original_size": ..., "new_size": ..., "original_md5": ..., "new_md5": ...,
+       "tail_md5": ..., "backup": "copy" | "reflink" | "journal"}
+      {"op": "rollback", "path": ...}
+    - 打开时顺序读取一遍，在内存中建立 path -> 最新 modify 记录的索引（rollback 记录删除该项）
+    - 写入只追加，每 fsync_batch 条记录 fsync 一次（flush() / close() 时也会 fsync）
+    - 崩溃时最多丢失最后一批未 fsync 的记录；写了一半的最后一行在读取时被忽略
+    - 失效记录（被覆盖 / 已回滚）过多时 compact()：写临时文件后 os.replace 原子替换
+    - 首次打开时自动导入旧版 JSON 日志（MODIFY_LOG_FILE）
+    """
+
+    def __init__(self, path: Optional[Path] = None, fsync_batch: int = JOURNAL_FSYNC_BATCH, legacy_log: Optional[Path] = None):
+        self.path = Path(path or MODIFY_JOURNAL_FILE)
+        self.fsync_batch = max(1, fsync_batch)
+        self._index: Dict[str, Dict] = {}
+        self._dead = 0
+        self._unsynced = 0
+        self._lock = threading.Lock()
+        self._load()
+        self._fh = self.path.open("a", encoding="utf-8")
+        legacy = Path(legacy_log or MODIFY_LOG_FILE)
+        if not self._index and legacy.exists():
+            self._import_legacy(legacy)
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with self.path.open("rb") as fh:
+            data = fh.read()
+        self._index, self._dead = _parse_journal(data)
+        if data and not data.endswith(b"\n"):
+            # 上次写入中断留下半行：补换行，避免与后续记录拼在一起
+            with self.path.open("ab") as fh:
+                fh.write(b"\n")
+
+    def _import_legacy(self, legacy: Path):
         try:
-            m = magic.from_file(str(path), mime=True)
-            # 图片/视频/zip 的常见 mime 前缀判断
-            if m is None:
-                return False
-            if m.startswith("image/") or m.startswith("video/"):
-                return True
-            if m in ("application/zip", "application/x-rar-compressed", "application/x-7z-compressed"):
-                return True
-            return False
+            old = json.loads(legacy.read_text(encoding="utf-8"))
         except Exception:
-            # 若 magic 检测失败，回退到扩展名判断
-            return ext in (allowed_exts or DEFAULT_EDITABLE_EXT)
-    else:
-        # 无 libmagic，使用扩展名判断（fallback）
-        return ext in (allowed_exts or DEFAULT_EDITABLE_EXT)
+            return
+        for p, entry in old.items():
+            self.record_modify(p, entry)
+        self.flush()
+        legacy.rename(legacy.with_name(legacy.name + ".imported"))
+
+    def _append(self, rec: Dict):
+        with self._lock:
+            self._fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_batch:
+                self._sync()
+
+    def _sync(self):
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._unsynced = 0
+
+    def get(self, path: str) -> Optional[Dict]:
+        return self._index.get(path)
+
+    def entries(self) -> Dict[str, Dict]:
+        return dict(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def record_modify(self, path: str, entry: Dict):
+        if path in self._index:
+            self._dead += 1
+        self._index[path] = dict(entry)
+        rec = {"op": "modify", "path": path}
+        rec.update(entry)
+        self._append(rec)
 
+    def record_rollback(self, path: str):
+        if self._index.pop(path, None) is None:
+            return
+        # 被回滚的 modify 记录与这条 rollback 记录都会在压缩时清除
+        self._dead += 2
+        self._append({"op": "rollback", "path": path})
 
-def _load_log() -> Dict[str, Dict]:
-    if MODIFY_LOG_FILE.exists():
+    def flush(self):
+        with self._lock:
+            self._sync()
+
+    def compact(self):
+        """只保留每个 path 的最新 modify 记录，原子替换日志文件"""
+        with self._lock:
+            self._sync()
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with tmp.open("w", encoding="utf-8") as out:
+                for p, entry in self._index.items():
+                    rec = {"op": "modify", "path": p}
+                    rec.update(entry)
+                    out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+            self._fh.close()
+            os.replace(tmp, self.path)
+            self._fh = self.path.open("a", encoding="utf-8")
+            self._dead = 0
+
+    def close(self):
+        if self._fh.closed:
+            return
+        if self._dead > JOURNAL_COMPACT_MIN_DEAD and self._dead > len(self._index):
+            self.compact()
+        with self._lock:
+            self._sync()
+            self._fh.close()
+
+    def __enter__(self) -> "ModifyJournal":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _parse_journal(data: bytes) -> Tuple[Dict[str, Dict], int]:
+    """解析修改日志内容，返回 (path -> 最新 modify 记录, 失效记录数)；无法解析的行（写了一半的最后一行）忽略"""
+    index: Dict[str, Dict] = {}
+    dead = 0
+    for line in data.splitlines():
         try:
-            return json.loads(MODIFY_LOG_FILE.read_text(encoding="utf-8"))
+            rec = json.loads(line)
+            p = rec["path"]
         except Exception:
-            return {}
-    return {}
+            continue
+        if rec.get("op") == "rollback":
+            # rollback 记录本身，以及被它撤销的 modify 记录，都已失效
+            dead += 2 if index.pop(p, None) is not None else 1
+        else:
+            if p in index:
+                dead += 1
+            index[p] = {k: v for k, v in rec.items() if k not in ("op", "path")}
+    return index, dead
 
 
-def _save_log(log: Dict[str, Dict]):
-    MODIFY_LOG_FILE.write_text(json.dumps(log, ensure_ascii=False, indent=2), encoding="utf-8")
+def read_journal(path: Optional[Path] = None, legacy_log: Optional[Path] = None) -> Dict[str, Dict]:
+    """
+    只读加载修改日志：path -> 最新 modify 记录（日志为空时读取旧版 JSON 日志）
+    不创建、补写或压缩日志文件，也不导入 / 改名旧版日志，可与正在写入的 ModifyJournal 同时使用
+    """
+    try:
+        index, _ = _parse_journal(Path(path or MODIFY_JOURNAL_FILE).read_bytes())
+    except FileNotFoundError:
+        index = {}
+    legacy = Path(legacy_log or MODIFY_LOG_FILE)
+    if index or not legacy.exists():
+        return index
+    try:
+        return {p: dict(entry) for p, entry in json.loads(legacy.read_text(encoding="utf-8")).items()}
+    except Exception:
+        return index
 
 
-def compute_md5(path: Path) -> str:
+def compute_md5_state(path: Path):
+    """
+    读取整个文件并返回 hashlib.md5 对象（而不是 hexdigest），
+    调用方可在追加数据后对其 copy() 继续 update，无需重新读取整个文件
+    """
     h = hashlib.md5()
     with path.open("rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
             h.update(chunk)
-    return h.hexdigest()
+    return h
+
+
+def compute_md5(path: Path) -> str:
+    return compute_md5_state(path).hexdigest()
+
+
+def append_random_bytes(path: Path, state, append_bytes: int) -> Tuple[str, str]:
+    """
+    向文件追加 append_bytes 个随机字节，并基于原文件的哈希状态 state 增量得出新的 MD5
+    （state 本身不会被修改）。返回 (new_md5, tail_md5)，tail_md5 为追加字节本身的 MD5
+    """
+    data = os.urandom(append_bytes)
+    with path.open("ab") as fh:
+        fh.write(data)
+    h = state.copy()
+    h.update(data)
+    return h.hexdigest(), hashlib.md5(data).hexdigest()
+
+
+def _resolve_backup_mode(backup_mode: Optional[str], backup_before_modify: bool) -> str:
+    mode = backup_mode or (BACKUP_COPY if backup_before_modify else BACKUP_JOURNAL)
+    if mode not in BACKUP_MODES:
+        raise ValueError(f"unknown backup_mode: {mode!r} (expected one of {', '.join(BACKUP_MODES)})")
+    return mode
+
+
+def _reflink(src: Path, dst: Path) -> bool:
+    """用 FICLONE 创建写时复制克隆；文件系统 / 平台不支持时返回 False（不留下空文件）"""
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+
+    try:
+        with src.open("rb") as s, dst.open("xb") as d:
+            fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+        return True
+    except FileExistsError:
+        return True
+    except OSError:
+        try:
+            dst.unlink()
+        except OSError:
+            pass
+        return False
+
+
+def _backup(f: Path, mode: str) -> Tuple[str, Optional[str]]:
+    """按 mode 备份 f，返回 (实际使用的备份方式, 备份错误)"""
+    if mode == BACKUP_JOURNAL:
+        return BACKUP_JOURNAL, None
+    bak_path = f.with_name(f.name + ".bak")
+    # 如果 bak 存在则不覆盖
+    if bak_path.exists():
+        return mode, None
+    if mode == BACKUP_REFLINK:
+        return (BACKUP_REFLINK if _reflink(f, bak_path) else BACKUP_JOURNAL), None
+    try:
+        shutil.copy2(str(f), str(bak_path))
+        return BACKUP_COPY, None
+    except Exception as bex:
+        # 备份失败但我们可以选择继续或中断，记录并继续（仍可凭修改日志校验回滚）
+        return BACKUP_JOURNAL, str(bex)
+
+
+@timed("md5_file")
+def _modify_one(f: Path, allowed: set, append_bytes: int, dry_run: bool, backup_mode: str, classifier: FileClassifier) -> Dict:
+    """
+    处理单个文件（类型判断 / 备份 / 追加字节 / 计算前后 MD5），返回 details 项。
+    不写修改日志，由调用方根据 status == "modified" 的结果统一记录。
+    类型判断与 MD5 经 classifier 缓存：未变化的文件重复 dry_run 不再嗅探、也不再读取全文计算 MD5。
+    """
+    try:
+        st = f.stat()
+        if not classifier.is_editable(f, allowed, st):
+            return {"path": str(f), "status": "skipped_type"}
+
+        orig_size = st.st_size
+        if dry_run:
+            orig_md5 = classifier.cached_md5(f, st)
+            if orig_md5 is None:
+                orig_md5 = compute_md5(f)
+                classifier.remember(f, st, md5=orig_md5)
+            return {
+                "path": str(f),
+                "status": "dry_run",
+                "original_size": orig_size,
+                "original_md5": orig_md5,
+            }
+
+        # 追加需要原文件的哈希状态（而不仅是 hexdigest），这里必须完整读取一次
+        state = compute_md5_state(f)
+        orig_md5 = state.hexdigest()
+
+        # 备份——备份文件名： file.bak
+        backup, backup_error = _backup(f, backup_mode)
+
+        # 执行追加写入；新 MD5 由原哈希状态 + 追加的字节得出（单次读取）
+        new_md5, tail_md5 = append_random_bytes(f, state, append_bytes)
+        new_st = f.stat()
+        new_size = new_st.st_size
+        classifier.remember(f, new_st, editable=True, md5=new_md5)
+
+        detail = {
+            "path": str(f),
+            "status": "modified",
+            "original_size": orig_size,
+            "new_size": new_size,
+            "original_md5": orig_md5,
+            "new_md5": new_md5,
+            "tail_md5": tail_md5,
+            "backup": backup,
+        }
+        if backup_error:
+            detail["backup_error"] = backup_error
+        return detail
+    except Exception as e:
+        return {"path": str(f), "status": "error", "error": repr(e), "trace": traceback.format_exc()}
+
 
+def _record_modified(journal: ModifyJournal, detail: Dict):
+    # 记录到日志（便于回滚）
+    journal.record_modify(detail["path"], {
+        "original_size": detail["original_size"],
+        "new_size": detail["new_size"],
+        "original_md5": detail["original_md5"],
+        "new_md5": detail["new_md5"],
+        "tail_md5": detail["tail_md5"],
+        "backup": detail["backup"],
+    })
 
+
+def _append_detail(details: List[Dict], detail: Dict):
+    # 备份失败单独记一条 backup_failed（与修改结果分开，保持原有 details 格式）
+    backup_error = detail.pop("backup_error", None)
+    if backup_error:
+        details.append({"path": detail["path"], "status": "backup_failed", "error": backup_error})
+        MD5_FILES.inc(status="backup_failed")
+    details.append(detail)
+    MD5_FILES.inc(status=detail.get("status", ""))
+
+
+def _iter_files(
+    folder_paths: List[str],
+    include_subdirs: bool,
+    details: List[Dict],
+    max_depth: Optional[int] = None,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+) -> Iterator[Tuple[Path, os.DirEntry]]:
+    """
+    流式产出待处理文件 (path, DirEntry)：在后台线程中 os.scandir 遍历，经有界队列交给调用方，
+    第一个文件遍历到即可开始处理，内存占用与目录树大小无关
+    """
+    # 调用方可能传入 Path 或带结尾分隔符的路径：两边都规范化后再比较
+    roots = {str(Path(p)) for p in folder_paths}
+
+    def on_error(path: str, e: OSError):
+        # 在遍历线程中回调；list.append 是原子操作
+        if str(Path(path)) in roots and isinstance(e, FileNotFoundError):
+            details.append({"path": path, "status": "not_found", "error": "root_not_exists"})
+        else:
+            details.append({"path": path, "status": "error", "error": repr(e)})
+
+    depth = max_depth if include_subdirs else 0
+    entries = walk_files(folder_paths, max_depth=depth, include=include, exclude=exclude, on_error=on_error)
+    for entry in iter_in_background(entries):
+        yield Path(entry.path), entry
+
+
+@timed("md5_batch", branch="serial")
 def modify_md5_all(
     folder_paths: List[str],
     include_subdirs: bool = False,
@@ -75,6 +396,11 @@ def modify_md5_all(
     dry_run: bool = False,
     allowed_exts: Optional[set] = None,
     backup_before_modify: bool = True,
+    backup_mode: Optional[str] = None,
+    classify_cache_file: Optional[Path] = None,
+    max_depth: Optional[int] = None,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
 ) -> Tuple[int, List[Dict]]:
     """
     对 folder_paths 中符合类型的文件 append 随机字节以改变 MD5。
@@ -88,114 +414,219 @@ def modify_md5_all(
     - append_bytes: 追加字节数（默认 1）
     - dry_run: 若为 True，不实际写文件，仅返回将被处理的文件列表
     - allowed_exts: 可编辑扩展名集合（小写，不含点），若 None 使用默认 DEFAULT_EDITABLE_EXT
-    - backup_before_modify: 若 True，会在文件同目录生成 .bak_{timestamp} 备份文件（对大批量文件慎用）
+    - backup_before_modify: 若 True，会在文件同目录生成 .bak 备份文件（对大批量文件慎用）
+    - backup_mode: 备份方式 copy / reflink / journal（见 BACKUP_MODES），提供时优先于 backup_before_modify；
+      journal 不生成副本，回滚依赖修改日志中的大小与哈希（rollback_modifications 会先校验）
+    - classify_cache_file: 类型判断 / MD5 缓存文件（见 src/utils/file_utils.FileClassifier），默认 CLASSIFY_CACHE_FILE
+    - max_depth: include_subdirs=True 时的最大递归深度（None 不限制）
+    - include / exclude: 文件名或相对路径的 glob 列表（见 src/utils/file_utils.walk_files），exclude 匹配的目录整棵跳过
     """
     allowed = allowed_exts or DEFAULT_EDITABLE_EXT
-    details = []
+    mode = _resolve_backup_mode(backup_mode, backup_before_modify)
+    details: List[Dict] = []
     modified_count = 0
-    log = _load_log()
+    with ModifyJournal() as journal, FileClassifier(classify_cache_file or CLASSIFY_CACHE_FILE) as classifier:
+        for f, _ in _iter_files(folder_paths, include_subdirs, details, max_depth, include, exclude):
+            detail = _modify_one(f, allowed, append_bytes, dry_run, mode, classifier)
+            if detail["status"] == "modified":
+                _record_modified(journal, detail)
+                modified_count += 1
+            _append_detail(details, detail)
 
-    for root in folder_paths:
-        p_root = Path(root)
-        if not p_root.exists():
-            details.append({"path": root, "status": "not_found", "error": "root_not_exists"})
-            continue
+    return modified_count, details
 
-        if include_subdirs:
-            iterator = [f for f in p_root.rglob("*") if f.is_file()]
-        else:
-            iterator = [f for f in p_root.iterdir() if f.is_file()]
 
-        for f in iterator:
+def _checkpoint_done(status: str) -> bool:
+    """断点中视为已完成的结果：modified 与 skipped_*（error 下次重试；dry_run 不写断点）"""
+    return status == "modified" or status.startswith("skipped_")
+
+
+def _load_checkpoint(path: Path) -> Dict[str, str]:
+    done: Dict[str, str] = {}
+    if not path.exists():
+        return done
+    with path.open("r", encoding="utf-8") as fh:
+        for line in fh:
             try:
-                if not _is_editable_by_mime(f, allowed):
-                    details.append({"path": str(f), "status": "skipped_type"})
-                    continue
+                item = json.loads(line)
+                status = item.get("status", "")
+                if _checkpoint_done(status):
+                    done[item["path"]] = status
+            except Exception:
+                # 中断时最后一行可能写了一半，忽略
+                continue
+    return done
 
-                orig_size = f.stat().st_size
-                orig_md5 = compute_md5(f)
 
-                if dry_run:
-                    details.append({
-                        "path": str(f),
-                        "status": "dry_run",
-                        "original_size": orig_size,
-                        "original_md5": orig_md5,
-                    })
-                    continue
+@timed("md5_batch", branch="parallel")
+def modify_md5_parallel(
+    folder_paths: List[str],
+    include_subdirs: bool = False,
+    append_bytes: int = 1,
+    dry_run: bool = False,
+    allowed_exts: Optional[set] = None,
+    backup_before_modify: bool = True,
+    backup_mode: Optional[str] = None,
+    classify_cache_file: Optional[Path] = None,
+    max_depth: Optional[int] = None,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+    workers: int = 4,
+    max_inflight_bytes: int = DEFAULT_MAX_INFLIGHT_BYTES,
+    checkpoint_file: Optional[Path] = None,
+    progress_cb: Optional[Callable[[Dict], None]] = None,
+) -> Tuple[int, List[Dict]]:
+    """
+    modify_md5_all 的并行、可断点续跑版本（参数与返回值含义相同），额外参数：
+    - workers: 线程数（hashlib 与文件 IO 会释放 GIL，线程池即可利用多核 / 并发 IO）
+    - max_inflight_bytes: 同时处理中的文件总字节上限（单个超大文件仍可单独处理）
+    - checkpoint_file: 断点文件（JSONL，每完成一个文件追加一行，只记 modified / skipped_*）；默认 MODIFY_CHECKPOINT_FILE。
+      中断后重新运行时跳过其中已完成的文件，出错的文件会重试；全部完成后删除断点文件。
+      dry_run 不读写断点文件
+    - progress_cb: 每完成一个文件回调一次，参数 dict：done, total, bytes_done, bytes_total, path, status
+      回调在调用线程中执行，异常会被忽略。目录边遍历边处理：遍历完成前 total / bytes_total 为 None，
+      此时 discovered / bytes_discovered 为目前已发现的待处理文件数与字节数
+    """
+    allowed = allowed_exts or DEFAULT_EDITABLE_EXT
+    mode = _resolve_backup_mode(backup_mode, backup_before_modify)
+    details: List[Dict] = []
+    modified_count = 0
+    journal = ModifyJournal()
+    ckpt_path = Path(checkpoint_file) if checkpoint_file else MODIFY_CHECKPOINT_FILE
+    done_before = {} if dry_run else _load_checkpoint(ckpt_path)
 
-                # 备份（可选）——备份文件名： file.bak_{timestamp}
-                if backup_before_modify:
-                    bak_path = f.with_name(f.name + ".bak")
-                    # 如果 bak 存在则不覆盖
-                    if not bak_path.exists():
-                        try:
-                            shutil.copy2(str(f), str(bak_path))
-                        except Exception as bex:
-                            # 备份失败但我们可以选择继续或中断，记录并继续
-                            details.append({"path": str(f), "status": "backup_failed", "error": str(bex)})
-                            # 继续不强制中断
-
-                # 执行追加写入
-                with f.open("ab") as fh:
-                    fh.write(os.urandom(append_bytes))
-
-                new_size = f.stat().st_size
-                new_md5 = compute_md5(f)
-
-                # 记录到日志（便于回滚）
-                log_entry = {
-                    "original_size": orig_size,
-                    "new_size": new_size,
-                    "original_md5": orig_md5,
-                    "new_md5": new_md5,
-                }
-                log[str(f)] = log_entry
-                _save_log(log)
+    progress = {"done": 0, "total": None, "bytes_done": 0, "bytes_total": None, "discovered": 0, "bytes_discovered": 0}
+    inflight_bytes = 0
+    pending: Dict[Future, int] = {}
 
-                modified_count += 1
-                details.append({
-                    "path": str(f),
-                    "status": "modified",
-                    "original_size": orig_size,
-                    "new_size": new_size,
-                    "original_md5": orig_md5,
-                    "new_md5": new_md5,
-                })
-            except Exception as e:
-                details.append({"path": str(f), "status": "error", "error": repr(e), "trace": traceback.format_exc()})
+    classifier = FileClassifier(classify_cache_file or CLASSIFY_CACHE_FILE)
+
+    ckpt_cm = nullcontext() if dry_run else ckpt_path.open("a", encoding="utf-8")
+
+    with journal, classifier, ckpt_cm as ckpt, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+
+        def _drain(return_when: str):
+            nonlocal inflight_bytes, modified_count
+            finished, _ = wait(list(pending), return_when=return_when)
+            for fut in finished:
+                size = pending.pop(fut)
+                inflight_bytes -= size
+                detail = fut.result()
+                if detail["status"] == "modified":
+                    _record_modified(journal, detail)
+                    modified_count += 1
+                # 紧接修改日志写断点：续跑只依据断点判断文件是否已处理
+                if ckpt is not None and _checkpoint_done(detail["status"]):
+                    ckpt.write(json.dumps({"path": detail["path"], "status": detail["status"]}, ensure_ascii=False) + "\n")
+                    ckpt.flush()
+                _append_detail(details, detail)
+                progress.update(done=progress["done"] + 1, bytes_done=progress["bytes_done"] + size, path=detail["path"], status=detail["status"])
+                if progress_cb:
+                    try:
+                        progress_cb(dict(progress))
+                    except Exception:
+                        pass
+
+        for f, dir_entry in _iter_files(folder_paths, include_subdirs, details, max_depth, include, exclude):
+            key = str(f)
+            if key in done_before:
+                details.append({"path": key, "status": "skipped_done", "previous_status": done_before[key]})
+                continue
+            try:
+                size = dir_entry.stat().st_size
+            except OSError as e:
+                details.append({"path": key, "status": "error", "error": repr(e)})
+                continue
+            progress.update(discovered=progress["discovered"] + 1, bytes_discovered=progress["bytes_discovered"] + size)
+
+            # 超出在途字节预算或线程都在忙时，先等待已有任务完成
+            while pending and (inflight_bytes + size > max_inflight_bytes or len(pending) >= max(1, workers) * 2):
+                _drain(FIRST_COMPLETED)
+            pending[pool.submit(_modify_one, f, allowed, append_bytes, dry_run, mode, classifier)] = size
+            inflight_bytes += size
+        progress.update(total=progress["discovered"], bytes_total=progress["bytes_discovered"])
+        while pending:
+            _drain(ALL_COMPLETED)
 
+    # 全部完成：删除断点文件（中断时保留，供下次续跑）
+    if not dry_run:
+        try:
+            ckpt_path.unlink()
+        except OSError:
+            pass
     return modified_count, details
 
 
-def rollback_modifications(paths: Optional[List[str]] = None) -> List[Dict]:
+def _verify_modified(f: Path, meta: Dict) -> Optional[str]:
+    """
+    回滚前校验文件仍是记录中的“原文件 + 追加字节”，返回不一致的原因（一致时返回 None）
+    - 当前大小必须等于 new_size
+    - 追加部分的 MD5 必须等于 tail_md5
+    - 前 original_size 字节的 MD5 必须等于 original_md5（需读取整个原始部分）
+    旧记录缺少的字段跳过对应校验
+    """
+    orig_size = meta["original_size"]
+    size = f.stat().st_size
+    new_size = meta.get("new_size")
+    if new_size is not None and size != new_size:
+        return f"size {size} != new_size {new_size}"
+    if size < orig_size:
+        return f"size {size} < original_size {orig_size}"
+    want_prefix = meta.get("original_md5")
+    want_tail = meta.get("tail_md5")
+    with f.open("rb") as fh:
+        if want_prefix:
+            h = hashlib.md5()
+            remaining = orig_size
+            while remaining > 0:
+                chunk = fh.read(min(HASH_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                h.update(chunk)
+                remaining -= len(chunk)
+            if h.hexdigest() != want_prefix:
+                return "original_md5 mismatch"
+        if want_tail:
+            fh.seek(orig_size)
+            if hashlib.md5(fh.read()).hexdigest() != want_tail:
+                return "tail_md5 mismatch"
+    return None
+
+
+def rollback_modifications(paths: Optional[List[str]] = None, verify: bool = True) -> List[Dict]:
     """
     回滚之前记录在 log 中的修改。若 paths 提供，则只回滚这些路径；否则回滚 log 中所有条目。
     回滚策略：truncate 到 original_size（仅在记录中存在 original_size 时有效）。
+    verify=True 时先按记录校验文件（见 _verify_modified），不一致则不截断，状态为 verify_failed；
+    journal 备份方式（无 .bak 副本）依赖该校验保证还原结果与原文件一致。
     返回回滚详情列表。
     """
-    log = _load_log()
     results = []
+    with ModifyJournal() as journal:
+        wanted = set(paths) if paths is not None else None
+        items = [(p, v) for p, v in journal.entries().items() if (wanted is None or p in wanted)]
 
-    items = [(p, v) for p, v in log.items() if (paths is None or p in paths)]
-
-    for p, meta in items:
-        try:
-            f = Path(p)
-            if not f.exists():
-                results.append({"path": p, "status": "missing"})
-                continue
-            orig_size = meta.get("original_size")
-            if orig_size is None:
-                results.append({"path": p, "status": "no_original_size"})
-                continue
-            # 截断文件为原始大小
-            with f.open("r+b") as fh:
-                fh.truncate(orig_size)
-            # 更新日志：删除或标记已回滚
-            log.pop(p, None)
-            _save_log(log)
-            results.append({"path": p, "status": "rolled_back", "original_size": orig_size})
-        except Exception as e:
-            results.append({"path": p, "status": "error", "error": repr(e)})
+        for p, meta in items:
+            try:
+                f = Path(p)
+                if not f.exists():
+                    results.append({"path": p, "status": "missing"})
+                    continue
+                orig_size = meta.get("original_size")
+                if orig_size is None:
+                    results.append({"path": p, "status": "no_original_size"})
+                    continue
+                if verify:
+                    reason = _verify_modified(f, meta)
+                    if reason:
+                        results.append({"path": p, "status": "verify_failed", "error": reason})
+                        continue
+                # 截断文件为原始大小
+                with f.open("r+b") as fh:
+                    fh.truncate(orig_size)
+                # 更新日志：追加 rollback 记录
+                journal.record_rollback(p)
+                results.append({"path": p, "status": "rolled_back", "original_size": orig_size})
+            except Exception as e:
+                results.append({"path": p, "status": "error", "error": repr(e)})
     return results
\ No newline at end of file
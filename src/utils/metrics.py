@@ -0,0 +1,256 @@
+"""
+进程内指标（Prometheus 文本格式 0.0.4），由 src/api/main.py 的 /metrics 端点输出
+- Counter / Gauge / Histogram：按标签分组，线程安全（md5 批量修改在线程池中更新指标）
+- track(stage, branch)：记录一个处理阶段的耗时直方图、调用次数（按结果 ok / miss / error / cancelled）与进行中的数量；
+  timed(stage) 为对应的函数装饰器（同步 / 协程函数均可）
+- register_collector(fn) / unregister_collector(fn)：抓取时调用 fn() 生成额外的指标（例如调度器队列深度等已有的 stats()）
+
+使用：
+  with track("tme_scrape") as t:
+      ...
+      t.outcome = "miss"     # 可选，默认正常结束为 ok、异常为 error
+"""
+
+import asyncio
+import bisect
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# 秒；覆盖从毫秒级的页面解析到分钟级的 md5 批量修改
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# (标签, 值) 列表；标签为 {name: value}
+Samples = List[Tuple[Dict[str, Any], float]]
+# 自定义收集器返回 (指标名, 类型, 说明, 样本)
+CollectedMetric = Tuple[str, str, str, Samples]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _sample_lines(name: str, kind: str, help_text: str, samples: Samples) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+    return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+        self._collectors: List[Callable[[], Iterable[CollectedMetric]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric"):
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError(f"指标已注册: {metric.name}")
+            self._metrics.append(metric)
+
+    def register_collector(self, collector: Callable[[], Iterable[CollectedMetric]]):
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def unregister_collector(self, collector: Callable[[], Iterable[CollectedMetric]]):
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            try:
+                for name, kind, help_text, samples in collector():
+                    lines.extend(_sample_lines(name, kind, help_text, samples))
+            except Exception as e:
+                lines.append(f"# collector {getattr(collector, '__name__', collector)!s} failed: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), registry: Optional[Registry] = None):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> Samples:
+        with self._lock:
+            return [(self._labels(k), v) for k, v in sorted(self._values.items())]
+
+    def render(self) -> List[str]:
+        return _sample_lines(self.name, self.kind, self.help, self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional[Registry] = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames, registry)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各桶计数（非累计）..., 超出最大桶的计数, 总和]
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            # 第一个 >= value 的桶；超出最大桶时落在 len(buckets)
+            state[bisect.bisect_left(self.buckets, value)] += 1
+            state[-1] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return sum(state[:-1]) if state else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in sorted(self._values.items())]
+        for key, state in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, n in zip(self.buckets, state):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            cumulative += state[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+# 处理阶段（t.me 抓取 / user API / 相册收集 / 转发 / 复制 / md5 批量修改 等）
+STAGE_SECONDS = Histogram("xbparsing_stage_duration_seconds", "处理阶段耗时（秒）", ("stage", "branch"))
+STAGE_CALLS = Counter("xbparsing_stage_calls_total", "处理阶段调用次数（按结果）", ("stage", "branch", "outcome"))
+STAGE_IN_FLIGHT = Gauge("xbparsing_stage_in_flight", "正在执行的处理阶段数", ("stage", "branch"))
+
+
+class _Tracker:
+    __slots__ = ("outcome",)
+
+    def __init__(self):
+        self.outcome: Optional[str] = None
+
+
+@contextmanager
+def track(stage: str, branch: str = "") -> Iterator[_Tracker]:
+    """记录一次阶段执行：进行中 +1、结束时记录耗时与结果（可在 with 块内设置 tracker.outcome）"""
+    tracker = _Tracker()
+    STAGE_IN_FLIGHT.inc(stage=stage, branch=branch)
+    t0 = time.perf_counter()
+    outcome = "error"
+    try:
+        yield tracker
+        outcome = tracker.outcome or "ok"
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        STAGE_IN_FLIGHT.dec(stage=stage, branch=branch)
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage=stage, branch=branch)
+        STAGE_CALLS.inc(stage=stage, branch=branch, outcome=outcome)
+
+
+def timed(stage: str, branch: str = ""):
+    """函数装饰器：整个函数调用作为一次 track(stage, branch)"""
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with track(stage, branch):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(stage, branch):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def register_collector(collector: Callable[[], Iterable[CollectedMetric]]):
+    REGISTRY.register_collector(collector)
+
+
+def unregister_collector(collector: Callable[[], Iterable[CollectedMetric]]):
+    REGISTRY.unregister_collector(collector)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
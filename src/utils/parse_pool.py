@@ -0,0 +1,127 @@
+"""
+HTML 解析执行器：把 CPU 密集的页面解析移出事件循环线程
+- 进程池（ProcessPoolExecutor，spawn 方式启动），子进程启动时预先导入 lxml / readability / 解析模块，
+  warm_up() 可在启动阶段提前拉起全部子进程
+- 按页面大小路由：不超过 inline_max_chars 个字符的小页面（例如 t.me 帖子页）直接在当前线程解析，
+  进程间传输的开销比解析本身还大；更大的页面交给进程池，多个页面可同时在多个核上解析
+- processes=0 时不使用进程池，大页面改在线程中解析（asyncio.to_thread）
+- 取消安全：调用方被取消时，尚未开始的解析任务从进程池队列中撤下；已开始的任务在子进程中跑完后结果被丢弃
+- 子进程异常退出（BrokenProcessPool）时丢弃该进程池（下次使用时重建），本次改在线程中解析
+
+使用：
+  result = await parse_pool.run(parse_webpage_html, html)   # func 必须是可 pickle 的模块级函数
+  进程退出前调用 parse_pool.shutdown()
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_PROCESSES = min(4, os.cpu_count() or 1)
+# 不超过该字符数的页面在当前线程直接解析
+DEFAULT_INLINE_MAX_CHARS = 64 * 1024
+
+
+def _warm_worker():
+    """子进程 initializer：预先导入解析依赖，第一个任务不必等待导入"""
+    import lxml.html  # noqa: F401
+    import readability  # noqa: F401
+
+    import src.parser.tme_extractor  # noqa: F401
+    import src.utils.html_parser  # noqa: F401
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+class ParsePool:
+    def __init__(self, processes: int = DEFAULT_PROCESSES, inline_max_chars: int = DEFAULT_INLINE_MAX_CHARS):
+        self.processes = max(0, processes)
+        self.inline_max_chars = inline_max_chars
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.inline_runs = 0
+        self.pool_runs = 0
+        self.thread_runs = 0
+        self.broken = 0
+
+    def configure(self, processes: Optional[int] = None, inline_max_chars: Optional[int] = None):
+        """修改配置；进程数变化时关闭已有进程池，下次使用时按新配置创建"""
+        if processes is not None and max(0, processes) != self.processes:
+            self.shutdown()
+            self.processes = max(0, processes)
+        if inline_max_chars is not None:
+            self.inline_max_chars = inline_max_chars
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+            )
+            logger.debug("创建 HTML 解析进程池 (processes=%d)", self.processes)
+        return self._pool
+
+    async def warm_up(self):
+        """提前拉起全部子进程（每个子进程执行一次 initializer）"""
+        if self.processes <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        pids = await asyncio.gather(*(loop.run_in_executor(pool, _ping) for _ in range(self.processes)))
+        logger.info("HTML 解析进程池已就绪：%d 个子进程", len(set(pids)))
+
+    async def run(self, func: Callable[[str], T], text: str, inline_max_chars: Optional[int] = None) -> T:
+        """
+        解析 text：小页面直接调用 func(text)，大页面在进程池（或线程）中执行
+        inline_max_chars: 覆盖默认的内联阈值（解析很快的调用方可以设得更大）
+        """
+        limit = self.inline_max_chars if inline_max_chars is None else inline_max_chars
+        if len(text) <= limit:
+            self.inline_runs += 1
+            return func(text)
+        if self.processes <= 0:
+            self.thread_runs += 1
+            return await asyncio.to_thread(func, text)
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._get_pool(), func, text)
+        except BrokenProcessPool:
+            self.broken += 1
+            logger.warning("HTML 解析进程池异常退出，已丢弃（下次使用时重建），本次改在线程中解析")
+            self._discard_pool()
+            self.thread_runs += 1
+            return await asyncio.to_thread(func, text)
+        self.pool_runs += 1
+        return result
+
+    def _discard_pool(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        """关闭进程池（不等待正在执行的任务）；之后再调用 run 会重新创建"""
+        self._discard_pool()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "processes": self.processes,
+            "inline_runs": self.inline_runs,
+            "pool_runs": self.pool_runs,
+            "thread_runs": self.thread_runs,
+            "broken": self.broken,
+        }
+
+
+# 进程内共享的解析执行器（t.me 抓取与网页解析共用）
+parse_pool = ParsePool()
@@ -0,0 +1,243 @@
+"""
+Telegram peer 解析缓存（用户名 / chat id -> peer id + access_hash + 类型）
+- 按账号区分（access_hash 因账号而异），持久化在 resolved_peers 表（src/models/channel.py），重启后无需重新解析
+- 命中时把 peer 写入该 client 的 Pyrogram storage 并返回数字 chat id：之后的 get_messages / forward_messages
+  直接从 storage 取 InputPeer，不再发起 ResolveUsername / GetChannels / get_chat
+- 未命中时通过 client.resolve_peer 解析一次（经全局调度器限流）并记入缓存；同一 peer 的并发解析只发一次请求
+- 用户名条目超过 username_ttl 后重新解析（用户名可能易主）；按 id 的条目不过期
+- 调用出现 STALE_PEER_ERRORS（PeerIdInvalid / ChannelPrivate 等）时由调用方 invalidate（下次重新解析），
+  并改抛 PeerAccessError
+- warm(client, chats) 在启动阶段预先解析 staging / MD5 / 发布频道
+
+使用：
+  chat = await peer_cache.resolve(user_client, "@channel")   # -> -100xxxxxxxxxx
+  msg = await telegram_scheduler.call(user_client.get_messages, chat, msg_id)
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Set, Tuple, Union
+
+from pyrogram import raw
+from pyrogram.errors import ChannelInvalid, ChannelPrivate, PeerIdInvalid, UsernameInvalid, UsernameNotOccupied
+
+from src.models.channel import delete_resolved_peer, load_resolved_peers, save_resolved_peer
+from src.utils.rate_limiter import telegram_scheduler
+
+logger = logging.getLogger(__name__)
+
+# 用户名 -> peer 的有效期（秒）；Pyrogram 自身的 storage 只保留 8 小时
+DEFAULT_USERNAME_TTL = 24 * 3600.0
+# 与 pyrogram.utils.MAX_CHANNEL_ID 相同：频道 chat id = MAX_CHANNEL_ID - channel_id（即 -100 前缀）
+_MAX_CHANNEL_ID = -1000000000000
+
+# 说明缓存的 peer 已失效（或账号已无权访问）的错误
+STALE_PEER_ERRORS = (PeerIdInvalid, ChannelPrivate, ChannelInvalid, UsernameNotOccupied, UsernameInvalid)
+
+
+class PeerAccessError(RuntimeError):
+    """当前账号无法访问目标 chat（由 STALE_PEER_ERRORS 转换而来）；账号池据此换用其它账号"""
+
+
+@dataclass
+class ResolvedPeer:
+    peer_id: int
+    access_hash: int
+    peer_type: str
+    username: Optional[str]
+    updated_at: float
+
+
+class _AccountPeers:
+    __slots__ = ("by_id", "by_username")
+
+    def __init__(self):
+        self.by_id: Dict[int, ResolvedPeer] = {}
+        self.by_username: Dict[str, int] = {}
+
+    def add(self, peer: ResolvedPeer):
+        old = self.by_id.get(peer.peer_id)
+        if old is not None and old.username and self.by_username.get(old.username) == peer.peer_id:
+            del self.by_username[old.username]
+        self.by_id[peer.peer_id] = peer
+        if peer.username:
+            self.by_username[peer.username] = peer.peer_id
+
+    def remove(self, peer_id: int) -> Optional[ResolvedPeer]:
+        peer = self.by_id.pop(peer_id, None)
+        if peer is not None and peer.username and self.by_username.get(peer.username) == peer_id:
+            del self.by_username[peer.username]
+        return peer
+
+
+def account_key(client: Any) -> str:
+    """缓存按账号区分：'user:<user id>' / 'bot:<bot id>'（未启动的 client 退回 session 名称）"""
+    kind = "bot" if getattr(client, "bot_token", None) else "user"
+    ident = getattr(getattr(client, "me", None), "id", None) or getattr(client, "name", None) or kind
+    return f"{kind}:{ident}"
+
+
+def _normalize(chat: Any) -> Optional[Union[int, str]]:
+    """int / 数字字符串 -> int；'@Name' / 'Name' -> 'name'；'me' 等其它标识返回 None（不缓存）"""
+    if isinstance(chat, int):
+        return chat
+    if not isinstance(chat, str):
+        return None
+    value = chat.strip().lstrip("@").lower()
+    if not value or value in ("me", "self") or value.startswith("+"):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def _from_input_peer(input_peer: Any) -> Optional[Tuple[int, int, str]]:
+    """InputPeer -> (peer_id, access_hash, Pyrogram storage 类型)；InputPeerSelf 等返回 None"""
+    if isinstance(input_peer, (raw.types.InputPeerChannel, raw.types.InputChannel)):
+        return _MAX_CHANNEL_ID - input_peer.channel_id, input_peer.access_hash, "channel"
+    if isinstance(input_peer, raw.types.InputPeerChat):
+        return -input_peer.chat_id, 0, "group"
+    if isinstance(input_peer, (raw.types.InputPeerUser, raw.types.InputUser)):
+        return input_peer.user_id, input_peer.access_hash, "user"
+    return None
+
+
+class PeerCache:
+    def __init__(self, username_ttl: float = DEFAULT_USERNAME_TTL, persist: bool = True):
+        self.username_ttl = username_ttl
+        self.persist = persist
+        self._accounts: Dict[str, _AccountPeers] = {}
+        # 已写入 Pyrogram storage 的 (id(client), peer_id)
+        self._injected: Set[Tuple[int, int]] = set()
+        self._inflight: Dict[Tuple[str, Union[int, str]], asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def configure(self, username_ttl: Optional[float] = None, persist: Optional[bool] = None):
+        if username_ttl is not None:
+            self.username_ttl = username_ttl
+        if persist is not None:
+            self.persist = persist
+
+    async def _peers(self, account: str) -> _AccountPeers:
+        peers = self._accounts.get(account)
+        if peers is not None:
+            return peers
+        loaded = _AccountPeers()
+        if self.persist:
+            try:
+                for peer_id, access_hash, peer_type, username, updated_at in await asyncio.to_thread(load_resolved_peers, account):
+                    loaded.add(ResolvedPeer(peer_id, access_hash, peer_type, username, updated_at))
+            except Exception:
+                logger.warning("读取 resolved_peers 失败，peer 缓存从空开始", exc_info=True)
+        return self._accounts.setdefault(account, loaded)
+
+    def _lookup(self, peers: _AccountPeers, key: Union[int, str]) -> Optional[ResolvedPeer]:
+        if isinstance(key, int):
+            return peers.by_id.get(key)
+        peer_id = peers.by_username.get(key)
+        peer = peers.by_id.get(peer_id) if peer_id is not None else None
+        if peer is not None and time.time() - peer.updated_at > self.username_ttl:
+            return None
+        return peer
+
+    async def _inject(self, client: Any, peer: ResolvedPeer):
+        """把 peer 写入 client 的 Pyrogram storage（每个 client 每个 peer 只写一次）"""
+        marker = (id(client), peer.peer_id)
+        if marker in self._injected:
+            return
+        await client.storage.update_peers([(peer.peer_id, peer.access_hash, peer.peer_type, peer.username, None)])
+        self._injected.add(marker)
+
+    async def resolve(self, client: Any, chat: Any) -> Any:
+        """
+        返回可直接传给 Pyrogram 方法的数字 chat id；无法缓存的标识（'me' 等）原样返回
+        解析失败时抛出 Pyrogram 的异常（PeerIdInvalid / UsernameNotOccupied 等）
+        """
+        key = _normalize(chat)
+        if key is None:
+            return chat
+        account = account_key(client)
+        peer = self._lookup(await self._peers(account), key)
+        if peer is not None:
+            self.hits += 1
+            await self._inject(client, peer)
+            return peer.peer_id
+
+        self.misses += 1
+        flight_key = (account, key)
+        future = self._inflight.get(flight_key)
+        if future is None:
+            future = asyncio.ensure_future(self._resolve_remote(client, account, chat, key))
+            self._inflight[flight_key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(flight_key, None))
+        # shield：某个调用方被取消时不影响同时等待同一 peer 的其它调用方
+        peer = await asyncio.shield(future)
+        return peer.peer_id if peer is not None else chat
+
+    async def _resolve_remote(self, client: Any, account: str, chat: Any, key: Union[int, str]) -> Optional[ResolvedPeer]:
+        input_peer = await telegram_scheduler.call(client.resolve_peer, f"@{key}" if isinstance(key, str) else key)
+        fields = _from_input_peer(input_peer)
+        if fields is None:
+            return None
+        peer_id, access_hash, peer_type = fields
+        peers = await self._peers(account)
+        old = peers.by_id.get(peer_id)
+        username = key if isinstance(key, str) else (old.username if old is not None else None)
+        peer = ResolvedPeer(peer_id, access_hash, peer_type, username, time.time())
+        peers.add(peer)
+        # resolve_peer 已把 peer 写入该 client 的 storage
+        self._injected.add((id(client), peer_id))
+        logger.debug("解析 peer %s -> %s (%s)", chat, peer_id, account)
+        if self.persist:
+            try:
+                await asyncio.to_thread(save_resolved_peer, account, peer_id, access_hash, peer_type, username)
+            except Exception:
+                logger.warning("写入 resolved_peers 失败: %s", chat, exc_info=True)
+        return peer
+
+    async def invalidate(self, client: Any, chat: Any):
+        """移除 chat 对应的缓存条目（内存与数据库），下次 resolve 重新解析"""
+        key = _normalize(chat)
+        if key is None:
+            return
+        account = account_key(client)
+        peers = await self._peers(account)
+        peer_id = key if isinstance(key, int) else peers.by_username.get(key)
+        if peer_id is None or peers.remove(peer_id) is None:
+            return
+        self.invalidations += 1
+        self._injected.discard((id(client), peer_id))
+        logger.info("peer 缓存条目已失效: %s (%s)", chat, account)
+        if self.persist:
+            try:
+                await asyncio.to_thread(delete_resolved_peer, account, peer_id)
+            except Exception:
+                logger.warning("删除 resolved_peers 条目失败: %s", chat, exc_info=True)
+
+    async def warm(self, client: Any, chats: Iterable[Any]) -> int:
+        """预先解析 chats（已缓存的只写入 storage），返回成功个数；单个失败只记日志"""
+        ok = 0
+        for chat in chats:
+            try:
+                await self.resolve(client, chat)
+                ok += 1
+            except Exception as e:
+                logger.warning("预解析 peer %s 失败: %s", chat, e)
+        return ok
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "size": sum(len(p.by_id) for p in self._accounts.values()),
+        }
+
+
+# 进程内共享的 peer 缓存
+peer_cache = PeerCache()
@@ -0,0 +1,219 @@
+"""
+Telegram API 全局限流（令牌桶）与 FloodWait 调度
+- 每次调用同时占用三个桶：客户端（按 session 区分 user / bot）、目标 chat、(客户端, 方法)
+  桶内令牌不足时在本地排队等待，而不是把请求打到 Telegram 触发 FloodWait
+- 调用仍触发 FloodWait 时不直接抛出：把对应 (客户端, 方法) 桶封锁到等待结束，再重新排队调用；
+  单次等待超过 MAX_FLOOD_WAIT 或重试次数用尽才抛出
+- flood_wait_cap(seconds)：在 with 块内把可吸收的 FloodWait 缩短到 seconds，更长的（包括该方法仍处于封锁中）
+  立即抛出 FloodWait，由调用方换账号（账号池）或延后重试（后台任务）
+- stats() 返回排队深度、FloodWait 次数等，供日志 / 监控使用
+- add_flood_listener(fn)：每次 FloodWait 时回调 fn(client_key, method, seconds)（例如账号池暂时停用该账号）
+
+用法：
+  from src.utils.rate_limiter import telegram_scheduler
+  msg = await telegram_scheduler.call(user_client.get_messages, chat_id, msg_id)
+"""
+
+import asyncio
+import logging
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from pyrogram.errors import FloodWait
+
+from src.utils.lru_cache import LRUTTLCache
+
+logger = logging.getLogger(__name__)
+
+# (每秒补充令牌数, 桶容量)
+DEFAULT_CLIENT_RATES: Dict[str, Tuple[float, float]] = {
+    "user": (3.0, 6.0),
+    "bot": (25.0, 30.0),
+}
+DEFAULT_CHAT_RATE: Tuple[float, float] = (1.0, 5.0)
+DEFAULT_METHOD_RATES: Dict[str, Tuple[float, float]] = {
+    "forward_messages": (0.5, 3.0),
+    "get_chat": (1.0, 3.0),
+    # 未命中 peer 缓存时的 ResolveUsername / GetChannels（Telegram 对用户名解析限制很严）
+    "resolve_peer": (0.2, 3.0),
+    "get_messages": (2.0, 5.0),
+    "copy_media_group": (1.0, 3.0),
+}
+
+MAX_FLOOD_WAIT = 300
+MAX_FLOOD_RETRIES = 5
+
+# 当前上下文可在调度器内吸收的最长 FloodWait（秒）；None 表示 MAX_FLOOD_WAIT
+_flood_wait_cap: ContextVar[Optional[float]] = ContextVar("flood_wait_cap", default=None)
+
+
+@contextmanager
+def flood_wait_cap(seconds: float) -> Iterator[None]:
+    """with 块内（包括其中创建的任务）超过 seconds 的 FloodWait 直接抛出；嵌套时取较小值"""
+    current = _flood_wait_cap.get()
+    token = _flood_wait_cap.set(seconds if current is None else min(current, seconds))
+    try:
+        yield
+    finally:
+        _flood_wait_cap.reset(token)
+
+
+class TokenBucket:
+    """允许“透支”的令牌桶：reserve 立即扣减令牌并返回需要等待的秒数，保证先到先得"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def reserve(self, now: float) -> float:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def block(self, until: float):
+        self.blocked_until = max(self.blocked_until, until)
+
+
+def _client_identity(func: Callable) -> Tuple[str, str]:
+    """从绑定方法推断 (客户端 key, 客户端类型)"""
+    client = getattr(func, "__self__", None)
+    kind = "bot" if getattr(client, "bot_token", None) else "user"
+    name = getattr(client, "name", None) or kind
+    return f"{kind}:{name}", kind
+
+
+class TelegramScheduler:
+    def __init__(
+        self,
+        client_rates: Optional[Dict[str, Tuple[float, float]]] = None,
+        chat_rate: Tuple[float, float] = DEFAULT_CHAT_RATE,
+        method_rates: Optional[Dict[str, Tuple[float, float]]] = None,
+    ):
+        self.client_rates = client_rates or dict(DEFAULT_CLIENT_RATES)
+        self.chat_rate = chat_rate
+        self.method_rates = method_rates or dict(DEFAULT_METHOD_RATES)
+        self._client_buckets: Dict[str, TokenBucket] = {}
+        self._method_buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        # 目标 chat 数量不固定，空闲一小时的桶自动淘汰
+        self._chat_buckets = LRUTTLCache(maxsize=20000, ttl=3600.0)
+        self._waiting: Dict[str, int] = {}
+        self._flood_listeners: List[Callable[[str, str, int], Any]] = []
+        self.calls = 0
+        self.flood_waits = 0
+        self.max_waiting = 0
+
+    def _buckets(self, client_key: str, kind: str, method: str, chat_id: Any):
+        buckets = []
+        cb = self._client_buckets.get(client_key)
+        if cb is None:
+            cb = self._client_buckets[client_key] = TokenBucket(*self.client_rates.get(kind, DEFAULT_CLIENT_RATES["user"]))
+        buckets.append(cb)
+        mkey = (client_key, method)
+        mb = self._method_buckets.get(mkey)
+        if mb is None and method in self.method_rates:
+            mb = self._method_buckets[mkey] = TokenBucket(*self.method_rates[method])
+        if chat_id is not None:
+            ckey = (client_key, chat_id)
+            chb = self._chat_buckets.get(ckey)
+            if chb is None:
+                chb = TokenBucket(*self.chat_rate)
+            self._chat_buckets.set(ckey, chb)
+            buckets.append(chb)
+        return buckets, mb
+
+    def add_flood_listener(self, listener: Callable[[str, str, int], Any]):
+        if listener not in self._flood_listeners:
+            self._flood_listeners.append(listener)
+
+    def remove_flood_listener(self, listener: Callable[[str, str, int], Any]):
+        if listener in self._flood_listeners:
+            self._flood_listeners.remove(listener)
+
+    def _notify_flood(self, client_key: str, method: str, wait: int):
+        for listener in list(self._flood_listeners):
+            try:
+                listener(client_key, method, wait)
+            except Exception:
+                logger.debug("FloodWait 回调出错", exc_info=True)
+
+    def _method_bucket_for_flood(self, client_key: str, method: str) -> TokenBucket:
+        mkey = (client_key, method)
+        mb = self._method_buckets.get(mkey)
+        if mb is None:
+            rate = self.method_rates.get(method) or self.client_rates.get(client_key.split(":", 1)[0], DEFAULT_CLIENT_RATES["user"])
+            mb = self._method_buckets[mkey] = TokenBucket(*rate)
+        return mb
+
+    async def _acquire(self, client_key: str, kind: str, method: str, chat_id: Any):
+        buckets, mb = self._buckets(client_key, kind, method, chat_id)
+        now = time.monotonic()
+        if mb is not None:
+            cap = _flood_wait_cap.get()
+            if cap is not None and mb.blocked_until - now > cap:
+                # 该方法仍在 FloodWait 中且超过调用方愿意等待的时长：不排队，直接交还调用方
+                raise FloodWait(value=math.ceil(mb.blocked_until - now))
+            buckets.append(mb)
+        wait = max(b.reserve(now) for b in buckets)
+        if wait <= 0:
+            return
+        self._waiting[client_key] = self._waiting.get(client_key, 0) + 1
+        self.max_waiting = max(self.max_waiting, sum(self._waiting.values()))
+        try:
+            await asyncio.sleep(wait)
+        finally:
+            self._waiting[client_key] -= 1
+
+    async def call(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        限流执行 func(*args, **kwargs)；目标 chat 取 kwargs["chat_id"]，否则取第一个位置参数
+        """
+        client_key, kind = _client_identity(func)
+        method = getattr(func, "__name__", "call")
+        chat_id = kwargs.get("chat_id", args[0] if args else None)
+        if not isinstance(chat_id, (int, str)):
+            chat_id = None
+        attempt = 0
+        while True:
+            await self._acquire(client_key, kind, method, chat_id)
+            self.calls += 1
+            try:
+                return await func(*args, **kwargs)
+            except FloodWait as e:
+                wait = int(getattr(e, "value", 0) or 0)
+                self.flood_waits += 1
+                self._notify_flood(client_key, method, wait)
+                self._method_bucket_for_flood(client_key, method).block(time.monotonic() + wait + 1)
+                cap = _flood_wait_cap.get()
+                if wait > (MAX_FLOOD_WAIT if cap is None else min(cap, MAX_FLOOD_WAIT)) or attempt >= MAX_FLOOD_RETRIES:
+                    raise
+                attempt += 1
+                logger.warning("%s.%s 触发 FloodWait %ss，已封锁该方法并重新排队（第 %d 次）", client_key, method, wait, attempt)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "queue_depth": sum(self._waiting.values()),
+            "queue_depth_by_client": {k: v for k, v in self._waiting.items() if v},
+            "max_queue_depth": self.max_waiting,
+            "calls": self.calls,
+            "flood_waits": self.flood_waits,
+            "blocked_methods": {
+                f"{k[0]}.{k[1]}": round(b.blocked_until - now, 1)
+                for k, b in self._method_buckets.items()
+                if b.blocked_until > now
+            },
+        }
+
+
+# 进程内共享的调度器（user / bot 客户端共用，按 session 名区分预算）
+telegram_scheduler = TelegramScheduler()
@@ -0,0 +1,237 @@
+"""
+后台任务定义（由 src/workers/worker.py 中的 Worker 执行）
+
+一条链接的处理拆成三个任务，逐级入队：
+  parse   —— 解析链接；telegram_api 结果收集相册后入队 forward，其余结果直接回复文本
+  forward —— user 账号把源消息转发到 staging（命中去重索引则跳过转发），然后入队 copy
+  copy    —— bot 把 staging 中的消息复制给用户；复用的索引条目失效时重新入队 forward
+优先级数值越小越先执行：越靠近交付的任务优先级越高，保证已开始的请求先完成。
+
+任务 payload 只包含可 JSON 序列化的数据（chat_id / message id 等），以便 sqlite / redis 后端跨进程传递。
+失败的任务整体重试：不能重复的副作用（把相册复制给用户）完成后记入 payload，重试时跳过。
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from src.bot.services.parser_service import (
+    STAGING_FORWARD_FAILED_TEXT,
+    collect_album_by_id,
+    collect_album_messages,
+    copy_forwarded_to_user,
+    format_parsed_text,
+    forward_group_to_staging_dedup,
+)
+from src.bot.services.tg_api import call_with_flood_wait
+from src.bot.services.user_pool import UserClientPool
+from src.models.content import delete_staging_forward
+from src.parser.link_cache import ChannelRouteCache, LinkCache, normalize_link_key
+from src.parser.url_parser_userbot import DEFAULT_HEDGE_DELAY, MessageNotFoundError, link_chat_hint, parse_telegram_link
+from src.utils.rate_limiter import flood_wait_cap
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_COPY = 0
+PRIORITY_FORWARD = 5
+PRIORITY_PARSE = 10
+
+DEFAULT_MAX_ATTEMPTS = 3
+# 转发到 staging 的超时秒数（覆盖账号池的全部重试）
+FORWARD_TIMEOUT = 60.0
+# 任务中的 user API 调用最多在调度器内等待的 FloodWait 秒数；更长的抛给 Worker，按等待秒数延后重试并释放并发名额
+JOB_MAX_FLOOD_WAIT = 30.0
+
+
+class PermanentJobError(Exception):
+    """不应重试的失败（例如消息不存在），直接通知用户"""
+
+
+@dataclass
+class Job:
+    kind: str
+    payload: Dict[str, Any]
+    priority: int = PRIORITY_PARSE
+    # 目标用户 chat_id，用于 per-chat 并发上限与失败通知
+    chat_id: Optional[int] = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    attempts: int = 0
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    not_before: float = 0.0
+    created_at: float = field(default_factory=time.time)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Job":
+        return cls(**data)
+
+
+@dataclass
+class WorkerContext:
+    """任务执行所需的客户端与配置"""
+    user_client: Any
+    bot_client: Any
+    queue: Any
+    staging_chat_id: Optional[int]
+    link_cache: Optional[LinkCache] = None
+    parse_timeout: float = 15.0
+    forward_timeout: float = FORWARD_TIMEOUT
+    channel_routes: Optional[ChannelRouteCache] = None
+    hedge_delay: float = DEFAULT_HEDGE_DELAY
+    # 多个 user 账号时的账号池；为 None 时所有调用使用 user_client
+    user_pool: Optional[UserClientPool] = None
+
+
+T = TypeVar("T")
+
+
+async def _with_user_client(ctx: WorkerContext, func: Callable[[Any], Awaitable[T]], chat: Any = None, need_staging: bool = False) -> T:
+    """用 user 账号执行 func(client)：有账号池时按 chat 路由（见 UserClientPool.run），否则用 ctx.user_client"""
+    with flood_wait_cap(JOB_MAX_FLOOD_WAIT):
+        if ctx.user_pool is None:
+            return await func(ctx.user_client)
+        return await ctx.user_pool.run(func, chat=chat, need_staging=need_staging)
+
+
+TaskHandler = Callable[[WorkerContext, Job], Awaitable[None]]
+TASKS: Dict[str, TaskHandler] = {}
+
+
+def task(kind: str):
+    def decorator(func: TaskHandler) -> TaskHandler:
+        TASKS[kind] = func
+        return func
+    return decorator
+
+
+def new_parse_job(url: str, chat_id: int, reply_to: Optional[int] = None, show_url: bool = False) -> Job:
+    return Job(
+        kind="parse",
+        payload={"url": url, "chat_id": chat_id, "reply_to": reply_to, "show_url": show_url},
+        priority=PRIORITY_PARSE,
+        chat_id=chat_id,
+    )
+
+
+async def _reply(ctx: WorkerContext, job: Job, text: str):
+    p = job.payload
+    if p.get("show_url") and p.get("url") and not text.startswith("链接: "):
+        text = f"链接: {p['url']}\n{text}"
+    await call_with_flood_wait(ctx.bot_client.send_message, p["chat_id"], text, reply_to_message_id=p.get("reply_to"))
+
+
+def _child(job: Job, kind: str, priority: int, **payload) -> Job:
+    data = dict(job.payload)
+    data.update(payload)
+    # id 由父任务派生：父任务被重新投递（租约过期等）再次入队时，sqlite / redis 后端覆盖同一条任务而不是新增一条
+    return Job(kind=kind, payload=data, priority=priority, chat_id=job.chat_id, id=f"{job.id}.{kind}")
+
+
+@task("parse")
+async def parse_link(ctx: WorkerContext, job: Job):
+    url = job.payload["url"]
+
+    async def parse_with(client: Any):
+        parsed = await parse_telegram_link(url, client, cache=ctx.link_cache, routes=ctx.channel_routes, hedge_delay=ctx.hedge_delay)
+        if parsed.get("kind") != "telegram_api":
+            return parsed, None
+        msg_obj = parsed.get("message_obj")
+        if msg_obj is not None:
+            # 相册需用取到该消息的同一账号收集
+            group_msgs = await collect_album_messages(client, msg_obj)
+        elif parsed.get("media_group_id"):
+            # 链接缓存命中（没有 Message 对象）：只有相册需要再取消息，命中相册缓存时也不需要
+            group_msgs = await collect_album_by_id(client, parsed["source_chat_id"], parsed["source_message_id"], parsed["media_group_id"])
+            if not group_msgs:
+                if ctx.link_cache is not None:
+                    await ctx.link_cache.delete(normalize_link_key(url))
+                raise MessageNotFoundError("消息不存在或已被删除")
+        else:
+            return parsed, [parsed["source_message_id"]]
+        if ctx.user_pool is not None:
+            ctx.user_pool.record_access(client, parsed.get("source_chat_id"), True)
+        return parsed, group_msgs
+
+    # 非 t.me 链接（chat 为 None）不调用 user API，不占用账号池
+    chat = link_chat_hint(url)
+    # 超时覆盖账号池的全部重试，而不是每个账号各自计时
+    parsing = parse_with(ctx.user_client) if chat is None else _with_user_client(ctx, parse_with, chat=chat)
+    try:
+        parsed, group_msgs = await asyncio.wait_for(parsing, timeout=ctx.parse_timeout)
+    except asyncio.TimeoutError:
+        # 不重试：否则用户最多要等 parse_timeout × max_attempts（再加退避）
+        raise PermanentJobError(f"解析超时（超过 {ctx.parse_timeout:g} 秒）")
+    except MessageNotFoundError as e:
+        raise PermanentJobError(f"解析失败：{e}")
+
+    if group_msgs is not None:
+        msg_obj = parsed.get("message_obj")
+        source_chat_id = parsed.get("source_chat_id") or getattr(getattr(msg_obj, "chat", None), "id", None)
+        source_msg_id = parsed.get("source_message_id") or getattr(msg_obj, "message_id", getattr(msg_obj, "id", None))
+        if not source_chat_id or not source_msg_id:
+            logger.warning("未能确认原始消息的 chat_id 或 message_id，退回文本展示")
+            await _reply(ctx, job, parsed.get("parsed_body") or "无法获取原帖标识")
+            return
+        msg_ids = [m if isinstance(m, int) else int(getattr(m, "message_id", getattr(m, "id", None))) for m in group_msgs]
+        if ctx.staging_chat_id is None:
+            raise PermanentJobError("STAGING_CHANNEL_ID 未配置，无法执行转发操作。请在 core/config.env 设置 STAGING_CHANNEL_ID（例如 -1001234567890）。")
+        await ctx.queue.put(_child(job, "forward", PRIORITY_FORWARD, source_chat_id=source_chat_id, msg_ids=msg_ids))
+        return
+
+    await _reply(ctx, job, format_parsed_text(parsed))
+
+
+@task("forward")
+async def forward_to_staging(ctx: WorkerContext, job: Job):
+    p = job.payload
+    forwarding = _with_user_client(
+        ctx,
+        lambda client: forward_group_to_staging_dedup(client, ctx.staging_chat_id, p["source_chat_id"], p["msg_ids"]),
+        chat=p["source_chat_id"],
+        need_staging=True,
+    )
+    try:
+        forwarded, reused = await asyncio.wait_for(forwarding, timeout=ctx.forward_timeout)
+    except Exception as e:
+        if job.attempts + 1 >= job.max_attempts:
+            detail = f"转发超时（超过 {ctx.forward_timeout:g} 秒）" if isinstance(e, asyncio.TimeoutError) else e
+            raise PermanentJobError(STAGING_FORWARD_FAILED_TEXT + f"详细错误: {detail}")
+        raise
+    staging_ids = [int(m) if isinstance(m, int) else int(getattr(m, "message_id", getattr(m, "id", 0))) for m in forwarded]
+    await ctx.queue.put(_child(job, "copy", PRIORITY_COPY, staging_ids=staging_ids, reused=reused))
+
+
+@task("copy")
+async def copy_to_user(ctx: WorkerContext, job: Job):
+    p = job.payload
+    # 已复制给用户时（之后的回复失败而重试）不再复制，避免用户重复收到相册
+    cnt = p.get("copied")
+    if cnt is None:
+        cnt, _ = await copy_forwarded_to_user(ctx.bot_client, ctx.staging_chat_id, p["staging_ids"], p["chat_id"])
+        if cnt == 0 and p.get("reused"):
+            # 索引中的 staging 消息已失效（被删除等）：清理索引后重新转发一次
+            logger.info("staging 索引条目已失效，重新转发: %s %s", p["source_chat_id"], p["msg_ids"])
+            await asyncio.to_thread(delete_staging_forward, p["source_chat_id"], p["msg_ids"], ctx.staging_chat_id)
+            await ctx.queue.put(_child(job, "forward", PRIORITY_FORWARD))
+            return
+        p["copied"] = cnt
+    if cnt > 0:
+        await _reply(ctx, job, "解析并转发完成，原帖媒体与描述已返回（未在服务器保存媒体）。")
+    else:
+        await _reply(ctx, job, "转发成功，但未能复制任何消息回您（请检查 bot 是否加入 STAGING_CHANNEL 并有读取权限）。")
+
+
+async def notify_failure(ctx: WorkerContext, job: Job, error: BaseException):
+    """任务最终失败（不可重试或重试次数用尽）时通知用户"""
+    if not job.payload.get("chat_id"):
+        return
+    text = str(error) if isinstance(error, PermanentJobError) else f"处理失败：{error}"
+    try:
+        await _reply(ctx, job, text)
+    except Exception:
+        logger.warning("发送失败通知出错 job=%s", job.id, exc_info=True)
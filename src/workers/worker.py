@@ -0,0 +1,415 @@
+"""
+后台任务队列与 Worker
+- 队列后端（JOB_QUEUE_BACKEND）：
+    memory —— 进程内优先级队列（默认，仅 bot 进程内的 worker 消费）
+    sqlite —— xbparsing.db 中的 jobs 表，多个进程可共享同一个数据库文件
+    redis  —— docker-compose 中的 redis 服务，多个 worker 进程/容器可共同消费（每个进程使用各自的账号 session）
+- Worker：并发执行任务，按优先级取任务；失败时按指数退避 + 随机抖动重试，FloodWait 按服务端要求的秒数延后；
+  同一用户 chat 同时执行的任务数有上限（per-chat 上限在单个 worker 进程内生效）
+
+独立 worker 进程（sqlite / redis 后端）：
+  python3 -m src.workers.worker
+  注意：每个进程需要各自的 Pyrogram session 文件（USER_SESSION_FILE / BOT_SESSION_FILE），不要与 bot 进程或其他 worker 共用
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pyrogram.errors import FloodWait
+
+from src.core.db import register_schema, transaction
+from src.utils.metrics import track
+from src.workers.tasks import TASKS, Job, PermanentJobError, WorkerContext, notify_failure
+
+logger = logging.getLogger(__name__)
+
+# 重试退避：base * 2^(attempt-1)，上限 BACKOFF_MAX，再乘以 [0.5, 1.5) 的随机抖动
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+# 某个 chat 达到并发上限时，任务延后多少秒再取
+CHAT_BUSY_DELAY = 0.5
+# sqlite / redis 后端：空队列轮询间隔；running 状态超过该秒数视为 worker 崩溃，任务重新入队
+POLL_INTERVAL = 0.5
+VISIBILITY_TIMEOUT = 300.0
+
+
+def backoff_delay(attempts: int) -> float:
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.5, 1.5)
+
+
+class MemoryJobQueue:
+    """进程内队列：就绪任务按 (priority, 入队顺序) 排序，延迟任务按 not_before 排序"""
+
+    def __init__(self):
+        self._ready: List[Tuple[int, int, Job]] = []
+        self._delayed: List[Tuple[float, int, Job]] = []
+        self._seq = itertools.count()
+        self._cond = asyncio.Condition()
+
+    async def put(self, job: Job):
+        async with self._cond:
+            if job.not_before > time.time():
+                heapq.heappush(self._delayed, (job.not_before, next(self._seq), job))
+            else:
+                heapq.heappush(self._ready, (job.priority, next(self._seq), job))
+            self._cond.notify()
+
+    async def get(self, timeout: float = 1.0) -> Optional[Job]:
+        deadline = time.monotonic() + timeout
+        async with self._cond:
+            while True:
+                now = time.time()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, seq, job = heapq.heappop(self._delayed)
+                    heapq.heappush(self._ready, (job.priority, seq, job))
+                if self._ready:
+                    return heapq.heappop(self._ready)[2]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                if self._delayed:
+                    remaining = min(remaining, max(0.0, self._delayed[0][0] - now))
+                try:
+                    await asyncio.wait_for(self._cond.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def ack(self, job: Job):
+        pass
+
+    async def depth(self) -> int:
+        return len(self._ready) + len(self._delayed)
+
+    async def close(self):
+        pass
+
+
+JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    data TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    not_before REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    locked_until REAL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, priority, not_before, created_at);
+"""
+
+register_schema(JOBS_SCHEMA)
+
+
+class SQLiteJobQueue:
+    """xbparsing.db 中的 jobs 表（同步 sqlite3 调用放到线程中执行）"""
+
+    async def put(self, job: Job):
+        await asyncio.to_thread(self._put, job)
+
+    def _put(self, job: Job):
+        with transaction() as conn:
+            conn.execute(
+                "REPLACE INTO jobs (id, kind, data, priority, not_before, status, locked_until, created_at) VALUES (?, ?, ?, ?, ?, 'queued', NULL, ?)",
+                (job.id, job.kind, json.dumps(job.to_dict(), ensure_ascii=False), job.priority, job.not_before, job.created_at),
+            )
+
+    async def get(self, timeout: float = 1.0) -> Optional[Job]:
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await asyncio.to_thread(self._claim)
+            if job is not None or time.monotonic() >= deadline:
+                return job
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def _claim(self) -> Optional[Job]:
+        now = time.time()
+        with transaction() as conn:
+            # 回收崩溃 worker 遗留的 running 任务
+            conn.execute("UPDATE jobs SET status = 'queued', locked_until = NULL WHERE status = 'running' AND locked_until < ?", (now,))
+            row = conn.execute(
+                "SELECT id, data FROM jobs WHERE status = 'queued' AND not_before <= ? ORDER BY priority, created_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'running', locked_until = ? WHERE id = ? AND status = 'queued'",
+                (now + VISIBILITY_TIMEOUT, row[0]),
+            )
+            if cur.rowcount != 1:
+                return None
+        return Job.from_dict(json.loads(row[1]))
+
+    async def ack(self, job: Job):
+        await asyncio.to_thread(self._ack, job.id)
+
+    def _ack(self, job_id: str):
+        with transaction() as conn:
+            conn.execute("DELETE FROM jobs WHERE id = ? AND status = 'running'", (job_id,))
+
+    async def depth(self) -> int:
+        return await asyncio.to_thread(self._depth)
+
+    def _depth(self) -> int:
+        with transaction() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    async def close(self):
+        pass
+
+
+class RedisJobQueue:
+    """
+    redis 后端：
+      <prefix>ready   —— zset，score = priority * 1e13 + 入队毫秒时间戳（ZPOPMIN 即按优先级 + FIFO）
+      <prefix>delayed —— zset，score = not_before
+      <prefix>running —— zset，score = 租约到期时间，超时后重新入队
+      <prefix>data    —— hash，job id -> job JSON
+    """
+
+    def __init__(self, url: str, prefix: str = "xbparsing:jobs:"):
+        import redis.asyncio as aioredis
+
+        self._redis = aioredis.from_url(url)
+        self._prefix = prefix
+
+    def _k(self, name: str) -> str:
+        return self._prefix + name
+
+    @staticmethod
+    def _score(job: Job) -> float:
+        return job.priority * 1e13 + time.time() * 1000
+
+    async def put(self, job: Job):
+        pipe = self._redis.pipeline()
+        pipe.hset(self._k("data"), job.id, json.dumps(job.to_dict(), ensure_ascii=False))
+        pipe.zrem(self._k("running"), job.id)
+        if job.not_before > time.time():
+            pipe.zadd(self._k("delayed"), {job.id: job.not_before})
+        else:
+            pipe.zadd(self._k("ready"), {job.id: self._score(job)})
+        await pipe.execute()
+
+    async def _promote(self):
+        now = time.time()
+        for key in ("delayed", "running"):
+            due = await self._redis.zrangebyscore(self._k(key), "-inf", now)
+            for raw_id in due:
+                # ZREM 返回 1 的 worker 负责搬运，避免多进程重复入队
+                if await self._redis.zrem(self._k(key), raw_id):
+                    raw = await self._redis.hget(self._k("data"), raw_id)
+                    if raw is None:
+                        continue
+                    job = Job.from_dict(json.loads(raw))
+                    await self._redis.zadd(self._k("ready"), {job.id: self._score(job)})
+
+    async def get(self, timeout: float = 1.0) -> Optional[Job]:
+        deadline = time.monotonic() + timeout
+        while True:
+            await self._promote()
+            popped = await self._redis.zpopmin(self._k("ready"))
+            if popped:
+                raw_id = popped[0][0]
+                raw = await self._redis.hget(self._k("data"), raw_id)
+                if raw is not None:
+                    await self._redis.zadd(self._k("running"), {raw_id: time.time() + VISIBILITY_TIMEOUT})
+                    return Job.from_dict(json.loads(raw))
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def ack(self, job: Job):
+        pipe = self._redis.pipeline()
+        pipe.zrem(self._k("running"), job.id)
+        pipe.hdel(self._k("data"), job.id)
+        await pipe.execute()
+
+    async def depth(self) -> int:
+        return int(await self._redis.zcard(self._k("ready"))) + int(await self._redis.zcard(self._k("delayed")))
+
+    async def close(self):
+        await self._redis.close()
+
+
+def create_job_queue(backend: str = "memory", redis_url: Optional[str] = None):
+    backend = (backend or "memory").lower()
+    if backend == "redis":
+        if redis_url:
+            return RedisJobQueue(redis_url)
+        logger.warning("JOB_QUEUE_BACKEND=redis 但未配置 REDIS_URL，回退到进程内队列")
+    elif backend == "sqlite":
+        return SQLiteJobQueue()
+    return MemoryJobQueue()
+
+
+class Worker:
+    def __init__(self, queue, ctx: WorkerContext, concurrency: int = 4, per_chat_limit: int = 2):
+        self.queue = queue
+        self.ctx = ctx
+        self.concurrency = max(1, concurrency)
+        self.per_chat_limit = max(1, per_chat_limit)
+        self._chat_running: Dict[int, int] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    def start(self):
+        self._stopping = False
+        for i in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._loop(i), name=f"job-worker-{i}"))
+        logger.info("后台 worker 已启动：并发 %d，单 chat 上限 %d", self.concurrency, self.per_chat_limit)
+
+    async def stop(self):
+        self._stopping = True
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def run_forever(self):
+        self.start()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _loop(self, idx: int):
+        while not self._stopping:
+            try:
+                job = await self.queue.get(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("从任务队列取任务失败")
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+            if job is None:
+                continue
+            chat = job.chat_id
+            if chat is not None and self._chat_running.get(chat, 0) >= self.per_chat_limit:
+                job.not_before = time.time() + CHAT_BUSY_DELAY
+                await self.queue.put(job)
+                continue
+            if chat is not None:
+                self._chat_running[chat] = self._chat_running.get(chat, 0) + 1
+            try:
+                await self._run(job)
+            finally:
+                if chat is not None:
+                    left = self._chat_running.get(chat, 1) - 1
+                    if left > 0:
+                        self._chat_running[chat] = left
+                    else:
+                        self._chat_running.pop(chat, None)
+
+    async def _run(self, job: Job):
+        handler = TASKS.get(job.kind)
+        if handler is None:
+            logger.error("未知任务类型 %s，丢弃 job=%s", job.kind, job.id)
+            await self.queue.ack(job)
+            return
+        try:
+            with track("job", branch=job.kind):
+                await handler(self.ctx, job)
+        except asyncio.CancelledError:
+            # worker 停止：任务重新入队，下次启动继续
+            await asyncio.shield(self.queue.put(job))
+            raise
+        except PermanentJobError as e:
+            logger.warning("任务 %s(%s) 失败（不重试）: %s", job.kind, job.id, e)
+            await self.queue.ack(job)
+            await notify_failure(self.ctx, job, e)
+            return
+        except Exception as e:
+            job.attempts += 1
+            if job.attempts >= job.max_attempts:
+                logger.exception("任务 %s(%s) 重试 %d 次后仍失败", job.kind, job.id, job.attempts)
+                await self.queue.ack(job)
+                await notify_failure(self.ctx, job, e)
+                return
+            if isinstance(e, FloodWait):
+                delay = float(getattr(e, "value", 0) or 0) + 1
+            else:
+                delay = backoff_delay(job.attempts)
+            logger.warning("任务 %s(%s) 第 %d 次失败，%.1fs 后重试: %s", job.kind, job.id, job.attempts, delay, e)
+            job.not_before = time.time() + delay
+            await self.queue.put(job)
+            return
+        await self.queue.ack(job)
+
+
+async def main():
+    """独立 worker 进程：启动自己的 user/bot 客户端，只消费队列，不处理 Telegram 更新"""
+    from src.api.main import start_metrics_server, stop_metrics_server
+    from src.bot.pyro_bot import (
+        CHANNEL_ROUTES,
+        JOB_QUEUE_BACKEND,
+        LINK_CACHE,
+        METRICS_HOST,
+        METRICS_PORT,
+        PARSE_TIMEOUT,
+        STAGING_CHANNEL_ID,
+        TME_HEDGE_DELAY,
+        StartupTimer,
+        check_staging_access,
+        start_clients,
+        start_user_pool,
+    )
+    from src.core.config import settings
+    from src.utils.http_client import close_http_client
+    from src.utils.parse_pool import parse_pool
+
+    queue = create_job_queue(JOB_QUEUE_BACKEND, getattr(settings, "REDIS_URL", None))
+    if isinstance(queue, MemoryJobQueue):
+        raise SystemExit("独立 worker 进程需要 JOB_QUEUE_BACKEND=sqlite 或 redis")
+    timer = StartupTimer()
+    user_client, bot_client = await start_clients(timer, check_staging=False)
+    staging_check = asyncio.create_task(check_staging_access(user_client, bot_client))
+    with timer.phase("user_pool"):
+        user_pool = await start_user_pool(user_client)
+    with timer.phase("parse_pool"):
+        await parse_pool.warm_up()
+    with timer.phase("metrics"):
+        metrics_server = await start_metrics_server(METRICS_HOST, METRICS_PORT, user_pool=user_pool, link_cache=LINK_CACHE)
+    ctx = WorkerContext(
+        user_client=user_client,
+        bot_client=bot_client,
+        queue=queue,
+        staging_chat_id=STAGING_CHANNEL_ID,
+        link_cache=LINK_CACHE,
+        parse_timeout=PARSE_TIMEOUT,
+        channel_routes=CHANNEL_ROUTES,
+        hedge_delay=TME_HEDGE_DELAY,
+        user_pool=user_pool,
+    )
+    worker = Worker(
+        queue,
+        ctx,
+        concurrency=getattr(settings, "WORKER_CONCURRENCY", 4),
+        per_chat_limit=getattr(settings, "WORKER_PER_CHAT_LIMIT", 2),
+    )
+    logger.info(timer.summary())
+    try:
+        await worker.run_forever()
+    finally:
+        staging_check.cancel()
+        await worker.stop()
+        await queue.close()
+        await close_http_client()
+        await stop_metrics_server(metrics_server)
+        parse_pool.shutdown()
+        if user_pool is not None:
+            await user_pool.stop()
+        await bot_client.stop()
+        await user_client.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt, SystemExit):
+        logger.info("Stopping worker")
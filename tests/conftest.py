@@ -0,0 +1,12 @@
+import pytest
+
+from src.core.db import close_connection
+
+
+@pytest.fixture(autouse=True)
+def isolated_db(tmp_path, monkeypatch):
+    """每个测试使用临时 sqlite 数据库，不写项目根的 xbparsing.db"""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    close_connection()
+    yield
+    close_connection()
@@ -0,0 +1,95 @@
+import pytest
+
+from benchmarks.run_benchmarks import make_article
+from src.utils.html_parser import MAX_TEXT_CHARS, iter_text, parse_webpage_html
+
+
+def _bs4_reference(content: str):
+    """原 parse_webpage_html 的 readability + BeautifulSoup 实现（新实现应与其输出一致）"""
+    bs4 = pytest.importorskip("bs4")
+    from readability import Document
+
+    doc = Document(content)
+    title = doc.short_title()
+    excerpt = bs4.BeautifulSoup(doc.summary(), "lxml").get_text(separator="\n").strip()
+    soup_full = bs4.BeautifulSoup(content, "lxml")
+    full_text = soup_full.get_text(separator="\n")
+    og_image = None
+    og = soup_full.find("meta", property="og:image")
+    if og and og.get("content"):
+        og_image = og.get("content")
+    elif soup_full.find("meta", attrs={"name": "twitter:image"}):
+        og_image = soup_full.find("meta", attrs={"name": "twitter:image"}).get("content", None)
+    return {"title": title, "excerpt": excerpt, "text": full_text.strip()[:MAX_TEXT_CHARS], "og_image": og_image}
+
+
+WHITESPACE_PAGE = """<!DOCTYPE html>
+<html><head><title>Whitespace | Site</title>
+<meta property="og:image" content="">
+<meta name="twitter:image" content="https://example.com/tw.png">
+<style>body { color: red }</style><script>var x = "<p>not text</p>";</script></head>
+<body>
+  <nav>  Home  </nav>
+  <article><h1>Heading</h1>
+    <p>First   paragraph with <b>bold</b> and <a href="#">link</a>.</p>
+    <!-- a comment -->
+    <pre>  keep
+      this   spacing  </pre>
+    <textarea>  raw
+ text </textarea>
+    <template><p>template text</p></template>
+    <p>Last paragraph.</p>
+  </article>
+</body></html>"""
+
+OG_PAGE = """<html><head><title>OG</title>
+<meta name="twitter:image" content="https://example.com/tw.png">
+<meta property="og:image" content="https://example.com/og.png">
+<meta property="og:image" content="https://example.com/og2.png">
+</head><body><p>Only paragraph of text here.</p></body></html>"""
+
+PAGES = {
+    "article_small": make_article(5),
+    "article_large": make_article(400),
+    "whitespace": WHITESPACE_PAGE,
+    "og": OG_PAGE,
+    "no_meta": "<html><body><div>plain <span>text</span></div></body></html>",
+}
+
+
+def test_image_meta_prefers_non_empty_og_image():
+    assert parse_webpage_html(OG_PAGE)["og_image"] == "https://example.com/og.png"
+    assert parse_webpage_html(WHITESPACE_PAGE)["og_image"] == "https://example.com/tw.png"
+    assert parse_webpage_html(PAGES["no_meta"])["og_image"] is None
+
+
+def test_text_skips_script_style_template_and_keeps_pre():
+    text = parse_webpage_html(WHITESPACE_PAGE)["text"]
+    assert "not text" not in text
+    assert "color: red" not in text
+    assert "template text" not in text
+    assert "a comment" not in text
+    assert "  keep\n      this   spacing  " in text
+    assert "  raw\n text " in text
+    assert text.startswith("Whitespace | Site")
+    assert text.endswith("Last paragraph.")
+
+
+def test_text_is_capped():
+    parsed = parse_webpage_html(PAGES["article_large"])
+    assert len(parsed["text"]) == MAX_TEXT_CHARS
+    assert parsed["title"]
+    assert parsed["excerpt"]
+
+
+def test_iter_text_fragments():
+    import lxml.html
+
+    root = lxml.html.fragment_fromstring("<div>a<b>b</b> <!-- c --> <i>d</i>e<script>x</script>f</div>")
+    assert list(iter_text(root)) == ["a", "b", " ", " ", "d", "e", "f"]
+
+
+@pytest.mark.parametrize("name", sorted(PAGES))
+def test_matches_bs4_reference(name):
+    content = PAGES[name]
+    assert parse_webpage_html(content) == _bs4_reference(content)
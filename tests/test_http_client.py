@@ -0,0 +1,56 @@
+import asyncio
+
+import httpx
+
+from src.utils import http_client
+from src.utils.http_client import fetch_text, http_get
+
+
+def _run_with_transport(handler, coro_factory):
+    async def main():
+        http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await coro_factory()
+        finally:
+            await http_client.close_http_client()
+
+    return asyncio.run(main())
+
+
+def test_idle_hosts_are_dropped():
+    def handler(request):
+        return httpx.Response(200, headers={"content-type": "text/html"}, text="<p>ok</p>")
+
+    async def requests():
+        seen = []
+        for i in range(50):
+            await http_get(f"https://h{i}.example.com/")
+            body = await fetch_text(f"https://f{i}.example.com/")
+            assert body.text == "<p>ok</p>"
+            seen.append(len(http_client._host_slots))
+        return seen
+
+    assert _run_with_transport(handler, requests) == [0] * 50
+
+
+def test_per_host_limit_holds_while_busy():
+    active = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return httpx.Response(200, text="ok")
+
+    async def requests():
+        tasks = [asyncio.create_task(http_get("https://busy.example.com/")) for _ in range(http_client.PER_HOST_LIMIT * 3)]
+        await asyncio.sleep(0)
+        assert list(http_client._host_slots) == ["busy.example.com"]
+        await asyncio.gather(*tasks)
+        return len(http_client._host_slots)
+
+    assert _run_with_transport(handler, requests) == 0
+    assert peak == http_client.PER_HOST_LIMIT
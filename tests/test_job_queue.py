@@ -0,0 +1,145 @@
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.fakes import FakeBotClient, unthrottle_scheduler
+from src.workers import tasks, worker
+from src.workers.tasks import PRIORITY_COPY, PRIORITY_FORWARD, PRIORITY_PARSE, TASKS, Job, PermanentJobError, WorkerContext
+from src.workers.worker import MemoryJobQueue, SQLiteJobQueue, Worker
+
+
+def _job(kind: str, priority: int, **kwargs) -> Job:
+    return Job(kind=kind, payload={"chat_id": 1}, priority=priority, chat_id=1, **kwargs)
+
+
+async def _drain(queue, timeout: float = 0.05):
+    kinds = []
+    while True:
+        job = await queue.get(timeout=timeout)
+        if job is None:
+            return kinds
+        kinds.append(job.kind)
+        await queue.ack(job)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def queue(request, monkeypatch):
+    monkeypatch.setattr(worker, "POLL_INTERVAL", 0.01)
+    return MemoryJobQueue() if request.param == "memory" else SQLiteJobQueue()
+
+
+def test_priority_then_fifo(queue):
+    async def run():
+        for kind, priority in (("parse1", PRIORITY_PARSE), ("copy", PRIORITY_COPY), ("parse2", PRIORITY_PARSE), ("forward", PRIORITY_FORWARD)):
+            await queue.put(_job(kind, priority, created_at=time.time()))
+            await asyncio.sleep(0.002)
+        return await _drain(queue)
+
+    assert asyncio.run(run()) == ["copy", "forward", "parse1", "parse2"]
+
+
+def test_delayed_job_waits_for_not_before(queue):
+    async def run():
+        await queue.put(_job("later", PRIORITY_COPY, not_before=time.time() + 0.2))
+        await queue.put(_job("now", PRIORITY_PARSE))
+        first = await _drain(queue)
+        await asyncio.sleep(0.2)
+        return first, await _drain(queue)
+
+    assert asyncio.run(run()) == (["now"], ["later"])
+
+
+def test_sqlite_lease_expires_and_job_is_redelivered(monkeypatch):
+    monkeypatch.setattr(worker, "VISIBILITY_TIMEOUT", 0.1)
+    queue = SQLiteJobQueue()
+
+    async def run():
+        job = _job("parse", PRIORITY_PARSE)
+        await queue.put(job)
+        claimed = await queue.get(timeout=0)
+        # 租约期间其它 worker 取不到
+        assert await queue.get(timeout=0) is None
+        assert await queue.depth() == 0
+        await asyncio.sleep(0.15)
+        again = await queue.get(timeout=0)
+        await queue.ack(again)
+        return job.id, claimed.id, again.id, await queue.depth(), await queue.get(timeout=0)
+
+    job_id, claimed, again, depth, left = asyncio.run(run())
+    assert job_id == claimed == again
+    assert depth == 0 and left is None
+
+
+def _worker(monkeypatch, handler):
+    unthrottle_scheduler()
+    if handler is not None:
+        monkeypatch.setitem(TASKS, "test", handler)
+    monkeypatch.setattr(worker, "backoff_delay", lambda attempts: 0.0)
+    queue = MemoryJobQueue()
+    bot = FakeBotClient()
+    ctx = WorkerContext(user_client=None, bot_client=bot, queue=queue, staging_chat_id=-100999)
+    return Worker(queue, ctx), queue, bot
+
+
+async def _run_until_empty(w: Worker, queue: MemoryJobQueue):
+    while True:
+        job = await queue.get(timeout=0.05)
+        if job is None:
+            return
+        await w._run(job)
+
+
+async def _put_and_run(w, queue, job):
+    await queue.put(job)
+    await _run_until_empty(w, queue)
+
+
+def test_worker_retries_then_gives_up(monkeypatch):
+    calls = []
+
+    async def handler(ctx, job):
+        calls.append(job.attempts)
+        raise RuntimeError("boom")
+
+    w, queue, bot = _worker(monkeypatch, handler)
+    asyncio.run(_put_and_run(w, queue, Job(kind="test", payload={"chat_id": 7}, chat_id=7)))
+    assert calls == [0, 1, 2]
+    assert bot.sent == [(7, "处理失败：boom")]
+
+
+def test_worker_does_not_retry_permanent_errors(monkeypatch):
+    calls = []
+
+    async def handler(ctx, job):
+        calls.append(job.attempts)
+        raise PermanentJobError("消息不存在")
+
+    w, queue, bot = _worker(monkeypatch, handler)
+    asyncio.run(_put_and_run(w, queue, Job(kind="test", payload={"chat_id": 7}, chat_id=7)))
+    assert calls == [0]
+    assert bot.sent == [(7, "消息不存在")]
+
+
+def test_copy_retry_does_not_copy_again(monkeypatch):
+    w, queue, bot = _worker(monkeypatch, None)
+    replies = []
+
+    async def flaky_reply(ctx, job, text):
+        replies.append(text)
+        if len(replies) == 1:
+            raise RuntimeError("network")
+
+    monkeypatch.setattr(tasks, "_reply", flaky_reply)
+    job = Job(kind="copy", payload={"chat_id": 7, "staging_ids": [1, 2], "source_chat_id": -1005, "msg_ids": [10, 11]}, chat_id=7)
+    asyncio.run(_put_and_run(w, queue, job))
+    assert bot.copied == 1
+    assert len(replies) == 2
+
+
+def test_child_jobs_have_stable_ids():
+    parent = Job(kind="parse", payload={"url": "u", "chat_id": 1}, chat_id=1)
+    first = tasks._child(parent, "forward", PRIORITY_FORWARD, msg_ids=[1])
+    second = tasks._child(parent, "forward", PRIORITY_FORWARD, msg_ids=[1])
+    assert first.id == second.id != parent.id
+    assert first.payload == {"url": "u", "chat_id": 1, "msg_ids": [1]}
@@ -0,0 +1,120 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from benchmarks.fakes import FakeUserClient, install_fake_http, unthrottle_scheduler
+from src.parser.link_cache import ROUTE_API, ROUTE_WEB, ChannelRouteCache, LinkCache, MemoryCacheBackend, normalize_link_key
+from src.parser.url_parser_userbot import parse_telegram_link
+from src.utils import http_client
+
+CHANNEL_PAGE = (Path(__file__).parent.parent / "benchmarks" / "fixtures" / "tme_s_channel.html").read_text(encoding="utf-8")
+
+
+class BrokenUserClient(FakeUserClient):
+    async def get_messages(self, chat_id, message_ids):
+        self.calls += 1
+        raise RuntimeError("user API 不可用")
+
+
+@pytest.fixture
+def fake_http():
+    """按 URL 返回页面；pages 可在测试中修改，requested 记录请求过的 URL"""
+    pages = {}
+    requested = []
+
+    def route(url):
+        requested.append(url)
+        return pages.get(url)
+
+    client = install_fake_http(route)
+    yield pages, requested
+    http_client._client = None
+    asyncio.run(client.aclose())
+
+
+def test_memory_backend_returns_independent_copies():
+    async def run():
+        cache = LinkCache(MemoryCacheBackend())
+        await cache.set_result("k", {"kind": "telegram_web", "attachments": [{"url": "a"}]})
+        entry = await cache.get("k")
+        entry["value"]["attachments"].append({"url": "b"})
+        entry["value"]["attachments"][0]["url"] = "changed"
+        return await cache.get("k")
+
+    assert asyncio.run(run())["value"]["attachments"] == [{"url": "a"}]
+
+
+def test_normalize_link_key():
+    assert normalize_link_key("https://t.me/s/XBdemo/12?single") == normalize_link_key("t.me/xbdemo/12") == "tme:xbdemo/12"
+    assert normalize_link_key("https://t.me/c/555/7") == "tme:c/555/7"
+    assert normalize_link_key("https://example.com/a/1") is None
+
+
+def test_cached_api_result_needs_no_rpc():
+    unthrottle_scheduler()
+    client = FakeUserClient(album_size=4)
+
+    async def run():
+        cache = LinkCache(MemoryCacheBackend())
+        first = await parse_telegram_link("https://t.me/c/555/2", client, cache=cache)
+        calls = client.calls
+        second = await parse_telegram_link("https://t.me/c/555/2", client, cache=cache)
+        return first, second, client.calls - calls
+
+    first, second, calls = asyncio.run(run())
+    assert calls == 0
+    assert "message_obj" in first and "message_obj" not in second
+    assert second["source_chat_id"] == first["source_chat_id"] == -100555
+    assert second["source_message_id"] == 2
+    assert second["media_group_id"] == first["media_group_id"] == "-100555:0"
+
+
+def test_public_channel_route_is_remembered(fake_http):
+    pages, requested = fake_http
+    pages["https://t.me/s/xbdemo/1000"] = (200, CHANNEL_PAGE, "text/html; charset=utf-8")
+    unthrottle_scheduler()
+    client = FakeUserClient()
+    routes = ChannelRouteCache()
+
+    async def run():
+        first = await parse_telegram_link("https://t.me/xbdemo/1000", client, routes=routes)
+        second = await parse_telegram_link("https://t.me/xbdemo/1000", client, routes=routes)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first["kind"] == second["kind"] == "telegram_web"
+    assert routes.get("XBdemo") == ROUTE_WEB
+    assert client.calls == 0
+
+
+def test_web_route_falls_back_to_api_and_is_relearned(fake_http):
+    _, requested = fake_http
+    unthrottle_scheduler()
+    client = FakeUserClient()
+    routes = ChannelRouteCache()
+    routes.remember("xbdemo", ROUTE_WEB)
+
+    async def run():
+        await parse_telegram_link("https://t.me/xbdemo/1000", client, routes=routes)
+        web_requests = len(requested)
+        # 已改记为 user API 路径：不再抓取网页
+        await parse_telegram_link("https://t.me/xbdemo/1001", client, routes=routes)
+        return web_requests
+
+    assert asyncio.run(run()) == 2
+    assert len(requested) == 2
+    assert routes.get("xbdemo") == ROUTE_API
+    assert client.calls == 2
+
+
+def test_failed_web_route_is_forgotten(fake_http):
+    unthrottle_scheduler()
+    client = BrokenUserClient()
+    routes = ChannelRouteCache()
+    routes.remember("xbdemo", ROUTE_WEB)
+
+    with pytest.raises(Exception):
+        asyncio.run(parse_telegram_link("https://t.me/xbdemo/1000", client, routes=routes))
+    assert client.calls == 1
+    assert routes.get("xbdemo") is None
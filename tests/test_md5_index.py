@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from src.utils import md5_index
+from src.utils.md5_index import scan_library
+
+HEAD = b"H" * 8
+TAIL = b"T" * 8
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    # 首尾各 4 字节的部分哈希：100 字节的文件走完整的三级比较
+    monkeypatch.setattr(md5_index, "PARTIAL_HASH_BYTES", 4)
+    root = tmp_path / "lib"
+    root.mkdir()
+    files = {
+        "a.bin": HEAD + b"a" * 84 + TAIL,
+        "b.bin": HEAD + b"a" * 84 + TAIL,   # 与 a 完全相同
+        "c.bin": HEAD + b"c" * 84 + TAIL,   # 首尾相同、中间不同：部分哈希相同，完整 MD5 不同
+        "d.bin": b"d" * 92 + TAIL,          # 大小相同、开头不同：部分哈希即可排除
+        "e.bin": b"e" * 50,                 # 大小唯一：不读取
+        "empty.bin": b"",                   # 小于 min_size
+    }
+    for name, data in files.items():
+        (root / name).write_bytes(data)
+    return root
+
+
+def _scan(root, **kwargs):
+    kwargs.setdefault("journal_path", root.parent / "journal.jsonl")
+    return scan_library([str(root)], **kwargs)
+
+
+def test_staged_duplicate_detection(library):
+    report = _scan(library)
+    assert report["files"] == 6
+    assert report["hashed_partial"] == 4
+    assert report["hashed_full"] == 3
+    assert [d["paths"] for d in report["duplicates"]] == [[str(library / "a.bin"), str(library / "b.bin")]]
+    assert report["duplicates"][0]["md5"] == hashlib.md5((library / "a.bin").read_bytes()).hexdigest()
+
+
+def test_rescan_reuses_index_until_file_changes(library):
+    first = _scan(library)
+    second = _scan(library)
+    assert (second["hashed_partial"], second["hashed_full"]) == (0, 0)
+    assert second["duplicates"] == first["duplicates"]
+
+    b = library / "b.bin"
+    st = b.stat()
+    b.write_bytes(HEAD + b"c" * 84 + TAIL)
+    os.utime(b, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    third = _scan(library)
+    assert (third["hashed_partial"], third["hashed_full"]) == (1, 1)
+    assert [d["paths"] for d in third["duplicates"]] == [[str(library / "b.bin"), str(library / "c.bin")]]
+
+
+def _modify_record(path, new_md5):
+    return {"op": "modify", "path": str(path), "original_size": 1, "new_size": path.stat().st_size, "new_md5": new_md5}
+
+
+def test_modified_requires_matching_md5(library):
+    journal = library.parent / "journal.jsonl"
+    e = library / "e.bin"
+    d = library / "d.bin"
+    records = [
+        _modify_record(e, hashlib.md5(e.read_bytes()).hexdigest()),
+        # 之后被替换为同样大小的其它内容
+        _modify_record(d, hashlib.md5(b"something else").hexdigest()),
+    ]
+    journal.write_text("".join(json.dumps(r) + "\n" for r in records), encoding="utf-8")
+    assert _scan(library)["modified"] == [str(e)]
+
+
+def test_scan_does_not_touch_journal(library, tmp_path):
+    journal = tmp_path / "journal.jsonl"
+    legacy = tmp_path / "legacy.json"
+    e = library / "e.bin"
+    legacy.write_text(json.dumps({str(e): {"new_size": 50, "new_md5": hashlib.md5(e.read_bytes()).hexdigest()}}), encoding="utf-8")
+    entries = md5_index.read_journal(journal, legacy_log=legacy)
+    assert list(entries) == [str(e)]
+    assert not journal.exists()
+
+    # 写了一半的最后一行：读取时忽略，不补写换行
+    journal.write_bytes(b'{"op": "modify", "path": "x", "new_size": 1, "new_md5": "m"}\n{"op": "mod')
+    before = journal.read_bytes()
+    _scan(library, journal_path=journal)
+    assert journal.read_bytes() == before
+    assert legacy.exists()
+    assert not list(tmp_path.glob("*.imported"))
+
+
+def test_md5_dups_command(library):
+    import asyncio
+    from types import SimpleNamespace
+
+    from src.bot.commands import md5_edit_command
+
+    replies = []
+
+    async def reply(text):
+        replies.append(text)
+
+    message = SimpleNamespace(text=f"/md5 dups {library} -r", reply=reply)
+    asyncio.run(md5_edit_command(None, message, None, workers=2))
+    summary = replies[-1]
+    assert "重复组：1" in summary
+    assert str(library / "a.bin") in summary and str(library / "b.bin") in summary
+    assert "MD5 已修改过的文件：0" in summary
@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from src.utils import md5_tool
+from src.utils.md5_tool import modify_md5_all, modify_md5_parallel
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR"
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    # 修改日志 / 断点 / 类型缓存都写在临时目录
+    monkeypatch.setattr(md5_tool, "MODIFY_JOURNAL_FILE", tmp_path / "journal.jsonl")
+    monkeypatch.setattr(md5_tool, "MODIFY_LOG_FILE", tmp_path / "modify_log.json")
+    monkeypatch.setattr(md5_tool, "MODIFY_CHECKPOINT_FILE", tmp_path / "checkpoint.jsonl")
+    monkeypatch.setattr(md5_tool, "CLASSIFY_CACHE_FILE", tmp_path / "classify.json")
+    root = tmp_path / "files"
+    root.mkdir()
+    for name in ("a.png", "b.png"):
+        (root / name).write_bytes(PNG_HEADER + name.encode() * 100)
+    return root
+
+
+def _sizes(root):
+    return {p.name: p.stat().st_size for p in sorted(root.iterdir())}
+
+
+def _statuses(details):
+    return sorted(d["status"] for d in details)
+
+
+def test_parallel_rerun_modifies_again(tree):
+    before = _sizes(tree)
+    count, details = modify_md5_parallel([str(tree)], backup_mode="journal", workers=2)
+    assert count == 2
+    assert _statuses(details) == ["modified", "modified"]
+
+    count, details = modify_md5_parallel([str(tree)], backup_mode="journal", workers=2)
+    assert count == 2
+    assert _statuses(details) == ["modified", "modified"]
+    assert _sizes(tree) == {k: v + 2 for k, v in before.items()}
+    assert not md5_tool.MODIFY_CHECKPOINT_FILE.exists()
+
+
+def test_parallel_rerun_matches_serial(tree):
+    modify_md5_all([str(tree)], backup_mode="journal")
+    serial_count, _ = modify_md5_all([str(tree)], backup_mode="journal")
+    parallel_count, _ = modify_md5_parallel([str(tree)], backup_mode="journal")
+    assert serial_count == parallel_count == 2
+
+
+def test_resume_skips_only_completed_files(tree):
+    ckpt = md5_tool.MODIFY_CHECKPOINT_FILE
+    ckpt.write_text(json.dumps({"path": str(tree / "a.png"), "status": "modified"}) + "\n", encoding="utf-8")
+    before = _sizes(tree)
+
+    count, details = modify_md5_parallel([str(tree)], backup_mode="journal")
+    assert count == 1
+    by_path = {d["path"]: d["status"] for d in details}
+    assert by_path[str(tree / "a.png")] == "skipped_done"
+    assert by_path[str(tree / "b.png")] == "modified"
+    assert _sizes(tree) == {"a.png": before["a.png"], "b.png": before["b.png"] + 1}
+    assert not ckpt.exists()
+
+
+def test_dry_run_and_error_lines_are_not_done(tree):
+    ckpt = md5_tool.MODIFY_CHECKPOINT_FILE
+    lines = [
+        {"path": str(tree / "a.png"), "status": "dry_run"},
+        {"path": str(tree / "b.png"), "status": "error"},
+    ]
+    ckpt.write_text("".join(json.dumps(x) + "\n" for x in lines), encoding="utf-8")
+
+    count, details = modify_md5_parallel([str(tree)], backup_mode="journal")
+    assert count == 2
+    assert _statuses(details) == ["modified", "modified"]
+
+
+def test_dry_run_leaves_checkpoint_untouched(tree):
+    ckpt = md5_tool.MODIFY_CHECKPOINT_FILE
+    line = json.dumps({"path": str(tree / "a.png"), "status": "modified"}) + "\n"
+    ckpt.write_text(line, encoding="utf-8")
+    before = _sizes(tree)
+
+    count, details = modify_md5_parallel([str(tree)], dry_run=True)
+    assert count == 0
+    assert _statuses(details) == ["dry_run", "dry_run"]
+    assert _sizes(tree) == before
+    # 被中断的正式运行仍可续跑
+    assert ckpt.read_text(encoding="utf-8") == line
+
+
+def test_missing_root_reported_as_not_found(tree):
+    missing = tree / "missing"
+    count, details = modify_md5_all([missing, str(missing) + "/"], backup_mode="journal")
+    assert count == 0
+    assert [(d["status"], d.get("error")) for d in details] == [("not_found", "root_not_exists")] * 2
@@ -0,0 +1,45 @@
+import asyncio
+import socket
+
+from src.api.main import start_metrics_server, stop_metrics_server
+from src.utils.metrics import REGISTRY
+
+
+class FakePool:
+    def stats(self):
+        return {"accounts": 1, "reroutes": 0, "members": {"user:a": {"in_flight": 0, "served": 3}}}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _get(port: int, path: str) -> str:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("ascii"))
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    return data.decode("utf-8")
+
+
+def test_restarted_server_does_not_leak_collectors():
+    before = len(REGISTRY._collectors)
+
+    async def run():
+        bodies = []
+        for _ in range(3):
+            port = _free_port()
+            server = await start_metrics_server("127.0.0.1", port, user_pool=FakePool())
+            bodies.append(await _get(port, "/metrics"))
+            await stop_metrics_server(server)
+        return bodies
+
+    bodies = asyncio.run(run())
+    assert all(b.startswith("HTTP/1.1 200 OK") for b in bodies)
+    # 每次只输出一份账号池指标
+    assert all(b.count('xbparsing_user_pool_served_total{account="user:a"} 3') == 1 for b in bodies)
+    assert len(REGISTRY._collectors) == before
@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+from benchmarks import run_benchmarks
+from src.utils import http_client
+
+
+@pytest.fixture
+def restore_http_client():
+    # 基准测试把共享 HTTP 客户端换成了 MockTransport
+    yield
+    http_client._client = None
+
+
+def test_quick_benchmarks_write_comparable_json(tmp_path, restore_http_client, capsys):
+    out = tmp_path / "bench.json"
+    run_benchmarks.main(["--quick", "--only", "tme", "--only", "md5", "-o", str(out)])
+    report = json.loads(out.read_text(encoding="utf-8"))
+
+    assert report["meta"]["quick"] is True
+    assert report["meta"]["groups"] == ["tme", "md5"]
+    names = {r["name"] for r in report["results"]}
+    assert {"tme_scrape.channel_page", "parse_telegram_link.plain_web", "compute_md5.small_files", "modify_md5_all.journal.small_files"} <= names
+    for r in report["results"]:
+        assert r["group"] in ("parser", "md5")
+        assert 0 < r["min"] <= r["median"] <= r["max"]
+
+    # 与自身对比：每项都应输出一行
+    run_benchmarks._compare(report["results"], out)
+    printed = capsys.readouterr().out
+    assert all(name in printed for name in names)
@@ -0,0 +1,58 @@
+import asyncio
+
+from benchmarks.fakes import FakeUserClient, unthrottle_scheduler
+from src.utils.peer_cache import PeerCache
+
+
+def test_concurrent_resolves_share_one_request():
+    unthrottle_scheduler()
+    client = FakeUserClient()
+    cache = PeerCache()
+
+    async def run():
+        ids = await asyncio.gather(*(cache.resolve(client, name) for name in ("@XBdemo", "xbdemo", "@xbdemo")))
+        ids.append(await cache.resolve(client, "XBDEMO"))
+        return ids
+
+    ids = asyncio.run(run())
+    assert len(set(ids)) == 1 and isinstance(ids[0], int)
+    assert client.resolves == 1
+    assert cache.stats()["hits"] == 1
+    assert asyncio.run(cache.resolve(client, "me")) == "me"
+
+
+def test_resolved_peers_survive_restart():
+    unthrottle_scheduler()
+    first = FakeUserClient()
+    peer_id = asyncio.run(PeerCache().resolve(first, "@xbdemo"))
+
+    # 新进程：新的缓存实例与 client，从 resolved_peers 表读取
+    second = FakeUserClient()
+    assert asyncio.run(PeerCache().resolve(second, "@xbdemo")) == peer_id
+    assert second.resolves == 0
+    # 命中时 peer 写入 client 的 storage，之后的调用不再解析
+    assert second.storage.peers[peer_id][3] == "xbdemo"
+
+
+def test_invalidate_and_username_ttl_force_new_resolve():
+    unthrottle_scheduler()
+    client = FakeUserClient()
+    cache = PeerCache()
+
+    async def run():
+        await cache.resolve(client, "@xbdemo")
+        await cache.invalidate(client, "@xbdemo")
+        await cache.resolve(client, "@xbdemo")
+        cache.configure(username_ttl=-1)
+        await cache.resolve(client, "@xbdemo")
+        # 按 id 的条目不过期
+        await cache.resolve(client, -1001234)
+        await cache.resolve(client, -1001234)
+
+    asyncio.run(run())
+    assert client.resolves == 4
+    assert cache.stats()["invalidations"] == 1
+    # 按 id 解析的条目同样持久化
+    fresh = FakeUserClient()
+    asyncio.run(PeerCache().resolve(fresh, -1001234))
+    assert fresh.resolves == 0
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from pyrogram.errors import FloodWait
+
+from src.utils import rate_limiter
+from src.utils.rate_limiter import TelegramScheduler, TokenBucket, flood_wait_cap
+
+
+class FakeClock:
+    """替换 time.monotonic / asyncio.sleep：sleep 只推进时钟，不真正等待"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", c.monotonic)
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", c.sleep)
+    return c
+
+
+def test_token_bucket_burst_then_rate():
+    bucket = TokenBucket(rate=2.0, capacity=3.0)
+    now = bucket.updated
+    assert [bucket.reserve(now) for _ in range(3)] == [0.0, 0.0, 0.0]
+    # 透支：第 4、5 个请求依次排到 0.5s、1s 之后
+    assert bucket.reserve(now) == pytest.approx(0.5)
+    assert bucket.reserve(now) == pytest.approx(1.0)
+    # 1s 后补充 2 个令牌，正好还清透支
+    assert bucket.reserve(now + 1.0) == pytest.approx(0.5)
+    # 补充不超过容量
+    assert bucket.reserve(now + 100.0) == 0.0
+    assert bucket.tokens == pytest.approx(2.0)
+
+
+def test_token_bucket_block():
+    bucket = TokenBucket(rate=10.0, capacity=10.0)
+    now = bucket.updated
+    bucket.block(now + 30)
+    bucket.block(now + 5)  # 不会缩短已有的封锁
+    assert bucket.reserve(now) == pytest.approx(30.0)
+    assert bucket.reserve(now + 30) == 0.0
+
+
+class FakeClient:
+    name = "acc"
+    bot_token = None
+
+    def __init__(self, floods=()):
+        self.floods = list(floods)
+        self.calls = 0
+
+    async def get_messages(self, chat_id, message_ids):
+        self.calls += 1
+        if self.floods:
+            raise FloodWait(value=self.floods.pop(0))
+        return message_ids
+
+
+def test_scheduler_spaces_calls_by_method_rate(clock):
+    scheduler = TelegramScheduler(method_rates={"get_messages": (2.0, 1.0)})
+    client = FakeClient()
+
+    async def run():
+        for i in range(3):
+            await scheduler.call(client.get_messages, 1, i)
+
+    asyncio.run(run())
+    assert clock.slept == pytest.approx([0.5, 0.5])
+    assert scheduler.max_waiting == 1
+
+
+def test_scheduler_absorbs_short_flood_wait(clock):
+    scheduler = TelegramScheduler()
+    client = FakeClient(floods=[3])
+    seen = []
+    scheduler.add_flood_listener(lambda key, method, wait: seen.append((key, method, wait)))
+
+    assert asyncio.run(scheduler.call(client.get_messages, 1, 42)) == 42
+    assert client.calls == 2
+    assert seen == [("user:acc", "get_messages", 3)]
+    # 重新排队前等到封锁结束（FloodWait + 1s 余量）
+    assert sum(clock.slept) == pytest.approx(4.0)
+
+
+def test_flood_wait_cap_raises_and_keeps_method_blocked(clock):
+    scheduler = TelegramScheduler()
+    client = FakeClient(floods=[20])
+
+    async def run():
+        with flood_wait_cap(5):
+            with pytest.raises(FloodWait):
+                await scheduler.call(client.get_messages, 1, 1)
+            # 方法仍处于封锁中：不再调用客户端，直接抛出
+            with pytest.raises(FloodWait) as exc:
+                await scheduler.call(client.get_messages, 2, 1)
+            return exc.value.value
+
+    assert asyncio.run(run()) == 21
+    assert client.calls == 1
+    # 不设上限时照常排队等待封锁结束
+    assert asyncio.run(scheduler.call(client.get_messages, 1, 7)) == 7
+    assert client.calls == 2
+
+
+def test_nested_flood_wait_cap_takes_minimum():
+    with flood_wait_cap(30):
+        with flood_wait_cap(60):
+            assert rate_limiter._flood_wait_cap.get() == 30
+        with flood_wait_cap(5):
+            assert rate_limiter._flood_wait_cap.get() == 5
+        assert rate_limiter._flood_wait_cap.get() == 30
+    assert rate_limiter._flood_wait_cap.get() is None
@@ -0,0 +1,180 @@
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from src.parser.tme_extractor import extract_tme_post
+
+FIXTURES = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures"
+
+
+def _fixture(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+def _bs4_reference(html: str):
+    """原 _try_scrape_tme_post 中的 BeautifulSoup 实现（extract_tme_post 应与其输出一致）"""
+    bs4 = pytest.importorskip("bs4")
+    soup = bs4.BeautifulSoup(html, "lxml")
+    msg_div = soup.find("div", class_="tgme_widget_message")
+    if not msg_div:
+        msg_div = soup.find("div", class_="tgme_widget_message_text")
+        if not msg_div:
+            return None
+    text_div = msg_div.find("div", class_="tgme_widget_message_text")
+    parsed_body = text_div.get_text("\n", strip=True) if text_div else ""
+    owner_name = None
+    owner_el = soup.find("a", class_="tgme_widget_message_owner_name")
+    if owner_el:
+        owner_name = owner_el.get_text(strip=True)
+    date_str = None
+    date_el = msg_div.find("time")
+    if date_el and date_el.has_attr("datetime"):
+        date_str = date_el["datetime"]
+    else:
+        date_a = msg_div.find("a", class_="tgme_widget_message_date")
+        if date_a:
+            date_str = date_a.get_text(strip=True)
+    attachments: List[Dict[str, Any]] = []
+    for img in msg_div.find_all("img"):
+        src = img.get("src")
+        if src:
+            attachments.append({"type": "image", "url": src, "alt": img.get("alt")})
+    for a in msg_div.find_all("a"):
+        href = a.get("href") or ""
+        rel = a.get("rel") or []
+        if "/file/" in href or a.get("download") or "download" in rel:
+            full = "https://t.me" + href if href.startswith("/") else href
+            attachments.append({"type": "file", "url": full, "text": a.get_text(strip=True)})
+    for video_tag in msg_div.find_all("video"):
+        src = video_tag.get("src")
+        if src:
+            attachments.append({"type": "video", "url": src})
+    for vplay in msg_div.select("a.tgme_widget_message_video_play"):
+        data_src = vplay.get("href") or vplay.get("data-src") or ""
+        if data_src:
+            urlv = "https://t.me" + data_src if data_src.startswith("/") else data_src
+            attachments.append({"type": "video", "url": urlv})
+    if not parsed_body and not attachments:
+        return None
+    parsed_title = ""
+    if parsed_body:
+        lines = [ln.strip() for ln in parsed_body.splitlines() if ln.strip()]
+        parsed_title = lines[0] if lines else ""
+    return {
+        "kind": "telegram_web",
+        "channel": owner_name,
+        "date": date_str,
+        "parsed_title": parsed_title,
+        "parsed_body": parsed_body,
+        "attachments": attachments,
+    }
+
+
+MEDIA_POST = """
+<html><body>
+<div class="tgme_widget_message text_not_supported_wrap js-widget_message" data-post="xbdemo/7">
+  <div class="tgme_widget_message_author"><a class="tgme_widget_message_owner_name" href="/xbdemo"><span>XB  Demo</span></a></div>
+  <div class="tgme_widget_message_text js-message_text">第一行 <b>加粗</b><br/>  第二行 <a href="https://example.com">链接</a>
+    <script>ignored()</script><!-- comment --></div>
+  <a class="tgme_widget_message_document_wrap" href="/file/report.pdf"><span>report.pdf</span></a>
+  <a href="https://cdn.example.com/x.zip" download="x.zip">下载 <i>zip</i></a>
+  <a href="https://cdn.example.com/y.bin" rel="nofollow download">y</a>
+  <video src="https://cdn.example.com/v.mp4"></video>
+  <a class="tgme_widget_message_video_play js-message_video_play" href="/xbdemo/7?single"></a>
+  <a class="tgme_widget_message_video_play" data-src="https://cdn.example.com/play.mp4"></a>
+  <img src="https://cdn.example.com/p.jpg" alt="p"><img alt="no src">
+  <a class="tgme_widget_message_date" href="/xbdemo/7">May 21</a>
+</div>
+<div class="tgme_widget_message" data-post="xbdemo/8"><div class="tgme_widget_message_text">second</div></div>
+</body></html>
+"""
+
+# 没有 tgme_widget_message 容器：退回第一个 tgme_widget_message_text（正文只在其内部嵌套的 text div 中查找）
+FALLBACK_TEXT_ONLY = '<div class="tgme_widget_message_text">orphan text<img src="https://cdn.example.com/o.jpg"></div>'
+FALLBACK_NESTED = '<div class="tgme_widget_message_text"><div class="tgme_widget_message_text">inner</div></div>'
+NO_MESSAGE = "<html><head><title>Telegram: Contact @xbdemo</title></head><body><div class='tgme_page'>x</div></body></html>"
+EMPTY_MESSAGE = '<div class="tgme_widget_message"><div class="tgme_widget_message_text">   </div></div>'
+
+EDGE_CASES = {
+    "media_post": MEDIA_POST,
+    "fallback_text_only": FALLBACK_TEXT_ONLY,
+    "fallback_nested": FALLBACK_NESTED,
+    "no_message": NO_MESSAGE,
+    "empty_message": EMPTY_MESSAGE,
+}
+
+
+def test_embed_album_fixture():
+    parsed = extract_tme_post(_fixture("tme_embed_album.html"))
+    assert parsed["kind"] == "telegram_web"
+    assert parsed["channel"] == "XB Demo 频道"
+    assert parsed["date"] == "2024-05-21T12:40:00+00:00"
+    assert parsed["parsed_title"] == "链接 频道 notes 资源 media"
+    body = parsed["parsed_body"].splitlines()
+    assert len(body) == 6
+    assert body[0] == parsed["parsed_title"]
+    assert body[-1] == "https://example.com/1000"
+    assert [a["url"] for a in parsed["attachments"]] == [
+        "https://cdn4.telesco.pe/file/avatar_xbdemo.jpg",
+        *(f"https://cdn4.telesco.pe/file/xbdemo_1000_{i}_thumb.jpg" for i in range(4)),
+    ]
+    assert [a["alt"] for a in parsed["attachments"]] == [None, "photo 0", "photo 1", "photo 2", "photo 3"]
+
+
+def test_channel_page_uses_first_message():
+    parsed = extract_tme_post(_fixture("tme_s_channel.html"))
+    assert parsed["channel"] == "XB Demo 频道"
+    assert parsed["date"] == "2024-05-21T12:40:00+00:00"
+    assert parsed["parsed_title"] == "media archive archive photo photo"
+    body = parsed["parsed_body"].splitlines()
+    assert len(body) == 7
+    assert body[-1] == "https://example.com/1000"
+    assert len(parsed["attachments"]) == 5
+    assert all(a["type"] == "image" for a in parsed["attachments"])
+
+
+def test_post_page_without_widget_returns_none():
+    assert extract_tme_post(_fixture("tme_post_page.html")) is None
+
+
+def test_media_post_attachments():
+    parsed = extract_tme_post(MEDIA_POST)
+    assert parsed["channel"] == "XB  Demo"
+    # 没有 <time datetime> 时取日期链接的文本
+    assert parsed["date"] == "May 21"
+    assert parsed["parsed_body"] == "第一行\n加粗\n第二行\n链接"
+    assert parsed["parsed_title"] == "第一行"
+    assert parsed["attachments"] == [
+        {"type": "image", "url": "https://cdn.example.com/p.jpg", "alt": "p"},
+        {"type": "file", "url": "https://t.me/file/report.pdf", "text": "report.pdf"},
+        {"type": "file", "url": "https://cdn.example.com/x.zip", "text": "下载zip"},
+        {"type": "file", "url": "https://cdn.example.com/y.bin", "text": "y"},
+        {"type": "video", "url": "https://cdn.example.com/v.mp4"},
+        {"type": "video", "url": "https://t.me/xbdemo/7?single"},
+        {"type": "video", "url": "https://cdn.example.com/play.mp4"},
+    ]
+
+
+def test_fallback_to_text_container():
+    parsed = extract_tme_post(FALLBACK_TEXT_ONLY)
+    assert parsed["parsed_body"] == ""
+    assert parsed["attachments"] == [{"type": "image", "url": "https://cdn.example.com/o.jpg", "alt": None}]
+    assert extract_tme_post(FALLBACK_NESTED)["parsed_body"] == "inner"
+
+
+@pytest.mark.parametrize("html", [NO_MESSAGE, EMPTY_MESSAGE, ""])
+def test_no_usable_message_returns_none(html):
+    assert extract_tme_post(html) is None
+
+
+@pytest.mark.parametrize("name", ["tme_embed_album.html", "tme_s_channel.html", "tme_post_page.html"])
+def test_fixtures_match_bs4_reference(name):
+    html = _fixture(name)
+    assert extract_tme_post(html) == _bs4_reference(html)
+
+
+@pytest.mark.parametrize("name", sorted(EDGE_CASES))
+def test_edge_cases_match_bs4_reference(name):
+    html = EDGE_CASES[name]
+    assert extract_tme_post(html) == _bs4_reference(html)
@@ -0,0 +1,128 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from pyrogram.enums import ChatMemberStatus
+from pyrogram import raw
+from pyrogram.errors import FloodWait
+
+from src.bot.services import user_pool
+from src.bot.services.user_pool import UserClientPool
+from src.utils.peer_cache import PeerAccessError
+from src.utils.rate_limiter import TelegramScheduler
+
+
+class FakeAccount:
+    bot_token = None
+
+    def __init__(self, name, flood=0, denied=(), staging_status=ChatMemberStatus.MEMBER):
+        self.name = name
+        self.flood = flood
+        self.denied = set(denied)
+        self.staging_status = staging_status
+        self.calls = 0
+
+    async def get_messages(self, chat_id, message_ids):
+        self.calls += 1
+        if self.flood:
+            raise FloodWait(value=self.flood)
+        if chat_id in self.denied:
+            raise PeerAccessError(f"{self.name} 无法访问 {chat_id}")
+        return self.name
+
+    async def resolve_peer(self, peer_id):
+        return raw.types.InputPeerChannel(channel_id=-1000000000000 - peer_id, access_hash=1)
+
+    async def get_me(self):
+        return SimpleNamespace(id=hash(self.name))
+
+    async def get_chat_member(self, chat_id, user_id):
+        return SimpleNamespace(status=self.staging_status)
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    # 每个测试使用独立的调度器：FloodWait 封锁、监听器不影响其它测试
+    s = TelegramScheduler()
+    monkeypatch.setattr(user_pool, "telegram_scheduler", s)
+    return s
+
+
+def _fetch(scheduler, chat):
+    return lambda c: scheduler.call(c.get_messages, chat, 1)
+
+
+def test_pick_prefers_least_busy_then_known_member(scheduler):
+    a, b = FakeAccount("a"), FakeAccount("b")
+    pool = UserClientPool([a, b])
+
+    async def run():
+        # 轮流分配
+        served = [await pool.run(_fetch(scheduler, -100 - i), chat=-100 - i) for i in range(4)]
+        # 已知成员优先，即使它服务过更多请求
+        pool.record_access(b, -200, True)
+        pool.members[1].served += 10
+        served.append(await pool.run(_fetch(scheduler, -200), chat=-200))
+        await pool.stop()
+        return served
+
+    assert asyncio.run(run()) == ["a", "b", "a", "b", "b"]
+
+
+def test_peer_access_error_reroutes_and_is_remembered(scheduler):
+    a, b = FakeAccount("a", denied={-100}), FakeAccount("b")
+    pool = UserClientPool([a, b])
+
+    async def run():
+        first = await pool.run(_fetch(scheduler, -100), chat=-100)
+        second = await pool.run(_fetch(scheduler, -100), chat=-100)
+        await pool.stop()
+        return first, second
+
+    assert asyncio.run(run()) == ("b", "b")
+    assert (a.calls, b.calls) == (1, 2)
+    assert pool.reroutes == 1
+
+
+def test_all_accounts_denied_raises_last_error(scheduler):
+    pool = UserClientPool([FakeAccount("a", denied={-100}), FakeAccount("b", denied={-100})])
+    with pytest.raises(PeerAccessError):
+        asyncio.run(pool.run(_fetch(scheduler, -100), chat=-100))
+
+
+def test_flood_wait_ejects_account_and_reroutes(scheduler):
+    a, b = FakeAccount("a", flood=60), FakeAccount("b")
+    pool = UserClientPool([a, b])
+
+    async def run():
+        first = await pool.run(_fetch(scheduler, -100), chat=-100)
+        # a 在 FloodWait 中：新请求直接分配给 b，不再尝试 a
+        second = await pool.run(_fetch(scheduler, -300), chat=-300)
+        await pool.stop()
+        return first, second
+
+    assert asyncio.run(run()) == ("b", "b")
+    assert a.calls == 1
+    assert pool.stats()["members"]["user:a"]["ejected_for"] > 50
+
+
+def test_flood_wait_on_last_account_is_raised(scheduler):
+    a, b = FakeAccount("a", flood=600), FakeAccount("b", flood=600)
+    pool = UserClientPool([a, b])
+    with pytest.raises(FloodWait):
+        asyncio.run(pool.run(_fetch(scheduler, -100), chat=-100))
+    assert (a.calls, b.calls) == (1, 1)
+
+
+def test_health_check_ranks_unhealthy_staging_last(scheduler):
+    a = FakeAccount("a", staging_status=ChatMemberStatus.LEFT)
+    b = FakeAccount("b")
+    pool = UserClientPool([a, b], staging_chat_id=-100999)
+
+    async def run():
+        await pool.check_health()
+        return [(await pool.run(_fetch(scheduler, -100 - i), need_staging=True)) for i in range(3)]
+
+    assert asyncio.run(run()) == ["b", "b", "b"]
+    assert not pool.members[0].staging_ok
+    assert pool.members[1].staging_ok